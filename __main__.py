@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+命令行入口，支持 python -m merge_excels
+"""
+
+import sys
+import multiprocessing
+from pathlib import Path
+
+# 项目内部使用 core.xxx 形式的导入，以包方式运行时需要把项目目录加入搜索路径
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from cli import main
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
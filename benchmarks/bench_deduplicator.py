@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+增量重复行检测的正确性与性能对比
+
+按数据块调用 RowDeduplicator.duplicated，与合并后整体调用 pandas duplicated() 的结果比较；
+测试数据中同一列在不同数据块里类型不同（int64、float64、object数字、Arrow字符串、分类），
+有的数据块缺少某列（reindex 后为全空的float64列），用于检查行哈希在这些情况下是否一致
+
+用法:
+    python benchmarks/bench_deduplicator.py [--chunks 200] [--rows 500]
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.deduplicator import RowDeduplicator
+
+
+HEADERS = ['编号', '金额', '名称', '备注']
+
+
+def build_chunks(chunks: int, rows: int) -> list:
+    """生成测试数据块：取值范围很小，保证跨数据块有大量重复行"""
+    rng = np.random.default_rng(0)
+    result = []
+    for i in range(chunks):
+        ids = rng.integers(0, 20, rows)
+        amounts = rng.integers(0, 5, rows).astype(np.float64)
+        amounts[rng.random(rows) < 0.2] = np.nan
+        names = np.array(['甲', '乙', '丙'], dtype=object)[rng.integers(0, 3, rows)]
+        notes = np.where(rng.random(rows) < 0.5, None, 'x').astype(object)
+        data = {'编号': ids, '金额': amounts, '名称': names, '备注': notes}
+        kind = i % 5
+        if kind == 1:
+            # 有空值的整数列（float64）和 object 中的整数
+            data['编号'] = ids.astype(np.float64)
+            data['金额'] = pd.Series(amounts).astype(object).where(~np.isnan(amounts), None)
+        elif kind == 2:
+            # 可空整数、Arrow字符串和分类
+            data['编号'] = pd.array(ids, dtype='Int64')
+            data['名称'] = pd.Series(names, dtype='string')
+            data['备注'] = pd.Categorical(notes)
+        elif kind == 3:
+            # object列中混合整数和小数
+            data['金额'] = np.array([
+                np.nan if np.isnan(value) else (int(value) if j % 2 else value)
+                for j, value in enumerate(amounts)
+            ], dtype=object)
+        elif kind == 4:
+            # 缺少备注列：reindex 后为全空的float64列
+            del data['备注']
+        result.append(pd.DataFrame(data).reindex(columns=HEADERS))
+    return result
+
+
+def expected_duplicates(chunks: list) -> np.ndarray:
+    """合并后逐值比较的结果：各列先统一为object，再把缺失值和数字统一表示"""
+    def canonical(value):
+        if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+            return None
+        if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            return float(value)
+        return value
+    
+    merged = pd.concat([chunk.astype(object) for chunk in chunks], ignore_index=True)
+    merged = merged.map(canonical)
+    return merged.duplicated().to_numpy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增量重复行检测的正确性与性能对比")
+    parser.add_argument('--chunks', type=int, default=200, help="数据块数量")
+    parser.add_argument('--rows', type=int, default=500, help="每个数据块的行数")
+    args = parser.parse_args()
+    
+    chunks = build_chunks(args.chunks, args.rows)
+    print(f"生成测试数据: {args.chunks} 个数据块 × {args.rows} 行")
+    
+    start = time.perf_counter()
+    expected = expected_duplicates(chunks)
+    baseline = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    deduplicator = RowDeduplicator()
+    result = np.concatenate([deduplicator.duplicated(chunk) for chunk in chunks])
+    incremental = time.perf_counter() - start
+    
+    mismatched = np.flatnonzero(result != expected)
+    assert len(mismatched) == 0, f"{len(mismatched)} 行与 duplicated() 不一致，如第 {mismatched[:10].tolist()} 行"
+    assert deduplicator.duplicate_count == int(expected.sum())
+    
+    print(f"重复行: {int(expected.sum())} / {len(expected)}")
+    print(f"合并后 duplicated(): {baseline:.3f}s")
+    print(f"逐块行哈希:          {incremental:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
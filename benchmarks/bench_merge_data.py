@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+大量小sheet合并性能对比
+
+对比旧实现（逐sheet reindex 后 pd.concat）与 merge_data（按表头分组、
+预分配结果列后逐sheet复制）、iter_merge_chunks（把小sheet攒成约 MERGE_CHUNK_ROWS 行的数据块后
+同样预分配组装）的耗时
+
+用法:
+    python benchmarks/bench_merge_data.py [--sheets 5000] [--rows 200] [--cols 12]
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.constants import MERGE_CHUNK_ROWS
+from core.data_merger import merge_data, iter_merge_chunks
+
+
+def build_files_data(sheets: int, rows: int, cols: int) -> dict:
+    """生成测试数据：每10个sheet放在一个文件中，一半的sheet缺少最后一列并打乱列顺序"""
+    rng = np.random.default_rng(0)
+    headers = [f"列{c}" for c in range(cols)]
+    files_data = {}
+    for i in range(sheets):
+        columns = headers if i % 2 == 0 else headers[-2::-1]
+        df = pd.DataFrame(
+            rng.integers(0, 1000, size=(rows, len(columns))),
+            columns=columns
+        )
+        df[columns[0]] = df[columns[0]].astype(str)
+        files_data.setdefault(f"file{i // 10}.xlsx", {})[f"Sheet{i % 10 + 1}"] = df
+    return files_data
+
+
+def merge_by_concat(files_data: dict, target_headers: list) -> pd.DataFrame:
+    """旧实现：逐sheet对齐列后一次性 concat"""
+    aligned = [
+        df.reindex(columns=target_headers)
+        for sheets_data in files_data.values()
+        for df in sheets_data.values()
+    ]
+    return pd.concat(aligned, ignore_index=True)
+
+
+def merge_by_chunks(files_data: dict, target_headers: list) -> pd.DataFrame:
+    """流式合并：逐块产出后拼接（只用于校验结果，实际使用时数据块直接写出）"""
+    return pd.concat(iter_merge_chunks(files_data, target_headers, chunk_size=MERGE_CHUNK_ROWS),
+                     ignore_index=True)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大量小sheet合并性能对比")
+    parser.add_argument('--sheets', type=int, default=5000, help="sheet数量")
+    parser.add_argument('--rows', type=int, default=200, help="每个sheet的行数")
+    parser.add_argument('--cols', type=int, default=12, help="每个sheet的列数")
+    args = parser.parse_args()
+    
+    print(f"生成测试数据: {args.sheets} 个sheet × {args.rows} 行 × {args.cols} 列")
+    files_data = build_files_data(args.sheets, args.rows, args.cols)
+    target_headers = [f"列{c}" for c in range(args.cols)]
+    
+    baseline, expected = timed(merge_by_concat, files_data, target_headers)
+    assembled, (result, _) = timed(merge_data, files_data, target_headers)
+    streamed, chunked = timed(merge_by_chunks, files_data, target_headers)
+    pd.testing.assert_frame_equal(result, expected)
+    pd.testing.assert_frame_equal(chunked, expected)
+    
+    print(f"reindex + concat: {baseline:.3f}s")
+    print(f"预分配列组装:     {assembled:.3f}s  (加速 {baseline / assembled:.1f}x)")
+    print(f"流式分块组装:     {streamed:.3f}s  (加速 {baseline / streamed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
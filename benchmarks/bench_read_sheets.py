@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多sheet工作簿读取性能对比
+
+对比旧实现（每个sheet重新调用 pd.read_excel 解析整个工作簿）与
+read_file_sheets（工作簿只解析一次）以及流式只读模式的耗时
+
+用法:
+    python benchmarks/bench_read_sheets.py [--sheets 30] [--rows 500] [--cols 10]
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.file_reader import read_file_sheets
+
+
+def build_workbook(path: Path, sheets: int, rows: int, cols: int):
+    """生成测试用的多sheet工作簿"""
+    rng = np.random.default_rng(0)
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for i in range(sheets):
+            df = pd.DataFrame(
+                rng.integers(0, 1000, size=(rows, cols)),
+                columns=[f"列{c}" for c in range(cols)]
+            )
+            df.to_excel(writer, sheet_name=f"Sheet{i + 1}", index=False)
+
+
+def read_per_sheet(path: Path) -> dict:
+    """旧实现：列出sheet后逐个调用 pd.read_excel"""
+    excel_file = pd.ExcelFile(path, engine='openpyxl')
+    return {
+        name: pd.read_excel(path, sheet_name=name, engine='openpyxl')
+        for name in excel_file.sheet_names
+    }
+
+
+def timed(func, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多sheet工作簿读取性能对比")
+    parser.add_argument('--sheets', type=int, default=30, help="sheet数量")
+    parser.add_argument('--rows', type=int, default=500, help="每个sheet的行数")
+    parser.add_argument('--cols', type=int, default=10, help="每个sheet的列数")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "bench.xlsx"
+        print(f"生成测试文件: {args.sheets} 个sheet × {args.rows} 行 × {args.cols} 列")
+        build_workbook(path, args.sheets, args.rows, args.cols)
+        
+        baseline = timed(read_per_sheet, path)
+        single_pass = timed(read_file_sheets, str(path))
+        streaming = timed(read_file_sheets, str(path), streaming=True)
+    
+    print(f"逐sheet重新解析: {baseline:.3f}s")
+    print(f"单次解析:         {single_pass:.3f}s  (加速 {baseline / single_pass:.1f}x)")
+    print(f"流式只读模式:     {streaming:.3f}s  (加速 {baseline / streaming:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Excel/CSV文件合并工具 - 命令行版本
+不依赖 PySide6，可在服务器或定时任务中批量合并
+
+用法:
+    python -m merge_excels 输入文件/文件夹/通配符 ... -o 输出文件 [选项]
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import contextlib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from core.constants import (
+    SUPPORTED_EXTENSIONS, DEFAULT_OUTPUT_FILENAME, EXCEL_MAX_DATA_ROWS, XLSX_SHARD_MODES,
+    MERGE_CHUNK_ROWS, PIPELINE_QUEUE_CHUNKS, APPEND_FORMATS,
+    WATCH_DEBOUNCE_SECONDS, WATCH_POLL_SECONDS, CSV_CHUNKED_MIN_BYTES
+)
+from core.file_reader import probe_file, get_all_headers, resolve_target_headers
+from core.data_merger import iter_merge_chunks, save_result, output_format as detect_output_format
+from core.deduplicator import RowDeduplicator
+from core.excel_writer import manifest_path
+from core.parallel_reader import read_files_parallel
+from core.parse_cache import ParseCache
+from core.pipeline import MergePipeline
+from core.output_appender import OutputAppender, sources_manifest_path
+from core.folder_watcher import WatchMerger
+from core.compaction import compact_sheets
+from core.frame_cache import frame_memory_usage
+from core.schema import resolve_schema, format_conflicts
+
+
+OUTPUT_FORMATS = ['xlsx', 'csv', 'parquet', 'feather', 'sqlite']
+HEADER_POLICIES = ['first', 'union', 'intersection', 'explicit']
+
+
+def collect_input_files(inputs: List[str]) -> List[str]:
+    """
+    展开输入参数中的文件、文件夹和通配符，返回支持格式的文件列表（去重并保持顺序）
+    
+    Args:
+        inputs: 命令行输入参数
+    
+    Returns:
+        文件路径列表
+    """
+    files = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            candidates = sorted(
+                p for p in path.iterdir()
+                if p.is_file() and p.suffix.lower() in SUPPORTED_EXTENSIONS
+            )
+        elif glob.has_magic(item):
+            candidates = sorted(Path(p) for p in glob.glob(item, recursive=True))
+        else:
+            candidates = [path]
+        for candidate in candidates:
+            if candidate.suffix.lower() in SUPPORTED_EXTENSIONS:
+                files.append(str(candidate))
+    return list(dict.fromkeys(files))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(
+        prog="merge_excels",
+        description="合并多个 Excel/CSV 文件（命令行版本，不需要图形界面）"
+    )
+    parser.add_argument('inputs', nargs='+', help="输入文件、文件夹或通配符（如 'data/*.xlsx'）")
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT_FILENAME, help="输出文件路径")
+    parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS,
+                        help="输出格式，默认根据输出文件扩展名判断（parquet、feather 需要 pyarrow）")
+    parser.add_argument('--compression',
+                        help="Parquet/Feather 的压缩算法（如 snappy、zstd、lz4，none 表示不压缩）")
+    parser.add_argument('--row-group-size', type=int, default=None, help="Parquet 每个行组的最大行数")
+    parser.add_argument('--table', help="SQLite 输出的表名（同名的表会被替换）")
+    parser.add_argument('--max-rows-per-sheet', type=int, default=None,
+                        help=f"xlsx 每个文件/sheet 的最大数据行数，超过时自动拆分（默认 {EXCEL_MAX_DATA_ROWS}）")
+    parser.add_argument('--shard-mode', choices=XLSX_SHARD_MODES, default='files',
+                        help="xlsx 超过行数上限时的拆分方式：files 拆分为多个编号的文件，sheets 拆分为多个sheet")
+    parser.add_argument('--header-policy', choices=HEADER_POLICIES, default='first',
+                        help="表头不一致时的处理策略：first 第一个表头，union 并集，"
+                             "intersection 交集，explicit 使用 --headers 指定的表头")
+    parser.add_argument('--headers', help="explicit 策略使用的表头，以逗号分隔")
+    parser.add_argument('--dedup', action='store_true', help="去除完全重复的行")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 4, help="并行读取的文件数")
+    parser.add_argument('--backend', choices=['process', 'thread'], default='process',
+                        help="解析后端：process 多进程，thread 线程")
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help="合并时每个数据块的最大行数，默认每个sheet一个数据块")
+    parser.add_argument('--csv-chunk-rows', type=int, default=None,
+                        help="CSV文件按此行数分块惰性读取（合并时再逐块从磁盘读取），"
+                             f"默认只有不小于 {CSV_CHUNKED_MIN_BYTES // (1024 * 1024)}MB 的CSV文件分块读取")
+    parser.add_argument('--compact', action='store_true',
+                        help="读取后压缩列类型（重复文本转为分类、缩小数值类型），减少内存占用")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="流水线模式：读取、对齐和写入同时进行，内存中最多保留 --queue-size 个数据块；"
+                             "不统一列类型，忽略 --compact")
+    parser.add_argument('--queue-size', type=int, default=PIPELINE_QUEUE_CHUNKS,
+                        help="流水线模式下对齐和写入之间的队列最多容纳的数据块数")
+    parser.add_argument('--append', action='store_true',
+                        help="追加模式：只把还没有包含在已有输出（CSV、Parquet、xlsx）中的文件追加到末尾，"
+                             "已包含的文件记录在输出旁边的 .sources.json 中；配合 --dedup 时与已有结果一起去重")
+    parser.add_argument('--watch', action='store_true',
+                        help="监视模式：持续监视输入的文件夹，新文件写完后追加到输出（同 --append），"
+                             "每批文件的统计信息以一行JSON输出，按 Ctrl+C 停止")
+    parser.add_argument('--recursive', action='store_true', help="监视模式下包含子文件夹")
+    parser.add_argument('--debounce', type=float, default=WATCH_DEBOUNCE_SECONDS,
+                        help="监视模式下文件保持不变多少秒后认为已写完")
+    parser.add_argument('--poll-interval', type=float, default=WATCH_POLL_SECONDS,
+                        help="监视模式下检查文件夹的间隔秒数")
+    parser.add_argument('--polling', action='store_true',
+                        help="监视模式下总是定时扫描文件夹（默认在安装了 watchdog 时使用系统文件事件）")
+    parser.add_argument('--no-cache', action='store_true', help="不使用解析缓存")
+    parser.add_argument('--clear-cache', action='store_true', help="合并前清空解析缓存")
+    parser.add_argument('--cache-dir', help="解析缓存目录")
+    return parser
+
+
+def resolve_output_path(output: str, output_format: Optional[str]) -> str:
+    """按指定的输出格式修正输出文件扩展名（同一格式的其他扩展名，如 .db、.arrow，保持不变）"""
+    path = Path(output)
+    if output_format and detect_output_format(output) != output_format:
+        path = path.with_suffix(f".{output_format}")
+    return str(path)
+
+
+def run(args: argparse.Namespace) -> Dict:
+    """
+    执行合并流程
+    
+    Args:
+        args: 命令行参数
+    
+    Returns:
+        统计信息字典
+    """
+    start_time = time.perf_counter()
+    stats: Dict = {
+        'success': False,
+        'output': resolve_output_path(args.output, args.format),
+        'files': 0,
+        'failed_files': [],
+        'sheets': 0,
+        'target_headers': [],
+        'input_rows': 0,
+        'duplicate_rows': 0,
+        'output_rows': 0,
+        'memory_bytes_before_compaction': 0,
+        'memory_bytes': 0,
+        'schema': {},
+        'schema_conflicts': [],
+        'statistics': [],
+    }
+    
+    file_paths = collect_input_files(args.inputs)
+    stats['files'] = len(file_paths)
+    if not file_paths:
+        stats['error'] = "没有找到支持格式的文件"
+        return stats
+    
+    # 追加模式：跳过已包含在输出中的文件
+    appender = None
+    if args.append:
+        appender = OutputAppender(stats['output'], args.dedup)
+        file_paths, stats['skipped_files'] = appender.pending_files(file_paths)
+        if not file_paths:
+            print("没有需要追加的新文件")
+            stats['success'] = True
+            stats['output_rows'] = appender.manifest['rows']
+            stats['elapsed_seconds'] = round(time.perf_counter() - start_time, 3)
+            return stats
+    
+    # 先探测表头，确定目标表头
+    files_probe = {}
+    for file_path in file_paths:
+        probe = probe_file(file_path)
+        if probe:
+            files_probe[file_path] = probe
+        else:
+            stats['failed_files'].append(file_path)
+    if not files_probe:
+        stats['error'] = "没有读取到任何有效数据"
+        return stats
+    
+    explicit_headers = [h.strip() for h in args.headers.split(',')] if args.headers else None
+    target_headers = resolve_target_headers(
+        get_all_headers(files_probe), args.header_policy, explicit_headers
+    )
+    if not target_headers:
+        stats['error'] = "目标表头为空"
+        return stats
+    if appender is not None:
+        target_headers = appender.check_headers(target_headers)
+    stats['target_headers'] = [str(h) for h in target_headers]
+    
+    # 完整读取（并行，可使用解析缓存），只读取目标表头中的列
+    parse_cache = None
+    if not args.no_cache:
+        parse_cache = ParseCache(args.cache_dir)
+        if args.clear_cache:
+            parse_cache.clear()
+        if not parse_cache.available:
+            parse_cache = None
+    if args.pipeline:
+        return run_pipeline(args, list(files_probe), target_headers, parse_cache, stats, start_time)
+    results = {}
+    for file_path, sheets_data, failed in read_files_parallel(
+            list(files_probe), args.jobs, args.backend, parse_cache, columns=target_headers,
+            csv_chunk_rows=args.csv_chunk_rows):
+        if failed:
+            stats['failed_files'].append(file_path)
+            continue
+        if args.compact:
+            sheets_data, before, after = compact_sheets(sheets_data)
+        else:
+            before = after = frame_memory_usage(sheets_data)
+        stats['memory_bytes_before_compaction'] += before
+        stats['memory_bytes'] += after
+        results[file_path] = sheets_data
+    # 按输入顺序合并，保证结果可重复
+    files_data = {path: results[path] for path in files_probe if path in results}
+    if not files_data:
+        stats['error'] = "没有读取到任何有效数据"
+        return stats
+    
+    # 统一各文件的列类型，无法统一的列保持原类型并记录
+    schema, conflicts = resolve_schema(files_data, target_headers)
+    stats['schema'] = {str(header): dtype for header, dtype in schema.items()}
+    stats['schema_conflicts'] = format_conflicts(conflicts)
+    
+    if appender is not None:
+        return run_append(args, appender, files_data, target_headers, schema, stats, start_time)
+    
+    # 流式合并、去重并写出
+    statistics: List[Dict] = []
+    deduplicator = RowDeduplicator() if args.dedup else None
+    
+    def chunks():
+        for chunk in iter_merge_chunks(files_data, target_headers, statistics, args.chunk_size, schema):
+            stats['input_rows'] += len(chunk)
+            if deduplicator is not None:
+                chunk = deduplicator.drop_duplicates(chunk)
+            stats['output_rows'] += len(chunk)
+            yield chunk
+    
+    stats['success'] = save_result(
+        chunks(), stats['output'], compression=args.compression,
+        row_group_size=args.row_group_size, table_name=args.table,
+        shard_rows=args.max_rows_per_sheet, shard_mode=args.shard_mode,
+        schema=schema, conflicts=conflicts
+    )
+    if not stats['success']:
+        stats['error'] = "保存文件失败"
+    elif detect_output_format(stats['output']) == 'xlsx' and os.path.exists(manifest_path(stats['output'])):
+        stats['manifest'] = manifest_path(stats['output'])  # 超过行数上限，已拆分
+    stats['duplicate_rows'] = deduplicator.duplicate_count if deduplicator else 0
+    stats['sheets'] = len(statistics)
+    stats['statistics'] = statistics
+    stats['elapsed_seconds'] = round(time.perf_counter() - start_time, 3)
+    return stats
+
+
+def run_append(args: argparse.Namespace, appender: OutputAppender, files_data: Dict,
+               target_headers: List[str], schema: Dict, stats: Dict, start_time: float) -> Dict:
+    """追加模式：把新文件的数据追加到已有输出之后，并更新来源清单"""
+    result = appender.append(
+        files_data, target_headers, args.chunk_size, schema,
+        save_options={
+            'compression': args.compression, 'row_group_size': args.row_group_size,
+            'shard_rows': args.max_rows_per_sheet, 'shard_mode': args.shard_mode,
+        }
+    )
+    stats['success'] = result['success']
+    stats['input_rows'] = result['input_rows']
+    stats['appended_rows'] = result['appended_rows']
+    stats['duplicate_rows'] = result['duplicate_rows']
+    stats['output_rows'] = result['total_rows']
+    stats['created'] = result['created']
+    stats['sheets'] = len(result['statistics'])
+    stats['statistics'] = result['statistics']
+    if stats['success']:
+        stats['sources_manifest'] = sources_manifest_path(stats['output'])
+    else:
+        stats['error'] = "追加到输出文件失败"
+    stats['elapsed_seconds'] = round(time.perf_counter() - start_time, 3)
+    return stats
+
+
+def run_pipeline(args: argparse.Namespace, file_paths: List[str], target_headers: List[str],
+                 parse_cache: Optional[ParseCache], stats: Dict, start_time: float) -> Dict:
+    """
+    流水线模式：读取、对齐和写入同时进行
+    
+    不事先读取所有文件，因此不统一列类型；各阶段的利用率记录在 stats['pipeline'] 中
+    """
+    pipeline = MergePipeline(
+        file_paths, target_headers, stats['output'],
+        chunk_size=args.chunk_size or MERGE_CHUNK_ROWS, drop_duplicates=args.dedup,
+        max_workers=args.jobs, backend=args.backend, parse_cache=parse_cache,
+        csv_chunk_rows=args.csv_chunk_rows, queue_size=args.queue_size,
+        save_options={
+            'compression': args.compression, 'row_group_size': args.row_group_size,
+            'table_name': args.table, 'shard_rows': args.max_rows_per_sheet,
+            'shard_mode': args.shard_mode,
+        }
+    )
+    stats['success'] = pipeline.run()
+    stats['failed_files'].extend(pipeline.failed_files)
+    stats['input_rows'] = pipeline.input_rows
+    stats['output_rows'] = pipeline.output_rows
+    stats['duplicate_rows'] = pipeline.duplicate_count
+    stats['sheets'] = len(pipeline.statistics)
+    stats['statistics'] = pipeline.statistics
+    stats['pipeline'] = pipeline.stats
+    if not stats['success']:
+        stats['error'] = "保存文件失败"
+    elif not pipeline.statistics:
+        stats['success'] = False
+        stats['error'] = "没有读取到任何有效数据"
+    elif detect_output_format(stats['output']) == 'xlsx' and os.path.exists(manifest_path(stats['output'])):
+        stats['manifest'] = manifest_path(stats['output'])
+    stats['elapsed_seconds'] = round(time.perf_counter() - start_time, 3)
+    return stats
+
+
+def run_watch(args: argparse.Namespace, emit) -> Dict:
+    """
+    监视模式：持续监视文件夹并增量追加，直到按 Ctrl+C
+    
+    Args:
+        args: 命令行参数
+        emit: 每批文件处理完后调用 emit(统计信息)
+    
+    Returns:
+        总计统计信息
+    """
+    parse_cache = None
+    if not args.no_cache:
+        parse_cache = ParseCache(args.cache_dir)
+        if args.clear_cache:
+            parse_cache.clear()
+        if not parse_cache.available:
+            parse_cache = None
+    output = resolve_output_path(args.output, args.format)
+    merger = WatchMerger(
+        args.inputs[0], output,
+        drop_duplicates=args.dedup,
+        header_policy=args.header_policy,
+        explicit_headers=[h.strip() for h in args.headers.split(',')] if args.headers else None,
+        recursive=args.recursive,
+        debounce_seconds=args.debounce,
+        poll_interval=args.poll_interval,
+        use_events=not args.polling,
+        max_workers=args.jobs,
+        backend=args.backend,
+        parse_cache=parse_cache,
+        csv_chunk_rows=args.csv_chunk_rows,
+        chunk_size=args.chunk_size,
+        save_options={
+            'compression': args.compression, 'row_group_size': args.row_group_size,
+            'shard_rows': args.max_rows_per_sheet, 'shard_mode': args.shard_mode,
+        },
+        on_batch=emit
+    )
+    try:
+        merger.run()
+    except KeyboardInterrupt:
+        merger.stop()
+    return {
+        'success': True,
+        'output': output,
+        'files': merger.total_files,
+        'appended_rows': merger.total_rows,
+        'sources_manifest': sources_manifest_path(output),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口，统计信息以JSON输出到标准输出，日志输出到标准错误"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.header_policy == 'explicit' and not args.headers:
+        parser.error("--header-policy explicit 需要同时指定 --headers")
+    if args.watch:
+        if len(args.inputs) != 1 or not os.path.isdir(args.inputs[0]):
+            parser.error("--watch 需要指定一个要监视的文件夹")
+        if args.pipeline:
+            parser.error("--watch 不能与 --pipeline 同时使用")
+        args.append = True
+    if args.append:
+        if args.pipeline:
+            parser.error("--append 不能与 --pipeline 同时使用")
+        if detect_output_format(resolve_output_path(args.output, args.format)) not in APPEND_FORMATS:
+            parser.error(f"--append 只支持 {'、'.join(APPEND_FORMATS)} 输出")
+    
+    # 核心模块的日志使用 print，重定向到标准错误，保证标准输出只有JSON
+    stdout = sys.stdout
+    
+    def emit(batch: Dict):
+        stdout.write(json.dumps(batch, ensure_ascii=False, default=str) + "\n")
+        stdout.flush()
+    
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            stats = run_watch(args, emit) if args.watch else run(args)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            stats = {'success': False, 'error': str(e)}
+    
+    print(json.dumps(stats, ensure_ascii=False, indent=2, default=str))
+    return 0 if stats.get('success') else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
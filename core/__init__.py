@@ -5,8 +5,22 @@
 """
 
 from .constants import SUPPORTED_EXTENSIONS, DEFAULT_OUTPUT_FILENAME
-from .file_reader import read_file_sheets, get_all_headers, check_headers_consistency
-from .data_merger import merge_data, save_result
+from .file_reader import (
+    read_file_sheets, get_all_headers, check_headers_consistency, group_headers,
+    detect_csv_encoding, get_file_metadata, probe_file, resolve_target_headers,
+    CsvChunkReader
+)
+from .data_merger import MergeCancelled, merge_data, iter_merge_chunks, save_result, append_result, output_format
+from .excel_writer import write_excel_sharded
+from .parallel_reader import ProcessFileReader, read_files_parallel
+from .pipeline import MergePipeline
+from .output_appender import OutputAppender
+from .folder_watcher import FolderWatcher, WatchMerger
+from .parse_cache import ParseCache
+from .frame_cache import FrameCache, frame_memory_usage
+from .compaction import compact_frame, compact_sheets
+from .schema import resolve_schema, apply_schema
+from .deduplicator import RowDeduplicator, count_duplicates
 
 __all__ = [
     'SUPPORTED_EXTENSIONS',
@@ -14,7 +28,33 @@ __all__ = [
     'read_file_sheets',
     'get_all_headers',
     'check_headers_consistency',
+    'group_headers',
+    'detect_csv_encoding',
+    'get_file_metadata',
+    'probe_file',
+    'resolve_target_headers',
+    'CsvChunkReader',
+    'MergeCancelled',
     'merge_data',
+    'iter_merge_chunks',
     'save_result',
+    'append_result',
+    'output_format',
+    'write_excel_sharded',
+    'ProcessFileReader',
+    'read_files_parallel',
+    'MergePipeline',
+    'OutputAppender',
+    'FolderWatcher',
+    'WatchMerger',
+    'ParseCache',
+    'FrameCache',
+    'frame_memory_usage',
+    'compact_frame',
+    'compact_sheets',
+    'resolve_schema',
+    'apply_schema',
+    'RowDeduplicator',
+    'count_duplicates',
 ]
 
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+数据类型压缩模块
+读取后把重复度高的文本列转为分类类型、其余文本列转为Arrow字符串，并无损地缩小数值类型
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .constants import COMPACT_CATEGORY_MAX_RATIO
+from .frame_cache import frame_memory_usage
+
+try:
+    import pyarrow  # noqa: F401  仅用于判断是否支持 string[pyarrow]
+    _ARROW_STRING_DTYPE = pd.StringDtype('pyarrow')
+except (ImportError, TypeError):  # pyarrow 为可选依赖；旧版pandas不支持Arrow字符串
+    _ARROW_STRING_DTYPE = None
+
+
+def _compact_text(series: pd.Series, category_max_ratio: float) -> pd.Series:
+    """文本列：不同值占比不超过 category_max_ratio 时转为分类，否则尽量转为Arrow字符串"""
+    if pd.api.types.infer_dtype(series, skipna=True) != 'string':
+        return series  # 混合了数字、日期等的列保持原样
+    non_null = series.count()
+    if non_null == 0:
+        return series
+    if series.nunique(dropna=True) <= non_null * category_max_ratio:
+        return series.astype('category')
+    if isinstance(series.dtype, pd.StringDtype) and series.dtype.storage == 'pyarrow':
+        return series  # 已经是Arrow字符串（pandas 3 默认的 str 类型）
+    if _ARROW_STRING_DTYPE is not None:
+        return series.astype(_ARROW_STRING_DTYPE)
+    return series
+
+
+def _compact_float(series: pd.Series) -> pd.Series:
+    """浮点列：转为float32后数值完全不变时才缩小"""
+    if series.dtype == np.float32:
+        return series
+    values = series.to_numpy()
+    with np.errstate(over='ignore', invalid='ignore'):
+        narrowed = values.astype(np.float32)
+    same = (narrowed.astype(values.dtype) == values) | (np.isnan(values) & np.isnan(narrowed))
+    return series.astype(np.float32) if same.all() else series
+
+
+def compact_frame(df: pd.DataFrame,
+                  category_max_ratio: float = COMPACT_CATEGORY_MAX_RATIO) -> pd.DataFrame:
+    """
+    压缩DataFrame的列类型，不改变任何值
+    
+    - 文本列（object 或 str/string 类型）：重复度高的转为 category，其余转为 string[pyarrow]（需要pyarrow），
+      已经是Arrow字符串的保持原样
+    - 整数列：缩小到能容纳所有值的最小整数类型
+    - 浮点列：能无损表示时转为 float32
+    
+    Args:
+        df: 数据
+        category_max_ratio: 文本列转为分类的最大不同值占比
+    
+    Returns:
+        压缩后的DataFrame
+    """
+    columns = {}
+    for idx in range(df.shape[1]):
+        series = df.iloc[:, idx]
+        dtype = series.dtype
+        if dtype == object or isinstance(dtype, pd.StringDtype):
+            series = _compact_text(series, category_max_ratio)
+        elif pd.api.types.is_bool_dtype(dtype) or not isinstance(dtype, np.dtype):
+            pass
+        elif pd.api.types.is_signed_integer_dtype(dtype):
+            series = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_unsigned_integer_dtype(dtype):
+            series = pd.to_numeric(series, downcast='unsigned')
+        elif pd.api.types.is_float_dtype(dtype):
+            series = _compact_float(series)
+        columns[idx] = series
+    result = pd.DataFrame(columns, index=df.index)
+    result.columns = df.columns
+    return result
+
+
+def compact_sheets(sheets_data: Dict[str, pd.DataFrame],
+                   category_max_ratio: float = COMPACT_CATEGORY_MAX_RATIO
+                   ) -> Tuple[Dict[str, pd.DataFrame], int, int]:
+    """
+    压缩一个文件所有sheet的列类型
+    
+    Args:
+        sheets_data: 字典 {sheet_name: DataFrame}
+        category_max_ratio: 文本列转为分类的最大不同值占比
+    
+    Returns:
+        (压缩后的sheets_data, 压缩前内存占用, 压缩后内存占用)
+    """
+    before = frame_memory_usage(sheets_data)
+    compacted = {
+        sheet_name: compact_frame(df, category_max_ratio) if isinstance(df, pd.DataFrame) else df
+        for sheet_name, df in sheets_data.items()
+    }
+    return compacted, before, frame_memory_usage(compacted)
@@ -10,6 +10,75 @@ SUPPORTED_EXTENSIONS = {'.xlsx', '.xls', '.et', '.csv'}
 # CSV文件编码列表（按优先级排序）
 CSV_ENCODINGS = ['utf-8-sig', 'utf-8', 'gbk', 'gb2312', 'latin1']
 
+# CSV编码检测时采样的字节数（文件头和文件尾各采样一次）
+CSV_ENCODING_SAMPLE_SIZE = 1024 * 1024
+
+# 不小于该大小的CSV文件分块惰性读取，不整体载入内存
+CSV_CHUNKED_MIN_BYTES = 512 * 1024 * 1024
+
+# 分块读取CSV时每块的默认行数
+CSV_CHUNK_ROWS = 100000
+
+# 解析缓存目录的默认大小上限（字节）
+PARSE_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# 已读取数据在内存中的默认上限（字节），超出后最久未使用的文件溢出到磁盘
+FRAME_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# 压缩列类型时，文本列不同值占非空值的比例不超过该值才转为分类类型
+COMPACT_CATEGORY_MAX_RATIO = 0.5
+
 # 默认文件名
 DEFAULT_OUTPUT_FILENAME = "合并结果.xlsx"
 
+# 输出格式（按扩展名选择，未知扩展名按xlsx写入）
+OUTPUT_FORMATS = {
+    '.xlsx': 'xlsx',
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+    '.sqlite': 'sqlite',
+    '.db': 'sqlite',
+}
+
+# Excel每个工作表的最大行数（含表头），以及可写入的最大数据行数
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_DATA_ROWS = EXCEL_MAX_ROWS - 1
+
+# 写入xlsx时每次转换为Python对象的行数，避免为整个数据块生成object副本
+XLSX_WRITE_SLICE_ROWS = 10000
+
+# xlsx结果超过行数上限时的拆分方式：拆分为多个文件，或同一文件中的多个sheet
+XLSX_SHARD_MODES = ('files', 'sheets')
+
+# 拆分为多个文件时并行写入的进程数（每个进程在内存中保留一部分数据）
+XLSX_SHARD_WORKERS = 4
+
+# 支持追加模式的输出格式
+APPEND_FORMATS = ('csv', 'parquet', 'xlsx')
+
+# Parquet输出的默认压缩算法和每个行组的最大行数
+PARQUET_COMPRESSION = 'snappy'
+PARQUET_ROW_GROUP_ROWS = 1024 * 1024
+
+# Feather（Arrow IPC）输出的默认压缩算法
+FEATHER_COMPRESSION = 'lz4'
+
+# SQLite输出的默认表名
+SQLITE_TABLE_NAME = 'merged'
+
+# 后台合并时每个数据块的最大行数（决定进度刷新和响应取消的粒度）
+MERGE_CHUNK_ROWS = 50000
+
+# 流水线合并时对齐和写入之间的队列最多容纳的数据块数（超过时对齐和读取暂停）
+PIPELINE_QUEUE_CHUNKS = 8
+
+# 监视文件夹时，文件大小和修改时间保持不变多少秒后认为已写完
+WATCH_DEBOUNCE_SECONDS = 2.0
+
+# 监视文件夹时检查（没有文件事件时扫描文件夹）的间隔秒数
+WATCH_POLL_SECONDS = 1.0
+
+# 监视文件夹时追加失败（如结果文件在Excel中打开）的文件，等待多少秒后重试
+WATCH_RETRY_SECONDS = 10.0
@@ -4,73 +4,807 @@
 数据合并模块
 """
 
+import os
+import sqlite3
+import datetime
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 from pathlib import Path
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Iterable, Iterator, Optional, Union
+
+from .constants import (
+    OUTPUT_FORMATS, PARQUET_COMPRESSION, PARQUET_ROW_GROUP_ROWS,
+    FEATHER_COMPRESSION, SQLITE_TABLE_NAME, APPEND_FORMATS, MERGE_CHUNK_ROWS
+)
+from .schema import apply_schema
+from .file_reader import CsvChunkReader
+from .excel_writer import write_excel_sharded, append_excel_chunks, read_excel_header, iter_excel_chunks
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow 为可选依赖，只有输出 Parquet/Feather 时需要
+    pa = None
+    pq = None
+
+
+class MergeCancelled(Exception):
+    """合并被取消（在产出数据块的迭代器中抛出），save_result/append_result 不把它当作保存失败，而是继续抛出"""
+
+
+def iter_merge_chunks(files_data: Dict[str, Dict[str, pd.DataFrame]],
+                      target_headers: List[str],
+                      statistics: Optional[List[Dict]] = None,
+                      chunk_size: Optional[int] = None,
+                      schema: Optional[Dict] = None) -> Iterator[pd.DataFrame]:
+    """
+    流式合并数据：产出按目标表头对齐后的数据块，每块最多 chunk_size 行
+    
+    连续的小sheet攒成一批，按表头分组、预分配列后组装为一个数据块（见 _assemble_columns），
+    不会为每个sheet产出一个很小的数据块；超过 chunk_size 行的sheet按 chunk_size 行切分。
+    不会生成完整的合并结果，峰值内存只与单个数据块的大小有关。
+    分块读取的大CSV（CsvChunkReader）在这里才逐块从磁盘读取
+    
+    Args:
+        files_data: 文件数据字典，格式为 {file_path: {sheet_name: DataFrame}}
+        target_headers: 目标表头列表
+        statistics: 统计信息列表，每处理完一个sheet追加一条 {'file', 'sheet', 'rows'}
+        chunk_size: 每个数据块的最大行数，为 None 时每个sheet作为一个数据块
+        schema: resolve_schema 得到的统一列类型，对齐后的数据块按此转换（包括缺失列）
+        
+    Yields:
+        按目标表头对齐的DataFrame
+    """
+    batch: List[pd.DataFrame] = []
+    batch_rows = 0
+    for file_path, sheets_data in files_data.items():
+        for sheet_name, df in sheets_data.items():
+            original_rows = len(df)
+            
+            if isinstance(df, CsvChunkReader) or (chunk_size is not None and original_rows > chunk_size):
+                if batch:
+                    yield _assemble_batch(batch, target_headers, schema)
+                    batch, batch_rows = [], 0
+                if isinstance(df, CsvChunkReader):
+                    original_rows = 0
+                    for chunk in df.iter_chunks(chunk_size):
+                        original_rows += len(chunk)
+                        yield _assemble_batch([chunk], target_headers, schema)
+                else:
+                    for start in range(0, original_rows, chunk_size):
+                        yield _assemble_batch([df.iloc[start:start + chunk_size]], target_headers, schema)
+            else:
+                if batch and (chunk_size is None or batch_rows + original_rows > chunk_size):
+                    yield _assemble_batch(batch, target_headers, schema)
+                    batch, batch_rows = [], 0
+                batch.append(df)
+                batch_rows += original_rows
+            
+            if statistics is not None:
+                statistics.append({
+                    'file': Path(file_path).name,
+                    'sheet': sheet_name,
+                    'rows': original_rows
+                })
+    if batch:
+        yield _assemble_batch(batch, target_headers, schema)
+
+
+def _assemble_batch(sheets: List[pd.DataFrame], target_headers: List[str],
+                    schema: Optional[Dict] = None) -> pd.DataFrame:
+    """
+    把一批sheet组装为一个按目标表头对齐的数据块
+    
+    各sheet先统一类型再组装，列的类型一致时可以直接预分配；
+    整批都缺少的列组装后是全为 NaN 的浮点列，再按 schema 转换一次
+    """
+    sheets = [apply_schema(df, schema) for df in sheets]
+    return apply_schema(_assemble_columns(sheets, target_headers), schema)
+
+
+def _assembled_dtype(dtypes: List, has_missing: bool) -> Optional[np.dtype]:
+    """
+    按 pd.concat 的规则推断输出列的类型
+    
+    Args:
+        dtypes: 各sheet中该列的类型
+        has_missing: 是否有sheet缺少该列（需要填充缺失值）
+    
+    Returns:
+        numpy类型；包含扩展类型（如category）时返回 None，由 pd.concat 处理该列
+    """
+    if not all(isinstance(dtype, np.dtype) for dtype in dtypes):
+        return None
+    if not dtypes:
+        # 所有sheet都缺少该列，与 reindex 一样得到全为 NaN 的浮点列
+        return np.dtype(np.float64)
+    kinds = {dtype.kind for dtype in dtypes}
+    if kinds <= set('iuf'):
+        dtype = np.result_type(*dtypes)
+        return np.dtype(np.float64) if has_missing and dtype.kind in 'iu' else dtype
+    if len(set(dtypes)) == 1 and kinds <= set('Mm'):
+        return dtypes[0]
+    if kinds == {'b'} and not has_missing:
+        return np.dtype(bool)
+    return np.dtype(object)
+
+
+def _assemble_columns(sheets: List[pd.DataFrame], target_headers: List[str]) -> pd.DataFrame:
+    """
+    预分配列数组并按位置复制各sheet的数据
+    
+    表头相同的sheet共用一个列索引，每个sheet只做切片赋值，
+    不产生逐sheet的 reindex 副本，也没有 concat 的块合并
+    """
+    total_rows = sum(len(df) for df in sheets)
+    indexers: Dict[Tuple, np.ndarray] = {}
+    sheet_indexers = []
+    for df in sheets:
+        signature = tuple(df.columns)
+        if signature not in indexers:
+            indexers[signature] = pd.Index(signature).get_indexer(target_headers)
+        sheet_indexers.append(indexers[signature])
+    # 每个sheet只取一次列，避免逐列逐sheet地 iloc 和构造 dtypes
+    sheet_columns = [[column for _, column in df.items()] for df in sheets]
+    
+    columns = {}
+    for col_idx in range(len(target_headers)):
+        positions = [indexer[col_idx] for indexer in sheet_indexers]
+        dtypes = [cols[pos].dtype for cols, pos in zip(sheet_columns, positions) if pos >= 0]
+        has_missing = any(pos < 0 for pos in positions)
+        dtype = _assembled_dtype(dtypes, has_missing)
+        
+        if dtype is None and dtypes and all(
+                isinstance(col_dtype, pd.CategoricalDtype) for col_dtype in dtypes):
+            # 分类列合并各sheet的类别，结果仍为分类（pd.concat 遇到不同的类别会退化为object）
+            parts = [
+                cols[pos].array if pos >= 0
+                else pd.Categorical.from_codes(np.full(len(df), -1), dtype=dtypes[0])
+                for df, cols, pos in zip(sheets, sheet_columns, positions)
+            ]
+            try:
+                columns[col_idx] = pd.Series(union_categoricals(parts, ignore_order=True))
+                continue
+            except TypeError:
+                pass  # 各sheet类别的类型不同（如数字和文本），按一般扩展类型处理
+        
+        if dtype is None:
+            # 扩展类型保持 pd.concat 的语义，只对这一列做拼接；
+            # 各sheet类型相同（如统一后的 Int64）时缺失部分使用同一类型，避免退化
+            fill_dtype = dtypes[0] if len(set(dtypes)) == 1 else None
+            parts = [
+                cols[pos] if pos >= 0
+                else pd.Series([None] * len(df), dtype=fill_dtype) if fill_dtype is not None
+                else pd.Series(np.nan, index=range(len(df)))
+                for df, cols, pos in zip(sheets, sheet_columns, positions)
+            ]
+            columns[col_idx] = pd.concat(parts, ignore_index=True)
+            continue
+        
+        values = np.empty(total_rows, dtype=dtype)
+        start = 0
+        for df, cols, pos in zip(sheets, sheet_columns, positions):
+            end = start + len(df)
+            if pos < 0:
+                values[start:end] = np.datetime64('NaT') if dtype.kind == 'M' else (
+                    np.timedelta64('NaT') if dtype.kind == 'm' else np.nan)
+            else:
+                column = cols[pos]
+                if dtype == object and column.dtype != object:
+                    # 经 pandas 转换，日期等类型得到 Timestamp 而不是整数
+                    column = column.astype(object)
+                values[start:end] = column.to_numpy()
+            start = end
+        columns[col_idx] = values
+    
+    result_df = pd.DataFrame(columns, index=pd.RangeIndex(total_rows))
+    result_df.columns = list(target_headers)
+    return result_df
 
 
 def merge_data(files_data: Dict[str, Dict[str, pd.DataFrame]], 
-               target_headers: List[str]) -> Tuple[pd.DataFrame, List[Dict]]:
+               target_headers: List[str],
+               schema: Optional[Dict] = None) -> Tuple[pd.DataFrame, List[Dict]]:
     """
     合并数据
     
+    按总行数预分配结果列，逐sheet复制到对应位置，
+    合并数千个小sheet时比逐个 reindex 后 pd.concat 快得多
+    
     Args:
         files_data: 文件数据字典，格式为 {file_path: {sheet_name: DataFrame}}
         target_headers: 目标表头列表
+        schema: resolve_schema 得到的统一列类型，每个sheet在组装前转换一次
         
     Returns:
         (合并后的DataFrame, 统计信息列表)
     """
-    merged_data = []
     statistics = []
-    
+    sheets = []
     for file_path, sheets_data in files_data.items():
         for sheet_name, df in sheets_data.items():
-            original_rows = len(df)
-            
-            # 对齐列：使用reindex方法，缺失的列会自动填充NaN
-            aligned_df = df.reindex(columns=target_headers)
-            
-            merged_data.append(aligned_df)
-            
+            if isinstance(df, CsvChunkReader):
+                df = df.to_frame()
+            sheets.append(apply_schema(df, schema))
             statistics.append({
                 'file': Path(file_path).name,
                 'sheet': sheet_name,
-                'rows': original_rows
+                'rows': len(df)
             })
     
-    if merged_data:
-        result_df = pd.concat(merged_data, ignore_index=True)
-        return result_df, statistics
+    if sheets:
+        return _assemble_columns(sheets, target_headers), statistics
     else:
         return pd.DataFrame(), statistics
 
 
-def save_result(df: pd.DataFrame, 
-                output_path: str) -> bool:
+def _write_csv_chunks(chunks: Iterable[pd.DataFrame], output_path: str):
+    """逐块追加写入CSV，只在第一块写表头"""
+    first = True
+    for chunk in chunks:
+        chunk.to_csv(
+            output_path,
+            index=False,
+            encoding='utf-8-sig' if first else 'utf-8',
+            mode='w' if first else 'a',
+            header=first
+        )
+        first = False
+    if first:
+        # 没有任何数据块时创建空文件
+        pd.DataFrame().to_csv(output_path, index=False, encoding='utf-8-sig')
+
+
+def _append_csv_chunks(chunks: Iterable[pd.DataFrame], output_path: str):
+    """在已有的CSV之后逐块追加（不写表头），出错时截断回追加前的大小"""
+    original_size = os.path.getsize(output_path)
+    try:
+        for chunk in chunks:
+            chunk.to_csv(output_path, index=False, encoding='utf-8', mode='a', header=False)
+    except BaseException:
+        with open(output_path, 'r+b') as f:
+            f.truncate(original_size)
+        raise
+
+
+# resolve_schema 的目标类型对应的Arrow类型
+_ARROW_TYPES = {
+    'int64': 'int64',
+    'Int64': 'int64',
+    'float64': 'float64',
+    'bool': 'bool',
+    'boolean': 'bool',
+    'datetime64[ns]': 'timestamp[ns]',
+    'string': 'string',
+}
+
+
+def _arrow_column(series: pd.Series):
+    """
+    把一列转换为Arrow数组
+    
+    分类列解码为普通值（Parquet写入时会自动字典编码，各数据块的类别也不必相同）；
+    同一列混合数字和文本等无法转换的列写成文本
     """
-    保存合并结果
+    try:
+        array = pa.array(series, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        values = series.astype(object).where(series.notna(), None)
+        array = pa.array(
+            [value if value is None else str(value) for value in values], type=pa.string()
+        )
+    if pa.types.is_dictionary(array.type):
+        array = array.cast(array.type.value_type)
+    return array
+
+
+def _arrow_schema(chunk: pd.DataFrame, schema: Optional[Dict] = None,
+                  conflicts: Optional[List[Dict]] = None):
+    """
+    在写入第一个数据块之前确定整个文件的Arrow结构
+    
+    - 无法统一类型的列（见 resolve_schema 的 conflicts）写成文本
+    - 有统一类型的列使用该类型
+    - 其他列使用第一个数据块的类型，全为空的列先按文本处理
+    Arrow要求列名为字符串，非字符串列名转换为文本
+    """
+    schema = schema or {}
+    conflicted = {conflict['column'] for conflict in conflicts or []}
+    fields = []
+    for idx, header in enumerate(chunk.columns):
+        if header in conflicted:
+            field_type = pa.string()
+        elif schema.get(header) in _ARROW_TYPES:
+            field_type = pa.type_for_alias(_ARROW_TYPES[schema[header]])
+        else:
+            field_type = _arrow_column(chunk.iloc[:, idx]).type
+            if pa.types.is_null(field_type):
+                field_type = pa.string()
+        fields.append(pa.field(str(header), field_type))
+    return pa.schema(fields)
+
+
+def _widened_type(field_type, array_type):
+    """数据块的列无法转换为已写入的类型时放宽后的类型：整数遇到浮点放宽为浮点，其他情况为文本"""
+    if pa.types.is_integer(field_type) and (pa.types.is_floating(array_type) or pa.types.is_integer(array_type)):
+        return pa.float64()
+    return pa.string()
+
+
+def _cast_column(array, field_type):
+    """转换Arrow数组的类型，Arrow不支持转换为文本的类型逐个值转换"""
+    try:
+        return array.cast(field_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        if not pa.types.is_string(field_type):
+            raise
+        return pa.array(
+            [value if value is None else str(value) for value in array.to_pylist()], type=pa.string()
+        )
+
+
+def _arrow_table(chunk: pd.DataFrame, schema):
+    """
+    把数据块转换为Arrow表，各列转换为 schema 中的类型
+    
+    某列无法转换（如之前是整数、这个数据块有小数或文本）时不报错，放宽该列的类型（见 _widened_type）
+    
+    Returns:
+        (Arrow表, 结构)；有列被放宽时结构与传入的 schema 不同，已写入的数据需要按新结构重写
+    """
+    arrays = []
+    for idx in range(chunk.shape[1]):
+        array = _arrow_column(chunk.iloc[:, idx])
+        field = schema.field(idx)
+        if array.type != field.type:
+            try:
+                array = array.cast(field.type)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                widened = _widened_type(field.type, array.type)
+                print(f"警告: 列 {field.name} 的类型从 {field.type} 放宽为 {widened}")
+                schema = schema.set(idx, field.with_type(widened))
+                array = _cast_column(array, widened)
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, schema=schema), schema
+
+
+def _cast_table(table, schema):
+    """把已转换的Arrow表转换为放宽后的结构"""
+    return pa.Table.from_arrays(
+        [_cast_column(column.combine_chunks(), field.type) for column, field in zip(table.columns, schema)],
+        schema=schema
+    )
+
+
+def _compression_option(compression: Optional[str], default: str) -> Optional[str]:
+    """统一压缩参数：None 使用默认值，'none'/'uncompressed' 表示不压缩"""
+    if compression is None:
+        compression = default
+    if compression.lower() in ('none', 'uncompressed'):
+        return None
+    return compression.lower()
+
+
+def _widening_path(output_path: str) -> str:
+    """放宽列类型时已写入的数据暂存的路径"""
+    path = Path(output_path)
+    return str(path.with_name(f"{path.stem}.widening{path.suffix}"))
+
+
+def _rewrite_parquet(writer, output_path: str, schema, compression: Optional[str]):
+    """关闭当前的写入器，把已写入的行组按放宽后的结构重写，返回新的写入器"""
+    writer.close()
+    temp_path = _widening_path(output_path)
+    os.replace(output_path, temp_path)
+    try:
+        writer = pq.ParquetWriter(output_path, schema, compression=compression or 'none')
+        with open(temp_path, 'rb') as source:
+            written = pq.ParquetFile(source)
+            for index in range(written.num_row_groups):
+                writer.write_table(_cast_table(written.read_row_group(index), schema))
+    except BaseException:
+        os.replace(temp_path, output_path)
+        raise
+    os.remove(temp_path)
+    return writer
+
+
+def _write_parquet_chunks(chunks: Iterable[pd.DataFrame], output_path: str,
+                          compression: Optional[str] = None,
+                          row_group_size: Optional[int] = None,
+                          base: Optional[str] = None,
+                          schema: Optional[Dict] = None,
+                          conflicts: Optional[List[Dict]] = None):
+    """
+    逐块写入Parquet
+    
+    文件的结构在第一个数据块时按 schema/conflicts 确定（见 _arrow_schema）；之后的数据块中
+    某列无法转换时放宽该列的类型，已写入的行组按新结构重写一次，不会因为类型变化而写入失败。
+    数据块累积到 row_group_size 行再写成一个行组，避免每个小数据块形成一个很小的行组；
+    内存中最多保留一个行组的数据。
+    base 不为 None 时先逐个复制该Parquet文件的行组（不转换为pandas），新数据块转换为它的结构
+    """
+    if pq is None:
+        raise ImportError("输出 Parquet 文件需要安装 pyarrow")
+    compression = _compression_option(compression, PARQUET_COMPRESSION)
+    row_group_size = row_group_size or PARQUET_ROW_GROUP_ROWS
+    writer = None
+    arrow_schema = None
+    if base is not None:
+        with open(base, 'rb') as source:
+            base_file = pq.ParquetFile(source)
+            arrow_schema = base_file.schema_arrow
+            writer = pq.ParquetWriter(output_path, arrow_schema, compression=compression or 'none')
+            try:
+                for index in range(base_file.num_row_groups):
+                    writer.write_table(base_file.read_row_group(index))
+            except BaseException:
+                writer.close()
+                raise
+    pending: List = []
+    pending_rows = 0
+    
+    def flush():
+        nonlocal pending, pending_rows
+        if pending:
+            writer.write_table(pa.concat_tables(pending), row_group_size=row_group_size)
+            pending = []
+            pending_rows = 0
+    
+    try:
+        for chunk in chunks:
+            if arrow_schema is None:
+                arrow_schema = _arrow_schema(chunk, schema, conflicts)
+            table, widened = _arrow_table(chunk, arrow_schema)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, widened, compression=compression or 'none')
+            elif widened != arrow_schema:
+                writer = _rewrite_parquet(writer, output_path, widened, compression)
+                pending = [_cast_table(pending_table, widened) for pending_table in pending]
+            arrow_schema = widened
+            pending.append(table)
+            pending_rows += table.num_rows
+            if pending_rows >= row_group_size:
+                flush()
+        if writer is None:
+            # 没有任何数据块时写入空文件
+            writer = pq.ParquetWriter(output_path, pa.schema([]), compression=compression or 'none')
+        flush()
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _rewrite_feather(writer, output_path: str, schema, options):
+    """关闭当前的写入器，把已写入的记录批次按放宽后的结构重写，返回新的写入器"""
+    writer.close()
+    temp_path = _widening_path(output_path)
+    os.replace(output_path, temp_path)
+    try:
+        writer = pa.ipc.new_file(output_path, schema, options=options)
+        with pa.memory_map(temp_path) as source:
+            reader = pa.ipc.open_file(source)
+            for index in range(reader.num_record_batches):
+                batch = pa.Table.from_batches([reader.get_batch(index)])
+                writer.write_table(_cast_table(batch, schema))
+    except BaseException:
+        os.replace(temp_path, output_path)
+        raise
+    os.remove(temp_path)
+    return writer
+
+
+def _write_feather_chunks(chunks: Iterable[pd.DataFrame], output_path: str,
+                          compression: Optional[str] = None,
+                          schema: Optional[Dict] = None,
+                          conflicts: Optional[List[Dict]] = None):
+    """
+    逐块写入Feather（Arrow IPC文件格式），每个数据块是一个记录批次
+    
+    结构的确定和放宽与 _write_parquet_chunks 相同
+    """
+    if pa is None:
+        raise ImportError("输出 Feather 文件需要安装 pyarrow")
+    options = pa.ipc.IpcWriteOptions(compression=_compression_option(compression, FEATHER_COMPRESSION))
+    writer = None
+    arrow_schema = None
+    try:
+        for chunk in chunks:
+            if arrow_schema is None:
+                arrow_schema = _arrow_schema(chunk, schema, conflicts)
+            table, widened = _arrow_table(chunk, arrow_schema)
+            if writer is None:
+                writer = pa.ipc.new_file(output_path, widened, options=options)
+            elif widened != arrow_schema:
+                writer = _rewrite_feather(writer, output_path, widened, options)
+            arrow_schema = widened
+            writer.write_table(table)
+        if writer is None:
+            writer = pa.ipc.new_file(output_path, pa.schema([]), options=options)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _sqlite_type(dtype) -> str:
+    """pandas列类型对应的SQLite列类型"""
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'TIMESTAMP'
+    return 'TEXT'
+
+
+def _sqlite_value(value):
+    """把SQLite不支持的值转换为文本（日期时间使用ISO格式）"""
+    if value is None or isinstance(value, (int, float, str, bytes)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime.datetime) else value.isoformat()
+    return str(value)
+
+
+def _sqlite_rows(chunk: pd.DataFrame) -> Iterator[tuple]:
+    """把数据块转换为可直接插入SQLite的行，缺失值写成 NULL"""
+    columns = []
+    for idx in range(chunk.shape[1]):
+        series = chunk.iloc[:, idx]
+        values = series.astype(object).where(series.notna(), None)
+        if not (pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype)):
+            values = values.map(_sqlite_value)
+        columns.append(values.tolist())
+    return zip(*columns)
+
+
+def _quote_identifier(name) -> str:
+    """SQLite标识符加引号"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _write_sqlite_chunks(chunks: Iterable[pd.DataFrame], output_path: str,
+                         table_name: Optional[str] = None):
+    """
+    逐块批量插入SQLite表
+    
+    同名的表会被替换，数据库中的其他表不受影响；整个写入在一个事务中完成，
+    出错或被取消时回滚，数据库保持原样
+    """
+    table = _quote_identifier(table_name or SQLITE_TABLE_NAME)
+    connection = sqlite3.connect(output_path, isolation_level=None)
+    try:
+        # 批量写入时不等待每次落盘，提交时才同步
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.execute("BEGIN")
+        try:
+            insert_sql = None
+            for chunk in chunks:
+                if insert_sql is None:
+                    columns = ", ".join(
+                        f"{_quote_identifier(name)} {_sqlite_type(dtype)}"
+                        for name, dtype in zip(chunk.columns, chunk.dtypes)
+                    )
+                    connection.execute(f"DROP TABLE IF EXISTS {table}")
+                    connection.execute(f"CREATE TABLE {table} ({columns})")
+                    placeholders = ", ".join("?" * chunk.shape[1])
+                    insert_sql = f"INSERT INTO {table} VALUES ({placeholders})"
+                connection.executemany(insert_sql, _sqlite_rows(chunk))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+    finally:
+        connection.close()
+
+
+def output_format(output_path: str) -> str:
+    """根据扩展名判断输出格式（'xlsx'、'csv'、'parquet'、'feather'、'sqlite'）"""
+    return OUTPUT_FORMATS.get(Path(output_path).suffix.lower(), 'xlsx')
+
+
+def available_output_formats() -> List[str]:
+    """当前环境可以写入的输出格式（Parquet/Feather需要pyarrow）"""
+    formats = ['xlsx', 'csv']
+    if pa is not None:
+        formats += ['parquet', 'feather']
+    formats.append('sqlite')
+    return formats
+
+
+def _parquet_compression(path: str) -> Optional[str]:
+    """已有Parquet文件使用的压缩算法（追加时沿用），无法确定时返回 None"""
+    with open(path, 'rb') as source:
+        metadata = pq.ParquetFile(source).metadata
+    if metadata.num_row_groups == 0 or metadata.num_columns == 0:
+        return None
+    return metadata.row_group(0).column(0).compression.lower()
+
+
+def _append_parquet_chunks(chunks: Iterable[pd.DataFrame], output_path: str,
+                           compression: Optional[str] = None,
+                           row_group_size: Optional[int] = None):
+    """
+    在已有的Parquet之后追加数据块
+    
+    Parquet文件不能原地追加：原有的行组按原样复制到临时文件（不解码为pandas），
+    再写入新的行组，完成后替换原文件；出错时原文件保持不变
+    """
+    if pq is None:
+        raise ImportError("追加 Parquet 文件需要安装 pyarrow")
+    if compression is None:
+        compression = _parquet_compression(output_path)
+    path = Path(output_path)
+    temp_path = str(path.with_name(f"{path.stem}.appending{path.suffix}"))
+    try:
+        _write_parquet_chunks(chunks, temp_path, compression, row_group_size, base=output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, output_path)
+
+
+def read_output_header(output_path: str) -> List[str]:
+    """
+    读取已有输出文件的表头（不读取数据行）
+    
+    只支持可追加的格式（见 APPEND_FORMATS），文件为空或没有列时返回空列表
+    """
+    file_format = output_format(output_path)
+    if file_format not in APPEND_FORMATS:
+        raise ValueError(f"不支持读取 {file_format} 输出的表头")
+    if os.path.getsize(output_path) == 0:
+        return []
+    if file_format == 'csv':
+        try:
+            columns = pd.read_csv(output_path, nrows=0, encoding='utf-8-sig').columns
+        except pd.errors.EmptyDataError:
+            return []
+        return [str(c) for c in columns]
+    if file_format == 'parquet':
+        if pq is None:
+            raise ImportError("读取 Parquet 文件需要安装 pyarrow")
+        return list(pq.read_schema(output_path).names)
+    return read_excel_header(output_path)
+
+
+def iter_output_chunks(output_path: str, chunk_size: Optional[int] = None,
+                       as_text: bool = False) -> Iterator[pd.DataFrame]:
+    """
+    逐块读回已有的输出文件（用于为已有结果建立重复行索引）
+    
+    CSV读回时默认按内容推断类型，日期、有前导零的编号等可能与合并时的数据块不同；
+    as_text 为 True 时所有列都按写入的文本读回（只有空单元格为缺失值），由调用方还原类型
+    """
+    chunk_size = chunk_size or MERGE_CHUNK_ROWS
+    file_format = output_format(output_path)
+    if file_format == 'csv':
+        if as_text:
+            yield from pd.read_csv(output_path, chunksize=chunk_size, encoding='utf-8-sig',
+                                   dtype=str, keep_default_na=False, na_values=[''])
+        else:
+            yield from pd.read_csv(output_path, chunksize=chunk_size, encoding='utf-8-sig')
+    elif file_format == 'parquet':
+        if pq is None:
+            raise ImportError("读取 Parquet 文件需要安装 pyarrow")
+        for batch in pq.ParquetFile(output_path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif file_format == 'xlsx':
+        yield from iter_excel_chunks(output_path, chunk_size)
+    else:
+        raise ValueError(f"不支持读取 {file_format} 输出")
+
+
+def count_output_rows(output_path: str) -> int:
+    """已有输出文件的数据行数（不含表头），Parquet直接读取元数据，其他格式逐块读回计数"""
+    if output_format(output_path) == 'parquet':
+        if pq is None:
+            raise ImportError("读取 Parquet 文件需要安装 pyarrow")
+        return pq.ParquetFile(output_path).metadata.num_rows
+    return sum(len(chunk) for chunk in iter_output_chunks(output_path, as_text=True))
+
+
+def append_result(chunks: Iterable[pd.DataFrame], output_path: str,
+                  compression: Optional[str] = None,
+                  row_group_size: Optional[int] = None) -> bool:
+    """
+    在已有的输出文件之后追加数据块，列顺序必须与已有的表头一致（见 read_output_header）
+    
+    - .csv: 直接追加到文件末尾
+    - .parquet: 复制原有行组并写入新的行组后替换原文件（压缩算法默认沿用原文件）
+    - .xlsx: 逐行复制原有数据并追加后替换原文件（不支持已拆分的结果）
+    出错时原文件保持不变
+    
+    Args:
+        chunks: 按顺序产出数据块的迭代器
+        output_path: 已有的输出文件路径
+        compression: Parquet的压缩算法，为 None 时沿用原文件
+        row_group_size: Parquet每个行组的最大行数，为 None 时使用默认值
+    
+    Returns:
+        是否追加成功
+    
+    Raises:
+        MergeCancelled: 数据块迭代器中途取消（原文件保持不变）
+    """
+    try:
+        file_format = output_format(output_path)
+        if file_format == 'csv':
+            _append_csv_chunks(chunks, output_path)
+        elif file_format == 'parquet':
+            _append_parquet_chunks(chunks, output_path, compression, row_group_size)
+        elif file_format == 'xlsx':
+            append_excel_chunks(chunks, output_path)
+        else:
+            raise ValueError(f"{file_format} 输出不支持追加（支持 {'、'.join(APPEND_FORMATS)}）")
+        return os.path.exists(output_path) and os.path.getsize(output_path) > 0
+    except MergeCancelled:
+        raise
+    except Exception as e:
+        print(f"追加到文件时出错: {e}")
+        return False
+
+
+def save_result(df: Union[pd.DataFrame, Iterable[pd.DataFrame]], 
+                output_path: str,
+                compression: Optional[str] = None,
+                row_group_size: Optional[int] = None,
+                table_name: Optional[str] = None,
+                shard_rows: Optional[int] = None,
+                shard_mode: str = 'files',
+                schema: Optional[Dict] = None,
+                conflicts: Optional[List[Dict]] = None) -> bool:
+    """
+    保存合并结果，格式由扩展名决定（见 OUTPUT_FORMATS）
+    
+    所有格式都逐块写入，可以直接接在流式合并之后：
+    - .xlsx: openpyxl只写模式，超过 shard_rows 行时自动拆分为多个文件或sheet（见 write_excel_sharded）
+    - .csv: utf-8-sig 编码
+    - .parquet: 需要pyarrow，数据块累积到 row_group_size 行写成一个行组
+    - .feather/.arrow: 需要pyarrow，Arrow IPC文件格式
+    - .sqlite/.db: 批量插入 table_name 表（替换同名的表）
     
     Args:
-        df: 要保存的DataFrame
+        df: 要保存的DataFrame，或按顺序产出数据块的迭代器（如 iter_merge_chunks 的结果）
         output_path: 保存路径
+        compression: Parquet/Feather的压缩算法，为 None 时使用默认值，'none' 表示不压缩
+        row_group_size: Parquet每个行组的最大行数，为 None 时使用默认值
+        table_name: SQLite表名，为 None 时使用默认值
+        shard_rows: xlsx每个文件/sheet的最大数据行数，为 None 时使用Excel的上限
+        shard_mode: xlsx超过上限时的拆分方式，'files' 或 'sheets'
+        schema: resolve_schema 得到的统一列类型，Parquet/Feather按此确定文件的结构
+        conflicts: resolve_schema 得到的无法统一类型的列，Parquet/Feather中写成文本
         
     Returns:
         是否保存成功
+    
+    Raises:
+        MergeCancelled: 数据块迭代器中途取消，写了一半的输出由调用方清理
     """
     try:
-        if output_path.lower().endswith('.csv'):
-            df.to_csv(output_path, index=False, encoding='utf-8-sig')
+        chunks = [df] if isinstance(df, pd.DataFrame) else df
+        written = [output_path]
+        file_format = output_format(output_path)
+        if file_format == 'csv':
+            _write_csv_chunks(chunks, output_path)
+        elif file_format == 'parquet':
+            _write_parquet_chunks(chunks, output_path, compression, row_group_size,
+                                  schema=schema, conflicts=conflicts)
+        elif file_format == 'feather':
+            _write_feather_chunks(chunks, output_path, compression, schema, conflicts)
+        elif file_format == 'sqlite':
+            _write_sqlite_chunks(chunks, output_path, table_name)
         else:
-            df.to_excel(output_path, index=False, engine='openpyxl')
+            written = write_excel_sharded(chunks, output_path, shard_rows, shard_mode)
         
-        # 验证文件是否存在且大小大于0
-        import os
-        if os.path.exists(output_path):
-            file_size = os.path.getsize(output_path)
-            return file_size > 0
-        return False
+        # 验证文件（拆分时为每个部分）是否存在且大小大于0
+        return all(os.path.exists(path) and os.path.getsize(path) > 0 for path in written)
+    except MergeCancelled:
+        raise
     except Exception as e:
         print(f"保存文件时出错: {e}")
         return False
-
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+重复行检测模块
+按数据块增量计算64位行哈希，只保存紧凑的哈希数组，适合流式合并；
+已见哈希可以保存到磁盘，追加合并时用于与已有结果比较
+"""
+
+import os
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# 两个哈希使用的密钥（必须是16字节）：第一个是pandas的默认密钥，第二个与之不同
+_PRIMARY_HASH_KEY = "0123456789123456"
+_SECONDARY_HASH_KEY = "merge_excels_dup"
+
+# 行哈希的计算方式，保存在索引文件中；计算方式改变后旧索引需要重建
+_HASH_VERSION = 2
+
+# 已见哈希的有序数组段：(一级哈希, 二级哈希)，均按一级哈希排序
+_Run = Tuple[np.ndarray, np.ndarray]
+
+# infer_dtype 结果为这些值的object列全部是数字
+_NUMERIC_INFERRED = {'integer', 'floating', 'mixed-integer-float', 'decimal'}
+
+
+def _is_number(value) -> bool:
+    """是否为数字（不包括布尔值）"""
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_))
+
+
+def _hash_column(series: pd.Series, hash_key: str) -> np.ndarray:
+    """
+    计算一列中每个值的64位哈希，同一个值不论所在列的类型都得到相同的哈希
+    
+    pandas合并后按值相等判断重复，而同一列在不同数据块中的类型可能不同：
+    - 数字（int64、float64、可空整数、object列中的整数和小数）都按float64哈希
+    - 缺失值（NaN、None、pd.NA、NaT）都与float64的NaN哈希相同，
+      因此sheet缺少的列（reindex 得到全为NaN的float64列）与其他数据块中的空值一致
+    - 文本（object、Arrow字符串、分类列的值）按字符串哈希
+    """
+    missing = series.isna().to_numpy()
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        series = series.astype(dtype.categories.dtype if len(dtype.categories) else object)
+        dtype = series.dtype
+    if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        return pd.util.hash_array(values, hash_key=hash_key)
+    
+    missing_hash = pd.util.hash_array(np.array([np.nan]), hash_key=hash_key)[0]
+    if missing.all():
+        return np.full(len(series), missing_hash, dtype=np.uint64)
+    if isinstance(dtype, pd.StringDtype) or dtype == object:
+        values = series.to_numpy(dtype=object, na_value=None)
+        inferred = pd.api.types.infer_dtype(values, skipna=True)
+        if inferred in _NUMERIC_INFERRED:
+            numbers = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(np.float64)
+            return pd.util.hash_array(numbers, hash_key=hash_key)
+        hashes = np.full(len(series), missing_hash, dtype=np.uint64)
+        if inferred == 'string':
+            present = ~missing
+            hashes[present] = pd.util.hash_array(values[present], hash_key=hash_key)
+            return hashes
+        # 混合类型的列逐个值区分数字和其他值
+        numeric = np.fromiter((_is_number(value) for value in values), dtype=bool, count=len(values))
+        numeric &= ~missing
+        other = ~numeric & ~missing
+        if numeric.any():
+            hashes[numeric] = pd.util.hash_array(values[numeric].astype(np.float64), hash_key=hash_key)
+        if other.any():
+            hashes[other] = pd.util.hash_array(values[other], hash_key=hash_key)
+        return hashes
+    # pandas 3 写时复制，to_numpy 可能返回只读视图
+    hashes = pd.util.hash_pandas_object(series, index=False, hash_key=hash_key).to_numpy(np.uint64, copy=True)
+    hashes[missing] = missing_hash
+    return hashes
+
+
+def _hash_frame(chunk: pd.DataFrame, hash_key: str) -> np.ndarray:
+    """先逐列计算值的哈希，再把各列的哈希组合为行哈希"""
+    hashes = pd.DataFrame(
+        {idx: _hash_column(chunk.iloc[:, idx], hash_key) for idx in range(chunk.shape[1])},
+        index=pd.RangeIndex(len(chunk))
+    )
+    return pd.util.hash_pandas_object(hashes, index=False, hash_key=hash_key).to_numpy(np.uint64)
+
+
+def hash_rows(chunk: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算每一行的两个相互独立的64位哈希
+    
+    Args:
+        chunk: 数据块
+    
+    Returns:
+        (一级哈希数组, 二级哈希数组)，dtype 为 uint64
+    """
+    primary = _hash_frame(chunk, _PRIMARY_HASH_KEY)
+    # 二级哈希换一个密钥并反转列顺序，使各列的组合方式也不同
+    secondary = _hash_frame(chunk.iloc[:, ::-1], _SECONDARY_HASH_KEY)
+    return primary, secondary
+
+
+class RowDeduplicator:
+    """
+    增量重复行检测
+    
+    每个数据块先用向量化的64位行哈希初筛：块内哈希相同的行再用pandas逐值比较确认；
+    与之前数据块的比较只保存了哈希、没有保存行本身，因此不逐值确认，而是要求两个独立的64位哈希同时相等
+    （相当于128位哈希，不同的行被误判为重复的概率约为 行数² / 2^129，可以忽略）。
+    已见哈希保存为若干有序numpy数组段（每行16字节），按大小合并，查找和插入都是对数复杂度
+    """
+    
+    def __init__(self):
+        self._runs: List[_Run] = []
+        self.total_rows = 0
+        self.duplicate_count = 0
+    
+    def duplicated(self, chunk: pd.DataFrame) -> np.ndarray:
+        """
+        标记数据块中与之前所有行（包括本块中更早的行）重复的行，并记录新出现的行
+        
+        Args:
+            chunk: 数据块，列顺序必须与之前的数据块一致
+        
+        Returns:
+            布尔数组，True 表示该行是重复行
+        """
+        if chunk.empty:
+            return np.zeros(0, dtype=bool)
+        primary, secondary = hash_rows(chunk)
+        
+        # 块内重复：只有一级哈希相同的候选行才做逐值比较
+        mask = np.zeros(len(chunk), dtype=bool)
+        candidates = pd.Series(primary).duplicated(keep=False).to_numpy()
+        if candidates.any():
+            mask[candidates] = chunk.iloc[candidates].duplicated().to_numpy()
+        
+        # 与之前数据块比较
+        unique = ~mask
+        if self._runs:
+            mask[unique] = self._seen(primary[unique], secondary[unique])
+        
+        new_rows = ~mask
+        self._add_run(primary[new_rows], secondary[new_rows])
+        self.total_rows += len(chunk)
+        self.duplicate_count += int(mask.sum())
+        return mask
+    
+    def drop_duplicates(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """返回去掉重复行后的数据块"""
+        mask = self.duplicated(chunk)
+        if not mask.any():
+            return chunk
+        return chunk[~mask]
+    
+    def save(self, path: str):
+        """把已见哈希合并为一个有序段保存为npz文件（先写临时文件再替换，中途出错不会损坏原索引）"""
+        if self._runs:
+            primary = np.concatenate([run[0] for run in self._runs])
+            secondary = np.concatenate([run[1] for run in self._runs])
+            order = np.argsort(primary, kind='stable')
+            primary, secondary = primary[order], secondary[order]
+            self._runs = [(primary, secondary)]
+        else:
+            primary = secondary = np.zeros(0, dtype=np.uint64)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez(f, primary=primary, secondary=secondary, version=np.int64(_HASH_VERSION))
+        os.replace(temp_path, path)
+    
+    @classmethod
+    def load(cls, path: str) -> 'RowDeduplicator':
+        """
+        从 save 保存的npz文件恢复已见哈希
+        
+        Raises:
+            ValueError: 索引由其他版本的行哈希计算方式生成
+        """
+        deduplicator = cls()
+        with np.load(path) as data:
+            version = int(data['version']) if 'version' in data.files else 1
+            if version != _HASH_VERSION:
+                raise ValueError(f"行哈希版本为 {version}，当前为 {_HASH_VERSION}")
+            primary = data['primary'].astype(np.uint64, copy=False)
+            secondary = data['secondary'].astype(np.uint64, copy=False)
+        if len(primary):
+            deduplicator._runs = [(primary, secondary)]
+        return deduplicator
+    
+    @property
+    def unique_count(self) -> int:
+        """已见的不重复行数"""
+        return sum(len(run[0]) for run in self._runs)
+    
+    def _seen(self, primary: np.ndarray, secondary: np.ndarray) -> np.ndarray:
+        """判断哈希是否已出现过"""
+        seen = np.zeros(len(primary), dtype=bool)
+        for run_primary, run_secondary in self._runs:
+            left = np.searchsorted(run_primary, primary, side='left')
+            right = np.searchsorted(run_primary, primary, side='right')
+            single = (right - left) == 1
+            seen[single] |= run_secondary[left[single]] == secondary[single]
+            # 一级哈希在同一段中出现多次（真正的哈希碰撞）时逐个比较二级哈希
+            for idx in np.flatnonzero((right - left) > 1):
+                seen[idx] |= bool((run_secondary[left[idx]:right[idx]] == secondary[idx]).any())
+        return seen
+    
+    def _add_run(self, primary: np.ndarray, secondary: np.ndarray):
+        """加入新的有序段，相邻段大小接近时合并，段数保持在对数级别"""
+        if len(primary) == 0:
+            return
+        order = np.argsort(primary, kind='stable')
+        self._runs.append((primary[order], secondary[order]))
+        while len(self._runs) > 1 and len(self._runs[-2][0]) <= 2 * len(self._runs[-1][0]):
+            (p1, s1), (p2, s2) = self._runs.pop(), self._runs.pop()
+            merged_primary = np.concatenate([p2, p1])
+            merged_secondary = np.concatenate([s2, s1])
+            order = np.argsort(merged_primary, kind='stable')
+            self._runs.append((merged_primary[order], merged_secondary[order]))
+
+
+def count_duplicates(df: pd.DataFrame) -> Tuple[int, np.ndarray]:
+    """
+    统计DataFrame中的重复行
+    
+    Args:
+        df: 数据
+    
+    Returns:
+        (重复行数, 重复行布尔数组)，布尔数组可直接用于去重，无需再次扫描
+    """
+    deduplicator = RowDeduplicator()
+    mask = deduplicator.duplicated(df)
+    return deduplicator.duplicate_count, mask
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Excel输出模块
+使用openpyxl只写模式写入xlsx；结果超过每个工作表的行数上限时自动拆分为多个文件或多个sheet，
+拆分为多个文件时在子进程中并行写入，并生成记录各部分行范围的清单文件；
+也支持在已有的xlsx结果后追加数据块
+"""
+
+import os
+import json
+import multiprocessing
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from .constants import EXCEL_MAX_DATA_ROWS, XLSX_SHARD_MODES, XLSX_SHARD_WORKERS, XLSX_WRITE_SLICE_ROWS
+
+
+def _append_rows(worksheet, chunk: pd.DataFrame):
+    """
+    把数据块逐行追加到只写模式的工作表，缺失值写成空单元格
+    
+    每次只把 XLSX_WRITE_SLICE_ROWS 行转换为object，额外内存与数据块大小无关
+    """
+    for start in range(0, len(chunk), XLSX_WRITE_SLICE_ROWS):
+        part = chunk.iloc[start:start + XLSX_WRITE_SLICE_ROWS]
+        values = part.astype(object).where(part.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            worksheet.append(row)
+
+
+def write_excel_chunks(chunks: Iterable[pd.DataFrame], output_path: str, sheet_name: str = "Sheet1"):
+    """
+    使用openpyxl只写模式逐行写入xlsx
+    
+    只写模式把行直接流式写入临时文件，不会为每个单元格保留对象，
+    内存占用与总行数无关
+    """
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(sheet_name)
+    header_written = False
+    for chunk in chunks:
+        if not header_written:
+            worksheet.append(list(chunk.columns))
+            header_written = True
+        _append_rows(worksheet, chunk)
+    workbook.save(output_path)
+
+
+def read_excel_header(output_path: str) -> List[str]:
+    """读取xlsx第一个工作表的表头行（只读模式，不加载其余行）"""
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(output_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[0]
+        header = next(worksheet.iter_rows(max_row=1, values_only=True), None) or ()
+        return [str(value) for value in header if value is not None]
+    finally:
+        workbook.close()
+
+
+def iter_excel_chunks(output_path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """按 chunk_size 行逐块读取xlsx第一个工作表（第一行为表头，表头为空的列跳过）"""
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(output_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header_row = next(rows, None) or ()
+        # 按位置取表头非空的列，表头中间有空单元格时后面的列也不会错位
+        kept = [idx for idx, value in enumerate(header_row) if value is not None]
+        header = [str(header_row[idx]) for idx in kept]
+        buffer = []
+        for row in rows:
+            width = len(row)
+            buffer.append(tuple(row[idx] if idx < width else None for idx in kept))
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=header)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=header)
+    finally:
+        workbook.close()
+
+
+def append_excel_chunks(chunks: Iterable[pd.DataFrame], output_path: str):
+    """
+    在已有的xlsx结果（第一个工作表）之后追加数据块
+    
+    xlsx无法原地追加：以只读模式逐行读取原有的行，与新数据块一起用只写模式写入临时文件，
+    完成后替换原文件，内存占用与行数无关；出错时原文件保持不变。
+    已拆分的结果和追加后超过行数上限的情况不支持，需要改用CSV或Parquet输出
+    """
+    from openpyxl import Workbook, load_workbook
+    
+    if os.path.exists(manifest_path(output_path)):
+        raise ValueError("结果已按行数上限拆分，不支持追加，请改用 CSV 或 Parquet 输出")
+    path = Path(output_path)
+    temp_path = str(path.with_name(f"{path.stem}.appending{path.suffix}"))
+    source = load_workbook(output_path, read_only=True, data_only=True)
+    try:
+        source_sheet = source.worksheets[0]
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(source_sheet.title)
+        data_rows = -1  # 不计表头
+        for row in source_sheet.iter_rows(values_only=True):
+            worksheet.append(row)
+            data_rows += 1
+        for chunk in chunks:
+            data_rows += len(chunk)
+            if data_rows > EXCEL_MAX_DATA_ROWS:
+                raise ValueError(
+                    f"追加后超过 Excel 单个工作表的上限 {EXCEL_MAX_DATA_ROWS} 行，请改用 CSV 或 Parquet 输出"
+                )
+            _append_rows(worksheet, chunk)
+        workbook.save(temp_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finally:
+        source.close()
+    os.replace(temp_path, output_path)
+
+
+def _write_shard(shard: pd.DataFrame, output_path: str) -> int:
+    """子进程入口：把一部分结果写成单独的xlsx，返回行数"""
+    write_excel_chunks([shard], output_path)
+    return len(shard)
+
+
+def _iter_shards(chunks: Iterable[pd.DataFrame], shard_rows: int) -> Iterator[pd.DataFrame]:
+    """把数据块重新切分为每块 shard_rows 行（最后一块可能更少），内存中只保留一块"""
+    buffer: List[pd.DataFrame] = []
+    buffered = 0
+    for chunk in chunks:
+        start = 0
+        while start < len(chunk):
+            take = min(shard_rows - buffered, len(chunk) - start)
+            buffer.append(chunk.iloc[start:start + take])
+            buffered += take
+            start += take
+            if buffered == shard_rows:
+                yield buffer[0] if len(buffer) == 1 else pd.concat(buffer, ignore_index=True)
+                buffer = []
+                buffered = 0
+    if buffered:
+        yield buffer[0] if len(buffer) == 1 else pd.concat(buffer, ignore_index=True)
+
+
+def _fill_sheet(worksheet, chunks: Iterator[pd.DataFrame], limit: int,
+                leftover: Optional[pd.DataFrame] = None) -> Tuple[int, Optional[pd.DataFrame]]:
+    """
+    从 chunks 中逐块取数据直接写入工作表，最多写 limit 行
+    
+    Args:
+        worksheet: 只写模式的工作表（已写入表头）
+        chunks: 数据块迭代器
+        limit: 最多写入的数据行数
+        leftover: 上一个工作表写满后剩下的数据，先于 chunks 写入
+    
+    Returns:
+        (写入的行数, 剩下的数据)；数据已全部写完时剩下的数据为 None
+    """
+    written = 0
+    while True:
+        if leftover is not None:
+            chunk, leftover = leftover, None
+        else:
+            chunk = next(chunks, None)
+        if chunk is None:
+            return written, None
+        if len(chunk) == 0:
+            continue
+        if written == limit:
+            return written, chunk
+        take = min(limit - written, len(chunk))
+        _append_rows(worksheet, chunk if take == len(chunk) else chunk.iloc[:take])
+        written += take
+        if take < len(chunk):
+            leftover = chunk.iloc[take:]
+
+
+def shard_path(output_path: str, index: int) -> str:
+    """第 index 个拆分文件的路径（从1开始），如 合并结果_001.xlsx"""
+    path = Path(output_path)
+    return str(path.with_name(f"{path.stem}_{index:03d}{path.suffix}"))
+
+
+def manifest_path(output_path: str) -> str:
+    """拆分清单的路径，如 合并结果.manifest.json"""
+    path = Path(output_path)
+    return str(path.with_name(f"{path.stem}.manifest.json"))
+
+
+def _create_executor(max_workers: int) -> Executor:
+    """创建写入用的进程池（spawn方式），无法创建时退回线程池"""
+    try:
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+    except (OSError, ValueError, NotImplementedError) as e:
+        print(f"警告: 无法创建进程池，改用线程写入: {e}")
+        return ThreadPoolExecutor(max_workers=max_workers)
+
+
+def _write_shard_files(shards: Iterable[pd.DataFrame], output_path: str, max_workers: int,
+                       entries: List[Dict], written: List[str], first_index: int = 1, first_row: int = 1):
+    """
+    把各部分分别写成编号的xlsx文件（从第 first_index 个开始），同时写入的文件数不超过 max_workers
+    
+    已提交的部分达到并发数时先等待最早的一个完成，内存中最多保留 max_workers + 1 个部分
+    """
+    executor = _create_executor(max_workers)
+    pending: deque = deque()
+    try:
+        for index, shard in enumerate(shards, first_index):
+            path = shard_path(output_path, index)
+            written.append(path)
+            entries.append(_manifest_entry(path, "Sheet1", first_row, len(shard)))
+            first_row += len(shard)
+            pending.append(executor.submit(_write_shard, shard, path))
+            del shard
+            while len(pending) >= max_workers:
+                pending.popleft().result()
+        while pending:
+            pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _manifest_entry(path: str, sheet_name: str, first_row: int, rows: int) -> Dict:
+    """清单中一个部分的记录"""
+    return {
+        'file': Path(path).name,
+        'sheet': sheet_name,
+        'first_row': first_row,
+        'last_row': first_row + rows - 1,
+        'rows': rows,
+    }
+
+
+def write_excel_sharded(chunks: Iterable[pd.DataFrame], output_path: str,
+                        shard_rows: Optional[int] = None, shard_mode: str = 'files',
+                        max_workers: Optional[int] = None) -> List[str]:
+    """
+    写入xlsx，超过 shard_rows 行时自动拆分
+    
+    数据块逐块直接写入只写模式的工作表，不会为判断是否需要拆分而缓存数据；
+    第一个工作表写满并且还有数据时才确定需要拆分：
+    - shard_mode='files': 第一部分保存为 合并结果_001.xlsx，其余部分（合并结果_002.xlsx ...）
+      在子进程中并行写入，此时每个子进程持有一个部分的数据
+    - shard_mode='sheets': 在同一个工作簿中依次写满 Sheet1、Sheet2 ...
+    不超过上限时与 write_excel_chunks 相同，写入 output_path。
+    拆分后在 output_path 旁边生成清单文件（见 manifest_path），记录每个部分的文件、sheet和行范围。
+    写入出错或被取消时删除已写出的部分
+    
+    Args:
+        chunks: 按顺序产出数据块的迭代器
+        output_path: 保存路径
+        shard_rows: 每个文件/sheet的最大数据行数（不含表头），默认为Excel的上限
+        shard_mode: 'files' 或 'sheets'
+        max_workers: 并行写入的进程数，默认为 XLSX_SHARD_WORKERS
+    
+    Returns:
+        写出的xlsx文件列表
+    """
+    from openpyxl import Workbook
+    
+    if shard_mode not in XLSX_SHARD_MODES:
+        raise ValueError(f"未知的拆分方式: {shard_mode}")
+    shard_rows = min(shard_rows or EXCEL_MAX_DATA_ROWS, EXCEL_MAX_DATA_ROWS)
+    max_workers = max(1, max_workers or XLSX_SHARD_WORKERS)
+    manifest = manifest_path(output_path)
+    
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        write_excel_chunks([], output_path)
+        if os.path.exists(manifest):
+            os.remove(manifest)
+        return [output_path]
+    
+    header = list(first.columns)
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Sheet1")
+    worksheet.append(header)
+    rows, leftover = _fill_sheet(worksheet, chunks, shard_rows, first)
+    del first
+    if leftover is None:
+        # 只有一个部分，不需要拆分
+        workbook.save(output_path)
+        if os.path.exists(manifest):
+            os.remove(manifest)  # 同名输出之前拆分时留下的清单已失效
+        return [output_path]
+    
+    print(f"结果超过 {shard_rows} 行，按{'文件' if shard_mode == 'files' else 'sheet'}拆分写入")
+    entries: List[Dict] = []
+    written: List[str] = []
+    try:
+        if shard_mode == 'files':
+            path = shard_path(output_path, 1)
+            written.append(path)
+            workbook.save(path)
+            entries.append(_manifest_entry(path, "Sheet1", 1, rows))
+            _write_shard_files(
+                _iter_shards(chain([leftover], chunks), shard_rows), output_path, max_workers,
+                entries, written, first_index=2, first_row=rows + 1
+            )
+        else:
+            written.append(output_path)
+            entries.append(_manifest_entry(output_path, "Sheet1", 1, rows))
+            index = 1
+            while leftover is not None:
+                index += 1
+                worksheet = workbook.create_sheet(f"Sheet{index}")
+                worksheet.append(header)
+                first_row = entries[-1]['last_row'] + 1
+                rows, leftover = _fill_sheet(worksheet, chunks, shard_rows, leftover)
+                entries.append(_manifest_entry(output_path, worksheet.title, first_row, rows))
+            workbook.save(output_path)
+        with open(manifest, 'w', encoding='utf-8') as f:
+            json.dump({
+                'output': Path(output_path).name,
+                'shard_mode': shard_mode,
+                'max_rows': shard_rows,
+                'total_rows': sum(entry['rows'] for entry in entries),
+                'columns': [str(c) for c in header],
+                'shards': entries,
+            }, f, ensure_ascii=False, indent=2)
+    except BaseException:
+        # 删除写了一半的输出，避免留下不完整的结果
+        for path in written + [manifest]:
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"警告: 删除未完成的输出文件失败 {path}: {e}")
+        raise
+    return written
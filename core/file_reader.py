@@ -4,21 +4,215 @@
 文件读取模块
 """
 
+import re
+import mmap
+import hashlib
+import codecs
+import threading
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from typing import Dict, Optional
-from .constants import SUPPORTED_EXTENSIONS, CSV_ENCODINGS
+from typing import Dict, Iterator, List, Optional, Tuple
+from .constants import (
+    SUPPORTED_EXTENSIONS, CSV_ENCODINGS, CSV_ENCODING_SAMPLE_SIZE,
+    CSV_CHUNK_ROWS, CSV_CHUNKED_MIN_BYTES
+)
 
 
-def read_file_sheets(file_path: str) -> Dict[str, pd.DataFrame]:
+# 已检测的CSV编码缓存，键为 (绝对路径, 文件大小, 修改时间)
+_encoding_cache: Dict[Tuple[str, int, int], str] = {}
+_encoding_cache_lock = threading.Lock()
+
+
+def _file_key(file_path: Path) -> Tuple[str, int, int]:
+    """生成文件缓存键 (绝对路径, 文件大小, 修改时间)"""
+    stat = file_path.stat()
+    return str(file_path.resolve()), stat.st_size, stat.st_mtime_ns
+
+
+def _can_decode(sample: bytes, encoding: str, skip_leading: int = 0) -> bool:
+    """
+    判断字节样本能否用指定编码解码
+    
+    样本可能在多字节字符中间截断，因此末尾不完整的字符不视为错误；
+    skip_leading 大于0时，允许跳过开头最多 skip_leading 个字节（用于文件尾部的样本）
+    """
+    for offset in range(skip_leading + 1):
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            decoder.decode(sample[offset:], final=False)
+            return True
+        except UnicodeDecodeError:
+            continue
+    return False
+
+
+def detect_csv_encoding(file_path: str, sample_size: int = CSV_ENCODING_SAMPLE_SIZE) -> str:
+    """
+    检测CSV文件的编码
+    
+    只读取文件头和文件尾各 sample_size 字节，按 CSV_ENCODINGS 的顺序逐个验证，
+    返回第一个能解码样本的编码。结果按 (路径, 大小, 修改时间) 缓存
+    
+    Args:
+        file_path: 文件路径
+        sample_size: 采样字节数
+        
+    Returns:
+        编码名称
+    """
+    file_path = Path(file_path)
+    key = _file_key(file_path)
+    with _encoding_cache_lock:
+        if key in _encoding_cache:
+            return _encoding_cache[key]
+    
+    file_size = key[1]
+    with open(file_path, 'rb') as f:
+        head = f.read(sample_size)
+        tail = b''
+        if file_size > sample_size:
+            f.seek(max(sample_size, file_size - sample_size))
+            tail = f.read()
+    
+    detected = CSV_ENCODINGS[-1]
+    for encoding in CSV_ENCODINGS:
+        if not _can_decode(head, encoding):
+            continue
+        # 文件尾部样本可能从多字节字符中间开始，允许跳过开头几个字节
+        if tail and not _can_decode(tail, encoding.replace('-sig', ''), skip_leading=3):
+            continue
+        detected = encoding
+        break
+    
+    with _encoding_cache_lock:
+        _encoding_cache[key] = detected
+    return detected
+
+
+def get_file_metadata(file_path: str) -> Dict:
+    """
+    获取文件元数据
+    
+    Args:
+        file_path: 文件路径
+        
+    Returns:
+        字典，包含 size、mtime，CSV文件还包含检测到的 encoding
+    """
+    file_path = Path(file_path)
+    stat = file_path.stat()
+    metadata = {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+    }
+    if file_path.suffix.lower() == '.csv':
+        metadata['encoding'] = detect_csv_encoding(str(file_path))
+    return metadata
+
+
+def _column_filter(columns: Optional[List]):
+    """把列投影转换为 pandas 的 usecols 参数（可调用对象），为 None 时读取所有列"""
+    if columns is None:
+        return None
+    wanted = set(columns)
+    return lambda name: name in wanted
+
+
+def _read_csv(file_path: Path, **kwargs) -> Optional[pd.DataFrame]:
+    """
+    使用检测到的编码读取CSV，只完整解析一次
+    
+    如果采样之外的内容仍出现解码错误，按 CSV_ENCODINGS 中剩余的编码继续尝试，
+    并更新编码缓存
+    """
+    encoding = detect_csv_encoding(str(file_path))
+    candidates = CSV_ENCODINGS[CSV_ENCODINGS.index(encoding):]
+    for candidate in candidates:
+        try:
+            df = pd.read_csv(file_path, encoding=candidate, **kwargs)
+        except UnicodeDecodeError:
+            continue
+        if candidate != encoding:
+            with _encoding_cache_lock:
+                _encoding_cache[_file_key(file_path)] = candidate
+        return df
+    return None
+
+
+class CsvChunkReader:
+    """
+    大CSV文件的惰性数据源
+    
+    不在内存中保存数据，只记录编码、表头和行数（行数来自内存映射的换行符计数），
+    合并时通过 iter_chunks 逐块读取。可以pickle（只包含路径和参数），能在进程间传递
+    """
+    
+    def __init__(self, file_path: str, chunk_rows: int = CSV_CHUNK_ROWS,
+                 columns: Optional[List] = None):
+        self.file_path = str(file_path)
+        self.chunk_rows = chunk_rows
+        self.projection = list(columns) if columns is not None else None
+        self.encoding = detect_csv_encoding(self.file_path)
+        header_df = pd.read_csv(self.file_path, encoding=self.encoding, nrows=0,
+                                usecols=_column_filter(self.projection))
+        self.columns = header_df.columns
+        self.rows = _count_csv_rows(Path(self.file_path))
+    
+    def __len__(self) -> int:
+        return self.rows
+    
+    @property
+    def empty(self) -> bool:
+        return self.rows == 0 or len(self.columns) == 0
+    
+    def iter_chunks(self, chunk_rows: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """
+        逐块读取数据
+        
+        Args:
+            chunk_rows: 每块的行数，为 None 时使用创建时指定的值
+        
+        Yields:
+            DataFrame，索引在整个文件中连续
+        """
+        with pd.read_csv(self.file_path, encoding=self.encoding,
+                         usecols=_column_filter(self.projection),
+                         chunksize=chunk_rows or self.chunk_rows) as reader:
+            for chunk in reader:
+                yield chunk
+    
+    def head(self, rows: int = 10000) -> pd.DataFrame:
+        """读取前 rows 行，用于推断列类型等"""
+        return pd.read_csv(self.file_path, encoding=self.encoding, nrows=rows,
+                           usecols=_column_filter(self.projection))
+    
+    def to_frame(self) -> pd.DataFrame:
+        """读取全部数据"""
+        chunks = list(self.iter_chunks())
+        if not chunks:
+            return self.head(0)
+        return pd.concat(chunks, ignore_index=True)
+
+
+def read_file_sheets(file_path: str, streaming: bool = False,
+                     columns: Optional[List] = None,
+                     csv_chunk_rows: Optional[int] = None) -> Dict[str, pd.DataFrame]:
     """
     读取文件的所有sheet，返回字典 {sheet_name: DataFrame}
     
+    工作簿只打开并解析一次，所有sheet都从同一个句柄中读取
+    
     Args:
         file_path: 文件路径
+        streaming: 是否使用openpyxl只读模式逐行读取xlsx（大sheet不会构建完整的单元格对象树）
+        columns: 列投影，只读取这些列（其余列不转换也不保留），为 None 时读取所有列；
+                 不包含任何投影列的sheet会被跳过
+        csv_chunk_rows: 指定时CSV文件按此行数分块惰性读取；为 None 时只有不小于
+                        CSV_CHUNKED_MIN_BYTES 的CSV文件才分块读取（每块 CSV_CHUNK_ROWS 行）
         
     Returns:
-        字典，键为sheet名称，值为DataFrame。如果读取失败，返回空字典
+        字典，键为sheet名称，值为DataFrame（分块读取的CSV为 CsvChunkReader）。如果读取失败，返回空字典
     """
     file_path = Path(file_path)
     ext = file_path.suffix.lower()
@@ -26,14 +220,14 @@ def read_file_sheets(file_path: str) -> Dict[str, pd.DataFrame]:
     
     try:
         if ext == '.csv':
-            # CSV文件只有一个sheet，尝试多种编码
-            df = None
-            for encoding in CSV_ENCODINGS:
-                try:
-                    df = pd.read_csv(file_path, encoding=encoding)
-                    break
-                except UnicodeDecodeError:
-                    continue
+            if csv_chunk_rows is None and file_path.stat().st_size >= CSV_CHUNKED_MIN_BYTES:
+                csv_chunk_rows = CSV_CHUNK_ROWS
+            if csv_chunk_rows is not None:
+                # 大文件不整体载入内存，合并时再逐块读取
+                reader = CsvChunkReader(str(file_path), csv_chunk_rows, columns)
+                return {} if reader.empty else {'Sheet1': reader}
+            # CSV文件只有一个sheet，先采样检测编码再完整解析一次
+            df = _read_csv(file_path, usecols=_column_filter(columns))
             if df is None or df.empty:
                 return {}
             sheets_data['Sheet1'] = df
@@ -41,6 +235,14 @@ def read_file_sheets(file_path: str) -> Dict[str, pd.DataFrame]:
             # Excel文件可能有多个sheet
             # xlsx使用openpyxl，xls和et让pandas自动选择引擎
             engine = 'openpyxl' if ext in ['.xlsx', '.et'] else None
+            
+            if streaming and engine == 'openpyxl':
+                try:
+                    return _read_xlsx_streaming(file_path, columns)
+                except Exception as e:
+                    # 只读模式失败时回退到常规读取
+                    print(f"警告: 流式读取 {file_path} 失败，改用常规读取: {e}")
+            
             excel_file = None
             try:
                 excel_file = pd.ExcelFile(file_path, engine=engine)
@@ -48,7 +250,6 @@ def read_file_sheets(file_path: str) -> Dict[str, pd.DataFrame]:
                 # 如果指定引擎失败，尝试默认引擎
                 try:
                     excel_file = pd.ExcelFile(file_path)
-                    engine = None  # 使用默认引擎
                 except Exception as e:
                     print(f"无法读取Excel文件 {file_path}: {e}")
                     return {}
@@ -56,14 +257,16 @@ def read_file_sheets(file_path: str) -> Dict[str, pd.DataFrame]:
             if excel_file is None:
                 return {}
             
-            for sheet_name in excel_file.sheet_names:
-                try:
-                    df = pd.read_excel(file_path, sheet_name=sheet_name, engine=engine)
-                    if not df.empty:
-                        sheets_data[sheet_name] = df
-                except Exception as e:
-                    print(f"警告: 读取 {file_path} 的 {sheet_name} sheet 时出错: {e}")
-                    continue
+            # 复用已打开的工作簿逐个解析sheet，避免每个sheet都重新解压解析整个文件
+            with excel_file:
+                for sheet_name in excel_file.sheet_names:
+                    try:
+                        df = excel_file.parse(sheet_name, usecols=_column_filter(columns))
+                        if not df.empty:
+                            sheets_data[sheet_name] = df
+                    except Exception as e:
+                        print(f"警告: 读取 {file_path} 的 {sheet_name} sheet 时出错: {e}")
+                        continue
     except Exception as e:
         print(f"错误: 读取文件 {file_path} 时出错: {e}")
         return {}
@@ -71,29 +274,388 @@ def read_file_sheets(file_path: str) -> Dict[str, pd.DataFrame]:
     return sheets_data
 
 
-def get_all_headers(files_data: Dict[str, Dict[str, pd.DataFrame]]) -> list:
+def _make_column_names(header_row: tuple) -> List:
+    """
+    根据表头行生成列名，规则与pandas一致：空列名为 "Unnamed: i"，重复列名追加 ".1"、".2"
+    
+    Args:
+        header_row: 表头行的单元格值
+        
+    Returns:
+        列名列表
+    """
+    columns = []
+    counts: Dict[object, int] = {}
+    for idx, value in enumerate(header_row):
+        if value is None or value == '':
+            name = f"Unnamed: {idx}"
+        elif isinstance(value, float) and value.is_integer():
+            # xlrd 把数字表头读成浮点数，pandas 会还原为整数
+            name = int(value)
+        else:
+            name = value
+        if name in counts:
+            base = name
+            while name in counts:
+                name = f"{base}.{counts[base]}"
+                counts[base] += 1
+        counts[name] = 1
+        columns.append(name)
+    return columns
+
+
+def _read_xlsx_streaming(file_path: Path, columns: Optional[List] = None) -> Dict[str, pd.DataFrame]:
+    """
+    使用openpyxl只读模式逐行读取xlsx的所有sheet
+    
+    只读模式按行流式解析XML，不会为每个单元格创建对象，适合行数很多的sheet
+    
+    Args:
+        file_path: 文件路径
+        columns: 列投影，每行只保留这些列的值，为 None 时保留所有列
+        
+    Returns:
+        字典，键为sheet名称，值为DataFrame
+    """
+    from openpyxl import load_workbook
+    
+    sheets_data = {}
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            rows = worksheet.iter_rows(values_only=True)
+            header_row = next(rows, None)
+            if header_row is None:
+                continue
+            
+            # 去掉表头末尾的空列
+            header_width = len(_trim_header_row(header_row))
+            if header_width == 0:
+                continue
+            keep = None
+            if columns is not None:
+                wanted = set(columns)
+                keep = [idx for idx, name in enumerate(_make_column_names(header_row[:header_width]))
+                        if name in wanted]
+                if not keep and not any(str(name).startswith('Unnamed: ') for name in wanted):
+                    continue
+            
+            # 与pandas一致：数据行比表头宽时多出的列命名为 "Unnamed: i"（投影时按这个列名判断）；
+            # 中间的空白行保留为全空的行，末尾的空白行去掉（只在后面出现数据时才补上之前的空白行）
+            records = []
+            width = header_width
+            blank_rows = 0
+            for row in rows:
+                row_width = len(row)
+                while row_width and row[row_width - 1] in (None, ''):
+                    row_width -= 1
+                if row_width == 0:
+                    blank_rows += 1
+                    continue
+                if row_width > width:
+                    if keep is not None:
+                        keep.extend(idx for idx in range(width, row_width) if f"Unnamed: {idx}" in wanted)
+                    width = row_width
+                if blank_rows:
+                    records.extend([()] * blank_rows)
+                    blank_rows = 0
+                if keep is not None:
+                    row = tuple(row[idx] if idx < row_width else None for idx in keep)
+                else:
+                    row = row[:row_width]
+                records.append(row)
+            if not records or keep == []:
+                continue
+            
+            names = _make_column_names(header_row[:header_width] + (None,) * (width - header_width))
+            if keep is not None:
+                names = [names[idx] for idx in keep]
+            records = [
+                row + (None,) * (len(names) - len(row)) if len(row) < len(names) else row
+                for row in records
+            ]
+            df = pd.DataFrame.from_records(records, columns=names).infer_objects()
+            sheets_data[worksheet.title] = df
+    finally:
+        workbook.close()
+    
+    return sheets_data
+
+
+def _trim_header_row(header_row: tuple) -> tuple:
+    """去掉表头末尾的空列"""
+    width = len(header_row)
+    while width > 0 and header_row[width - 1] in (None, ''):
+        width -= 1
+    return tuple(header_row[:width])
+
+
+def _count_unquoted_newlines(block: np.ndarray, in_quotes: bool) -> Tuple[int, bool]:
+    """
+    统计数据块中不在引号内的换行符
+    
+    换行符前面的引号个数（加上之前数据块留下的状态）为奇数时位于引号内；
+    转义的引号（""）成对出现，不影响判断
+    
+    Args:
+        block: 字节数组
+        in_quotes: 数据块开始时是否在引号内
+    
+    Returns:
+        (换行符数, 数据块结束时是否在引号内)
+    """
+    newlines = np.flatnonzero(block == 0x0A)
+    quotes = np.flatnonzero(block == 0x22)
+    if len(quotes) == 0:
+        return (0 if in_quotes else len(newlines)), in_quotes
+    quoted = (np.searchsorted(quotes, newlines) + int(in_quotes)) & 1
+    count = len(newlines) - int(np.count_nonzero(quoted))
+    return count, bool((len(quotes) + int(in_quotes)) & 1)
+
+
+def _count_newlines_mmap(file_path: Path, block_size: int = 64 * 1024 * 1024) -> Tuple[int, bytes]:
+    """在内存映射的文件上用numpy分块统计引号外的换行符，返回 (换行符数, 最后一个字节)"""
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = np.frombuffer(mm, dtype=np.uint8)
+            try:
+                lines = 0
+                in_quotes = False
+                for start in range(0, len(data), block_size):
+                    count, in_quotes = _count_unquoted_newlines(data[start:start + block_size], in_quotes)
+                    lines += count
+                last_byte = mm[-1:]
+            finally:
+                del data  # 关闭映射前释放缓冲区引用
+    return lines, last_byte
+
+
+def _count_csv_rows(file_path: Path) -> int:
+    """统计CSV数据行数（按引号外的换行符计数，不含表头）"""
+    if file_path.stat().st_size == 0:
+        return 0
+    try:
+        lines, last_byte = _count_newlines_mmap(file_path)
+    except (OSError, ValueError):
+        # 无法内存映射时逐块读取
+        lines = 0
+        in_quotes = False
+        last_byte = b'\n'
+        with open(file_path, 'rb') as f:
+            while True:
+                block = f.read(1024 * 1024)
+                if not block:
+                    break
+                count, in_quotes = _count_unquoted_newlines(np.frombuffer(block, dtype=np.uint8), in_quotes)
+                lines += count
+                last_byte = block[-1:]
+    if last_byte != b'\n':
+        lines += 1  # 最后一行没有换行符
+    return max(lines - 1, 0)
+
+
+# 工作表XML中的行元素（可能带命名空间前缀）
+_XLSX_ROW_TAG = re.compile(rb'<(?:[A-Za-z_][\w.-]*:)?row[\s>/]')
+
+
+def _count_xlsx_row_tags(workbook, worksheet, block_size: int = 1024 * 1024) -> Optional[int]:
+    """
+    在解压后的工作表XML字节流中统计行元素，不解析单元格
+    
+    需要openpyxl只读工作表的内部属性（压缩包和工作表路径），不可用时返回 None
+    """
+    archive = getattr(workbook, '_archive', None)
+    sheet_path = getattr(worksheet, '_worksheet_path', None)
+    if archive is None or sheet_path is None:
+        return None
+    # 只统计起始位置在 carry 之前的匹配，末尾留给下一块，避免跨块的标签被漏计或重复计数
+    carry = 64
+    count = 0
+    tail = b''
+    with archive.open(sheet_path) as stream:
+        while True:
+            block = stream.read(block_size)
+            data = tail + block
+            if not block:
+                count += len(_XLSX_ROW_TAG.findall(data))
+                break
+            limit = max(len(data) - carry, 0)
+            count += sum(1 for match in _XLSX_ROW_TAG.finditer(data) if match.start() < limit)
+            tail = data[limit:]
+    return count
+
+
+def _probe_xlsx(file_path: Path) -> Dict[str, Dict]:
+    """使用openpyxl只读模式探测xlsx：只读表头行，行数取自sheet的dimension"""
+    from openpyxl import load_workbook
+    
+    probe = {}
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            header_row = next(worksheet.iter_rows(min_row=1, max_row=1, values_only=True), None)
+            header_row = _trim_header_row(header_row or ())
+            if not header_row:
+                continue
+            max_row = worksheet.max_row
+            if max_row is None:
+                # 没有dimension信息时直接在XML字节流中统计行元素
+                max_row = _count_xlsx_row_tags(workbook, worksheet)
+            if max_row is None:
+                # 无法访问XML时只能逐行计数（不构建单元格对象）
+                max_row = sum(1 for _ in worksheet.iter_rows(values_only=True))
+            rows = max_row - 1
+            if rows <= 0:
+                continue
+            probe[worksheet.title] = {
+                'headers': _make_column_names(header_row),
+                'rows': rows,
+            }
+    finally:
+        workbook.close()
+    return probe
+
+
+def _probe_xls(file_path: Path) -> Dict[str, Dict]:
+    """使用xlrd按需加载探测xls：行数取自sheet元数据"""
+    import xlrd
+    
+    probe = {}
+    book = xlrd.open_workbook(str(file_path), on_demand=True)
+    try:
+        for sheet_name in book.sheet_names():
+            sheet = book.sheet_by_name(sheet_name)
+            if sheet.nrows > 1:
+                header_row = _trim_header_row(tuple(sheet.row_values(0)))
+                if header_row:
+                    probe[sheet_name] = {
+                        'headers': _make_column_names(header_row),
+                        'rows': sheet.nrows - 1,
+                    }
+            book.unload_sheet(sheet_name)
+    finally:
+        book.release_resources()
+    return probe
+
+
+def probe_file(file_path: str) -> Dict[str, Dict]:
+    """
+    快速探测文件：只读取sheet名称、表头和行数，不解析全部数据
+    
+    Args:
+        file_path: 文件路径
+        
+    Returns:
+        字典 {sheet_name: {'headers': 列名列表, 'rows': 行数}}。如果读取失败，返回空字典
+    """
+    file_path = Path(file_path)
+    ext = file_path.suffix.lower()
+    
+    try:
+        if ext == '.csv':
+            encoding = detect_csv_encoding(str(file_path))
+            header_df = pd.read_csv(file_path, encoding=encoding, nrows=0)
+            rows = _count_csv_rows(file_path)
+            if rows == 0 or len(header_df.columns) == 0:
+                return {}
+            return {'Sheet1': {'headers': list(header_df.columns), 'rows': rows}}
+        if ext in ['.xlsx', '.et']:
+            try:
+                return _probe_xlsx(file_path)
+            except Exception as e:
+                print(f"警告: 快速探测 {file_path} 失败，改用完整读取: {e}")
+        elif ext == '.xls':
+            try:
+                return _probe_xls(file_path)
+            except Exception as e:
+                print(f"警告: 快速探测 {file_path} 失败，改用完整读取: {e}")
+    except Exception as e:
+        print(f"错误: 探测文件 {file_path} 时出错: {e}")
+        return {}
+    
+    # 无法快速探测时退回完整读取
+    sheets_data = read_file_sheets(str(file_path))
+    return {
+        sheet_name: {'headers': list(df.columns), 'rows': len(df)}
+        for sheet_name, df in sheets_data.items()
+    }
+
+
+def get_all_headers(files_data: Dict[str, Dict]) -> list:
     """
     获取所有文件的表头信息
     
     Args:
-        files_data: 文件数据字典，格式为 {file_path: {sheet_name: DataFrame}}
+        files_data: 文件数据字典，格式为 {file_path: {sheet_name: DataFrame}}，
+                    也可以是 probe_file 的探测结果 {file_path: {sheet_name: {'headers', 'rows'}}}
         
     Returns:
-        表头信息列表，每个元素包含文件、sheet、表头等信息
+        表头信息列表，每个元素包含文件、sheet、表头、行数等信息
     """
     headers_info = []
     for file_path, sheets_data in files_data.items():
-        for sheet_name, df in sheets_data.items():
-            headers = list(df.columns)
+        for sheet_name, sheet in sheets_data.items():
+            if isinstance(sheet, dict):
+                headers, rows = list(sheet['headers']), sheet['rows']
+            else:
+                headers, rows = list(sheet.columns), len(sheet)
             headers_info.append({
                 'file': Path(file_path).name,
                 'sheet': sheet_name,
                 'headers': headers,
+                'rows': rows,
                 'file_path': file_path
             })
     return headers_info
 
 
+def header_signature(headers: List) -> str:
+    """
+    计算表头签名（列名及顺序相同的表头签名相同）
+    
+    使用列名的 repr 计算，数字列名 1 和文本列名 '1' 的签名不同
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for header in headers:
+        digest.update(repr(header).encode('utf-8', 'surrogatepass'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+def group_headers(headers_info: list) -> List[Dict]:
+    """
+    按表头签名对所有表分组（一次遍历）
+    
+    Args:
+        headers_info: 表头信息列表
+        
+    Returns:
+        分组列表（按首次出现的顺序），每组包含:
+        'signature': 表头签名, 'headers': 表头列表, 'sheets': 该组的表头信息列表,
+        'sheet_count': 表数, 'file_count': 文件数, 'rows': 总行数
+    """
+    groups: Dict[str, Dict] = {}
+    group_files: Dict[str, set] = {}
+    for info in headers_info:
+        signature = header_signature(info['headers'])
+        group = groups.get(signature)
+        if group is None:
+            group = groups[signature] = {
+                'signature': signature,
+                'headers': info['headers'],
+                'sheets': [],
+                'rows': 0,
+            }
+            group_files[signature] = set()
+        group['sheets'].append(info)
+        group['rows'] += max(info.get('rows', 0), 0)
+        group_files[signature].add(info.get('file_path', info['file']))
+    for signature, group in groups.items():
+        group['sheet_count'] = len(group['sheets'])
+        group['file_count'] = len(group_files[signature])
+    return list(groups.values())
+
+
 def check_headers_consistency(headers_info: list) -> tuple:
     """
     检查所有表头是否一致
@@ -115,3 +677,43 @@ def check_headers_consistency(headers_info: list) -> tuple:
             return False, headers_info
     return True, first_headers
 
+
+def resolve_target_headers(headers_info: list, policy: str = 'first',
+                           explicit_headers: Optional[List[str]] = None) -> List[str]:
+    """
+    按策略确定目标表头（用于无界面的批量合并）
+    
+    Args:
+        headers_info: 表头信息列表
+        policy: 'first' 使用第一个表头；'union' 使用所有表头的并集（按首次出现的顺序）；
+                'intersection' 使用所有表都有的列（按第一个表头的顺序）；'explicit' 使用 explicit_headers
+        explicit_headers: policy 为 'explicit' 时使用的表头
+        
+    Returns:
+        目标表头列表
+    """
+    if policy == 'explicit':
+        if not explicit_headers:
+            raise ValueError("explicit 策略需要指定表头")
+        return list(explicit_headers)
+    if not headers_info:
+        return []
+    
+    first_headers = list(headers_info[0]['headers'])
+    if policy == 'first':
+        return first_headers
+    if policy == 'union':
+        target_headers = []
+        seen = set()
+        for info in headers_info:
+            for header in info['headers']:
+                if header not in seen:
+                    seen.add(header)
+                    target_headers.append(header)
+        return target_headers
+    if policy == 'intersection':
+        common = set(first_headers)
+        for info in headers_info[1:]:
+            common &= set(info['headers'])
+        return [header for header in first_headers if header in common]
+    raise ValueError(f"未知的表头策略: {policy}")
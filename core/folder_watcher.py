@@ -0,0 +1,448 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文件夹监视模块
+监视文件夹中新增或修改的表格文件，等文件写完（大小和修改时间在一段时间内不再变化）后增量追加到合并结果，
+并记录每个文件的吞吐量和延迟
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .constants import SUPPORTED_EXTENSIONS, WATCH_DEBOUNCE_SECONDS, WATCH_POLL_SECONDS, WATCH_RETRY_SECONDS
+from .file_reader import probe_file, get_all_headers, resolve_target_headers
+from .data_merger import read_output_header
+from .output_appender import OutputAppender
+from .parallel_reader import make_file_reader
+from .parse_cache import ParseCache
+from .schema import resolve_schema
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # watchdog 为可选依赖，未安装时定时扫描文件夹
+    Observer = None
+    FileSystemEventHandler = object
+
+
+def is_candidate_file(path: str) -> bool:
+    """是否为需要合并的表格文件（排除Excel/WPS打开文件时生成的临时文件和追加时的临时文件）"""
+    name = Path(path).name
+    if name.startswith(('~$', '.~', '.')) or Path(path).stem.endswith('.appending'):
+        return False
+    return Path(path).suffix.lower() in SUPPORTED_EXTENSIONS
+
+
+def _is_readable(path: str) -> bool:
+    """文件能否以只读方式打开（Windows上仍在写入的文件通常被锁定）"""
+    try:
+        with open(path, 'rb'):
+            return True
+    except OSError:
+        return False
+
+
+class _EventHandler(FileSystemEventHandler):
+    """把文件系统事件转交给 FolderWatcher"""
+    
+    def __init__(self, watcher: 'FolderWatcher'):
+        super().__init__()
+        self.watcher = watcher
+    
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path in (getattr(event, 'src_path', None), getattr(event, 'dest_path', None)):
+            if path:
+                self.watcher.touch(path)
+
+
+class FolderWatcher:
+    """
+    文件夹监视
+    
+    安装了 watchdog 时使用系统的文件事件（Linux为inotify，Windows为ReadDirectoryChangesW），
+    否则每隔 poll_interval 秒扫描一次文件夹。文件在 debounce_seconds 秒内大小和修改时间都没有变化
+    并且可以打开时才认为已写完；同一个文件之后再被修改时会再次返回。
+    poll 返回的文件处理完后调用 acknowledge 标记为已处理，处理失败时调用 requeue 稍后重试
+    """
+    
+    def __init__(self, folder: str, recursive: bool = False,
+                 debounce_seconds: float = WATCH_DEBOUNCE_SECONDS,
+                 poll_interval: float = WATCH_POLL_SECONDS,
+                 use_events: bool = True):
+        """
+        Args:
+            folder: 监视的文件夹
+            recursive: 是否包含子文件夹
+            debounce_seconds: 文件保持不变多少秒后认为已写完
+            poll_interval: 检查（无文件事件时扫描）的间隔秒数
+            use_events: 是否使用文件事件（需要 watchdog），为 False 时总是定时扫描
+        """
+        self.folder = str(Path(folder).resolve())
+        self.recursive = recursive
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval = poll_interval
+        self.use_events = use_events and Observer is not None
+        # 等待写完的文件: {path: [大小, 修改时间, 最后一次变化的时间, 第一次发现的时间]}
+        self._pending: Dict[str, List] = {}
+        # 已返回、正在处理的文件: {path: [大小, 修改时间, 第一次发现的时间]}
+        self._in_flight: Dict[str, List] = {}
+        # 已处理完的文件状态: {path: (大小, 修改时间)}
+        self._delivered: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Event()
+        self._observer = None
+        # 不作为输入的文件（如写在同一文件夹中的合并结果），绝对路径
+        self.ignored_paths = set()
+    
+    @property
+    def mode(self) -> str:
+        """'events' 或 'polling'"""
+        return 'events' if self.use_events else 'polling'
+    
+    def start(self):
+        """开始监视；文件夹中已有的文件也按新文件处理"""
+        if self.use_events and self._observer is None:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_EventHandler(self), self.folder, recursive=self.recursive)
+                self._observer.start()
+            except OSError as e:
+                print(f"警告: 无法监视文件事件，改用定时扫描: {e}")
+                self._observer = None
+                self.use_events = False
+        self._scan()
+    
+    def stop(self):
+        """停止监视"""
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        self._changed.set()
+    
+    def touch(self, path: str):
+        """记录文件发生了变化（文件事件或扫描时调用）"""
+        if not is_candidate_file(path) or str(Path(path).resolve()) in self.ignored_paths:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return  # 已删除或已移走
+        state = (stat.st_size, stat.st_mtime_ns)
+        now = time.perf_counter()
+        with self._lock:
+            entry = self._pending.get(path)
+            if entry is None:
+                in_flight = self._in_flight.get(path)
+                if self._delivered.get(path) == state or (in_flight and tuple(in_flight[:2]) == state):
+                    return
+                self._pending[path] = [state[0], state[1], now, now]
+            elif (entry[0], entry[1]) != state:
+                entry[0], entry[1], entry[2] = state[0], state[1], now
+            else:
+                return
+        self._changed.set()
+    
+    def _scan(self):
+        """扫描文件夹，记录新增或变化的文件"""
+        pattern = '**/*' if self.recursive else '*'
+        for path in Path(self.folder).glob(pattern):
+            if path.is_file():
+                self.touch(str(path))
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待文件变化或超时，返回期间是否有变化"""
+        changed = self._changed.wait(self.poll_interval if timeout is None else timeout)
+        self._changed.clear()
+        return changed
+    
+    def poll(self) -> Dict[str, float]:
+        """
+        返回已写完的文件
+        
+        返回的文件在 acknowledge 之前处于处理中，不会再次返回；acknowledge 之后只有再被修改时才会返回，
+        requeue 的文件等待 retry_seconds 秒后再次返回
+        
+        Returns:
+            {path: 第一次发现该文件的时间（time.perf_counter）}，按发现顺序排列
+        """
+        if not self.use_events:
+            self._scan()
+        with self._lock:
+            paths = list(self._pending)
+        for path in paths:
+            self.touch(path)  # 事件可能已合并，重新检查大小和修改时间
+        now = time.perf_counter()
+        ready: Dict[str, float] = {}
+        with self._lock:
+            for path, (size, mtime, changed_at, first_seen) in sorted(
+                    self._pending.items(), key=lambda item: item[1][3]):
+                if not os.path.exists(path):
+                    del self._pending[path]
+                elif now - changed_at >= self.debounce_seconds and _is_readable(path):
+                    ready[path] = first_seen
+                    self._in_flight[path] = [size, mtime, first_seen]
+                    del self._pending[path]
+        return ready
+    
+    def acknowledge(self, paths):
+        """标记 poll 返回的文件已处理完（成功合并、已包含在结果中或无法读取）"""
+        with self._lock:
+            for path in paths:
+                entry = self._in_flight.pop(path, None)
+                if entry is not None:
+                    self._delivered[path] = (entry[0], entry[1])
+    
+    def requeue(self, paths, retry_seconds: float = WATCH_RETRY_SECONDS):
+        """把处理失败的文件放回等待队列，retry_seconds 秒后由 poll 再次返回（期间被修改时重新等待写完）"""
+        retry_at = time.perf_counter() + retry_seconds - self.debounce_seconds
+        with self._lock:
+            for path in paths:
+                entry = self._in_flight.pop(path, None)
+                if entry is not None and path not in self._pending:
+                    self._pending[path] = [entry[0], entry[1], retry_at, entry[2]]
+        self._changed.set()
+    
+    @property
+    def pending_count(self) -> int:
+        """正在等待写完的文件数"""
+        with self._lock:
+            return len(self._pending)
+
+
+class WatchMerger:
+    """
+    监视文件夹并增量合并
+    
+    每批已写完的文件由 OutputAppender 追加到合并结果（结果不存在时先创建），
+    来源清单保证同一个文件不会重复追加，因此重新开始监视时已合并的文件会被跳过。
+    目标表头：结果已存在时使用结果的表头，否则按 header_policy 由第一批文件确定
+    """
+    
+    def __init__(self, folder: str, output_path: str,
+                 drop_duplicates: bool = False,
+                 header_policy: str = 'first',
+                 explicit_headers: Optional[List[str]] = None,
+                 recursive: bool = False,
+                 debounce_seconds: float = WATCH_DEBOUNCE_SECONDS,
+                 poll_interval: float = WATCH_POLL_SECONDS,
+                 use_events: bool = True,
+                 max_workers: int = 4,
+                 backend: str = 'thread',
+                 parse_cache: Optional[ParseCache] = None,
+                 csv_chunk_rows: Optional[int] = None,
+                 chunk_size: Optional[int] = None,
+                 save_options: Optional[Dict] = None,
+                 log: Callable[[str], None] = print,
+                 on_batch: Optional[Callable[[Dict], None]] = None):
+        """
+        Args:
+            folder: 监视的文件夹
+            output_path: 合并结果路径（CSV、Parquet 或 xlsx）
+            drop_duplicates: 是否去除与已有结果重复的行
+            header_policy: 结果不存在时确定目标表头的策略（见 resolve_target_headers）
+            explicit_headers: header_policy 为 'explicit' 时使用的表头
+            recursive, debounce_seconds, poll_interval, use_events: 见 FolderWatcher
+            max_workers: 并行读取的文件数
+            backend: 'process' 使用多进程解析，'thread' 使用线程
+            parse_cache: 解析缓存，为 None 时不使用缓存
+            csv_chunk_rows: 指定时CSV文件按此行数分块惰性读取（见 read_file_sheets）
+            chunk_size: 追加时每个数据块的最大行数
+            save_options: 传给 save_result/append_result 的其他参数
+            log: 输出日志的函数
+            on_batch: 每批文件处理完后调用 on_batch(统计信息)
+        """
+        self.output_path = output_path
+        self.header_policy = header_policy
+        self.explicit_headers = explicit_headers
+        self.max_workers = max(1, max_workers)
+        self.backend = backend
+        self.parse_cache = parse_cache
+        self.csv_chunk_rows = csv_chunk_rows
+        self.chunk_size = chunk_size
+        self.save_options = save_options or {}
+        self.log = log
+        self.on_batch = on_batch
+        self.watcher = FolderWatcher(folder, recursive, debounce_seconds, poll_interval, use_events)
+        self.watcher.ignored_paths.add(str(Path(output_path).resolve()))
+        self.appender = OutputAppender(output_path, drop_duplicates)
+        self.target_headers: Optional[List] = None
+        self.total_files = 0
+        self.total_rows = 0
+        self._stop = threading.Event()
+        # 读取函数和多进程读取器在整个监视期间复用，不为每批文件重新创建进程池
+        self._read = None
+        self._reader = None
+    
+    def stop(self):
+        """请求停止监视，当前批次写完后生效"""
+        self._stop.set()
+        self.watcher.stop()
+    
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+    
+    def run(self):
+        """阻塞运行，直到调用 stop"""
+        self.watcher.start()
+        self.log(f"开始监视 {self.watcher.folder}（{'文件事件' if self.watcher.mode == 'events' else '定时扫描'}），"
+                 f"结果追加到 {self.output_path}")
+        try:
+            while not self._stop.is_set():
+                ready = self.watcher.poll()
+                if ready:
+                    self.process(ready)
+                elif not self._stop.is_set():
+                    self.watcher.wait()
+        finally:
+            self.watcher.stop()
+            self.close()
+            self.log(f"已停止监视，共追加 {self.total_files} 个文件、{self.total_rows} 行")
+    
+    def _resolve_headers(self, files_probe: Dict[str, Dict]) -> List:
+        """确定目标表头：结果已存在时与结果的表头一致（列名按文本对应到源文件中的列名）"""
+        headers_info = get_all_headers(files_probe)
+        if self.appender.output_exists:
+            by_name = {str(header): header for info in headers_info for header in info['headers']}
+            return [by_name.get(header, header) for header in read_output_header(self.output_path)]
+        return resolve_target_headers(headers_info, self.header_policy, self.explicit_headers)
+    
+    def close(self):
+        """关闭多进程读取器（run 结束时自动调用）"""
+        if self._reader is not None:
+            self._reader.shutdown()
+        self._read = None
+        self._reader = None
+    
+    def _read_files(self, file_paths: List[str], columns: List) -> Dict[str, Tuple[Dict, bool, float]]:
+        """并行完整读取，返回 {path: (sheets_data, failed, 读取秒数)}"""
+        if self._read is None:
+            self._read, self._reader = make_file_reader(
+                self.max_workers, self.backend, self.parse_cache, self.csv_chunk_rows
+            )
+        read = self._read
+        
+        def timed_read(file_path: str):
+            start = time.perf_counter()
+            sheets_data, failed = read(file_path, columns)
+            return sheets_data, failed, time.perf_counter() - start
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {path: executor.submit(timed_read, path) for path in file_paths}
+            return {path: future.result() for path, future in futures.items()}
+    
+    def process(self, ready: Dict[str, float]) -> Dict:
+        """
+        合并一批已写完的文件
+        
+        已合并、已包含在结果中和无法读取的文件标记为已处理；追加失败（如结果文件被其他程序锁定）
+        或处理时出错（如结果文件已损坏）时记录日志，这批文件放回等待队列稍后重试，监视继续进行
+        
+        Args:
+            ready: FolderWatcher.poll 的结果 {path: 第一次发现的时间}
+        
+        Returns:
+            统计信息，files 中为每个文件的行数、大小、读取耗时、吞吐量和延迟
+        """
+        batch_start = time.perf_counter()
+        batch = {'files': [], 'skipped_files': [], 'failed_files': [], 'appended_rows': 0, 'success': True}
+        pending: List[str] = list(ready)
+        try:
+            pending = self._merge_batch(ready, batch)
+        except Exception as e:
+            batch['success'] = False
+            batch['error'] = str(e)
+            self.target_headers = None  # 结果文件可能已变化，重试时重新确定表头
+            self.log(f"处理这批文件时出错: {e}")
+        for path in batch['failed_files']:
+            self.log(f"{Path(path).name}: 读取失败，跳过")
+        
+        # 每个文件的吞吐量（按读取耗时）和延迟（从发现文件到结果更新完成，包括等待写完的时间）
+        done = time.perf_counter()
+        for info in batch['files']:
+            seconds = max(info['read_seconds'], 1e-6)
+            info['rows_per_second'] = round(info['rows'] / seconds, 1)
+            info['mb_per_second'] = round(info['bytes'] / (1024 * 1024) / seconds, 2)
+            info['latency_seconds'] = round(done - ready[info['file']], 3)
+            self.log(
+                f"{Path(info['file']).name}: {info['rows']} 行，{info['bytes'] / (1024 * 1024):.1f} MB，"
+                f"读取 {info['read_seconds']:.2f} 秒（{info['rows_per_second']:.0f} 行/秒，"
+                f"{info['mb_per_second']:.1f} MB/秒），延迟 {info['latency_seconds']:.2f} 秒"
+            )
+        batch['elapsed_seconds'] = round(done - batch_start, 3)
+        if batch['success']:
+            if batch['files']:
+                self.total_files += len(batch['files'])
+                self.total_rows += batch['appended_rows']
+                self.log(f"已追加 {len(batch['files'])} 个文件、{batch['appended_rows']} 行"
+                         f"（写入 {batch['write_seconds']:.2f} 秒），结果共 {batch['total_rows']} 行")
+            self.watcher.acknowledge(ready)
+        else:
+            # 读取失败的文件重试也不会成功，其余需要追加的文件稍后重试
+            failed = set(batch['failed_files'])
+            retry = {path for path in pending if path not in failed}
+            if retry:
+                self.log(f"追加到结果失败，{WATCH_RETRY_SECONDS:.0f} 秒后重试 {len(retry)} 个文件")
+            self.watcher.acknowledge([path for path in ready if path not in retry])
+            self.watcher.requeue(retry)
+        if self.on_batch is not None:
+            self.on_batch(batch)
+        return batch
+    
+    def _merge_batch(self, ready: Dict[str, float], batch: Dict) -> List[str]:
+        """
+        读取一批文件并追加到结果，统计信息写入 batch
+        
+        Returns:
+            需要追加的文件（不包括已包含在结果中的文件）
+        """
+        pending, batch['skipped_files'] = self.appender.pending_files(list(ready))
+        for path in batch['skipped_files']:
+            self.log(f"{Path(path).name}: 已包含在结果中，跳过")
+        
+        files_probe = {}
+        for path in pending:
+            probe = probe_file(path)
+            if probe:
+                files_probe[path] = probe
+            else:
+                batch['failed_files'].append(path)
+        if files_probe:
+            if self.target_headers is None or not self.appender.output_exists:
+                self.target_headers = self._resolve_headers(files_probe)
+            results = self._read_files(list(files_probe), self.target_headers)
+            files_data = {}
+            for path, (sheets_data, failed, seconds) in results.items():
+                try:
+                    size = os.path.getsize(path)
+                except OSError:  # 读取后文件已被删除
+                    failed = True
+                if failed:
+                    batch['failed_files'].append(path)
+                    continue
+                files_data[path] = sheets_data
+                batch['files'].append({
+                    'file': path,
+                    'bytes': size,
+                    'rows': sum(len(df) for df in sheets_data.values()),
+                    'read_seconds': round(seconds, 3),
+                })
+            if files_data:
+                schema, _ = resolve_schema(files_data, self.target_headers)
+                write_start = time.perf_counter()
+                result = self.appender.append(
+                    files_data, self.target_headers, self.chunk_size, schema, self.save_options
+                )
+                batch['success'] = result['success']
+                batch['appended_rows'] = result['appended_rows']
+                batch['duplicate_rows'] = result['duplicate_rows']
+                batch['total_rows'] = result['total_rows']
+                batch['write_seconds'] = round(time.perf_counter() - write_start, 3)
+        return pending
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+内存预算的数据缓存
+已读取的sheet数据超过内存上限时，把最久未使用的文件溢出到临时目录，合并时再从磁盘加载
+"""
+
+import shutil
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+from .constants import FRAME_CACHE_MAX_BYTES
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:  # pyarrow 为可选依赖，没有时溢出文件使用pickle
+    pa = None
+    feather = None
+
+
+def frame_memory_usage(sheets_data: Dict[str, pd.DataFrame]) -> int:
+    """统计一个文件所有sheet的实际内存占用（包括字符串等对象的内容；惰性数据源不占内存）"""
+    return int(sum(
+        df.memory_usage(deep=True).sum()
+        for df in sheets_data.values() if isinstance(df, pd.DataFrame)
+    ))
+
+
+class FrameCache:
+    """
+    内存预算的数据缓存 {file_path: {sheet_name: DataFrame}}
+    
+    内存中的数据按最近使用顺序排列，总占用超过 max_bytes 时从最久未使用的文件开始溢出：
+    每个sheet写成一个Feather文件（需要pyarrow，列类型无法转换时退回pickle），然后释放内存。
+    get 会把溢出的文件重新加载到内存；view 返回的只读映射按需从磁盘加载但不放回内存，
+    合并时峰值内存不超过预算加单个文件。
+    
+    可以在多个线程中使用。统计内存占用、写入和读取溢出文件都不持有锁，
+    界面线程调用 memory_bytes 等属性时不会等待磁盘读写；put 和 set_max_bytes 会在调用线程中
+    统计占用和溢出，应在读取线程或其他后台线程中调用
+    """
+    
+    def __init__(self, max_bytes: int = FRAME_CACHE_MAX_BYTES, spill_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self._spill_root = spill_dir
+        self._spill_dir: Optional[Path] = None
+        self._memory: "OrderedDict[str, Dict[str, pd.DataFrame]]" = OrderedDict()
+        self._memory_sizes: Dict[str, int] = {}
+        self._spilled: Dict[str, List[Dict]] = {}  # file_path -> [{'name', 'file', 'format', 'columns', 'bytes'}]
+        self._spilling: Dict[str, Dict[str, pd.DataFrame]] = {}  # 正在写入溢出目录的文件，写完前仍可访问
+        self._counter = 0
+        self._lock = threading.RLock()
+    
+    def __contains__(self, file_path: str) -> bool:
+        with self._lock:
+            return file_path in self._memory or file_path in self._spilling or file_path in self._spilled
+    
+    @property
+    def memory_bytes(self) -> int:
+        """内存中数据的总占用"""
+        with self._lock:
+            return sum(self._memory_sizes.values())
+    
+    @property
+    def spilled_bytes(self) -> int:
+        """已溢出到磁盘的数据大小"""
+        with self._lock:
+            return sum(sheet['bytes'] for sheets in self._spilled.values() for sheet in sheets)
+    
+    @property
+    def spilled_count(self) -> int:
+        """已溢出到磁盘的文件数"""
+        with self._lock:
+            return len(self._spilled)
+    
+    def set_max_bytes(self, max_bytes: int):
+        """调整内存上限，减小时立即溢出多余的数据（在调用线程中写入磁盘）"""
+        with self._lock:
+            self.max_bytes = max_bytes
+        self._evict()
+    
+    def put(self, file_path: str, sheets_data: Dict[str, pd.DataFrame]):
+        """
+        缓存文件数据，超出内存上限时溢出最久未使用的文件
+        
+        Args:
+            file_path: 文件路径
+            sheets_data: 字典 {sheet_name: DataFrame}
+        """
+        size = frame_memory_usage(sheets_data)
+        with self._lock:
+            self._discard(file_path)
+            self._memory[file_path] = sheets_data
+            self._memory_sizes[file_path] = size
+        self._evict()
+    
+    def get(self, file_path: str) -> Optional[Dict[str, pd.DataFrame]]:
+        """
+        获取文件数据，已溢出的文件重新加载到内存
+        
+        Returns:
+            字典 {sheet_name: DataFrame}，不在缓存中时返回 None
+        """
+        with self._lock:
+            if file_path in self._memory:
+                self._memory.move_to_end(file_path)
+                return self._memory[file_path]
+            if file_path in self._spilling:
+                return self._spilling[file_path]
+            sheets = self._spilled.get(file_path)
+            spill_dir = self._spill_dir
+        if sheets is None:
+            return None
+        sheets_data = self._load(spill_dir, sheets)
+        if sheets_data is not None:
+            self.put(file_path, sheets_data)
+        return sheets_data
+    
+    def peek(self, file_path: str) -> Optional[Dict[str, pd.DataFrame]]:
+        """获取文件数据，不改变使用顺序；已溢出的文件从磁盘读取但不放回内存"""
+        with self._lock:
+            if file_path in self._memory:
+                return self._memory[file_path]
+            if file_path in self._spilling:
+                return self._spilling[file_path]
+            sheets = self._spilled.get(file_path)
+            spill_dir = self._spill_dir
+        if sheets is None:
+            return None
+        return self._load(spill_dir, sheets)
+    
+    def view(self, file_paths: Iterable[str]) -> "FrameCacheView":
+        """按给定顺序返回缓存中这些文件的只读映射，可直接传给 iter_merge_chunks"""
+        return FrameCacheView(self, [path for path in file_paths if path in self])
+    
+    def remove(self, file_path: str):
+        """从缓存中删除文件（包括溢出文件）"""
+        with self._lock:
+            self._discard(file_path)
+    
+    def clear(self):
+        """清空缓存并删除溢出目录"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_sizes.clear()
+            self._spilling.clear()
+            self._spilled.clear()
+            if self._spill_dir is not None:
+                shutil.rmtree(self._spill_dir, ignore_errors=True)
+                self._spill_dir = None
+    
+    def _discard(self, file_path: str):
+        self._memory.pop(file_path, None)
+        self._memory_sizes.pop(file_path, None)
+        self._spilling.pop(file_path, None)
+        for sheet in self._spilled.pop(file_path, []):
+            (self._spill_dir / sheet['file']).unlink(missing_ok=True)
+    
+    def _evict(self):
+        """
+        按最近使用顺序溢出，直到内存占用不超过上限
+        
+        在锁内选出要溢出的文件并移到 _spilling，写入磁盘时不持有锁；
+        写入期间文件被删除或重新放入缓存时丢弃写好的溢出文件
+        """
+        while True:
+            with self._lock:
+                if sum(self._memory_sizes.values()) <= self.max_bytes:
+                    return
+                # 惰性数据源（如分块读取的CSV）不占内存，不需要溢出
+                file_path = next((path for path in self._memory if self._memory_sizes[path] > 0), None)
+                if file_path is None:
+                    return
+                sheets_data = self._memory.pop(file_path)
+                size = self._memory_sizes.pop(file_path)
+                self._spilling[file_path] = sheets_data
+            try:
+                sheets = self._spill(sheets_data)
+            except Exception as e:
+                # 磁盘写入失败时放回内存，不再继续溢出
+                print(f"警告: 溢出缓存数据失败 {file_path}: {e}")
+                with self._lock:
+                    if self._spilling.get(file_path) is sheets_data:
+                        del self._spilling[file_path]
+                        self._memory[file_path] = sheets_data
+                        self._memory.move_to_end(file_path, last=False)
+                        self._memory_sizes[file_path] = size
+                return
+            with self._lock:
+                if self._spilling.get(file_path) is sheets_data:
+                    del self._spilling[file_path]
+                    self._spilled[file_path] = sheets
+                    continue
+                spill_dir = self._spill_dir
+            if spill_dir is not None:  # clear 已删除整个溢出目录时不需要清理
+                for sheet in sheets:
+                    (spill_dir / sheet['file']).unlink(missing_ok=True)
+    
+    def _spill(self, sheets_data: Dict[str, pd.DataFrame]) -> List[Dict]:
+        """把一个文件的所有sheet写入溢出目录，返回溢出文件的记录"""
+        with self._lock:
+            if self._spill_dir is None:
+                self._spill_dir = Path(tempfile.mkdtemp(prefix="merge_excels_spill-", dir=self._spill_root))
+            spill_dir = self._spill_dir
+        sheets = []
+        for sheet_name, df in sheets_data.items():
+            with self._lock:
+                self._counter += 1
+                counter = self._counter
+            data_path = None
+            data_format = 'pickle'
+            if feather is not None and isinstance(df, pd.DataFrame):
+                data_path = spill_dir / f"{counter}.feather"
+                try:
+                    # Feather要求列名为字符串，原列名单独记录
+                    feather.write_feather(df.set_axis([str(c) for c in df.columns], axis=1), data_path)
+                    data_format = 'feather'
+                except (pa.ArrowException, TypeError, ValueError):
+                    data_path.unlink(missing_ok=True)
+            if data_format == 'pickle':
+                # 混合类型的列无法转换为Arrow，退回pickle
+                data_path = spill_dir / f"{counter}.pkl"
+                with open(data_path, 'wb') as f:
+                    pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+            sheets.append({
+                'name': sheet_name,
+                'file': data_path.name,
+                'format': data_format,
+                'columns': list(df.columns),
+                'bytes': data_path.stat().st_size,
+            })
+        return sheets
+    
+    @staticmethod
+    def _load(spill_dir: Optional[Path], sheets: List[Dict]) -> Optional[Dict[str, pd.DataFrame]]:
+        """
+        从溢出目录读取一个文件的所有sheet（spill_dir 和 sheets 为在锁内取得的溢出目录和 _spilled 中的记录）
+        
+        读取时不持有锁，溢出文件可能已被并发的 remove/clear 删除，此时按不在缓存中处理，返回 None
+        """
+        if spill_dir is None:
+            return None
+        sheets_data = {}
+        try:
+            for sheet in sheets:
+                data_path = spill_dir / sheet['file']
+                if sheet['format'] == 'feather':
+                    df = feather.read_feather(data_path)
+                    df.columns = sheet['columns']
+                else:
+                    with open(data_path, 'rb') as f:
+                        df = pickle.load(f)
+                sheets_data[sheet['name']] = df
+        except FileNotFoundError:
+            return None
+        return sheets_data
+
+
+class FrameCacheView(Mapping):
+    """
+    FrameCache 中部分文件的只读映射 {file_path: {sheet_name: DataFrame}}
+    
+    访问已溢出的文件时从磁盘读取，用完即释放，不会把所有文件同时放回内存
+    """
+    
+    def __init__(self, cache: FrameCache, file_paths: List[str]):
+        self._cache = cache
+        self._file_paths = file_paths
+        self._file_set = set(file_paths)  # 按顺序遍历用列表，查找用集合
+    
+    def __getitem__(self, file_path: str) -> Dict[str, pd.DataFrame]:
+        if file_path not in self._file_set:
+            raise KeyError(file_path)
+        sheets_data = self._cache.peek(file_path)
+        if sheets_data is None:
+            raise KeyError(file_path)
+        return sheets_data
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._file_paths)
+    
+    def __len__(self) -> int:
+        return len(self._file_paths)
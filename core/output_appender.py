@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+追加合并模块
+把新的源文件追加到已有的合并结果之后，不重新读取和写出历史文件。
+输出文件旁边的来源清单记录已包含的源文件（路径、大小、修改时间、内容校验值），重复追加同一个文件不会产生重复数据；
+去重时已有结果的行哈希保存为索引文件，只需与新数据比较
+"""
+
+import os
+import json
+import time
+import hashlib
+import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .constants import APPEND_FORMATS
+from .data_merger import (
+    iter_merge_chunks, save_result, append_result, output_format, read_output_header, iter_output_chunks,
+    count_output_rows
+)
+from .deduplicator import RowDeduplicator
+
+
+def sources_manifest_path(output_path: str) -> str:
+    """来源清单的路径，如 合并结果.sources.json"""
+    path = Path(output_path)
+    return str(path.with_name(f"{path.stem}.sources.json"))
+
+
+def row_index_path(output_path: str) -> str:
+    """重复行索引的路径，如 合并结果.rowhash.npz"""
+    path = Path(output_path)
+    return str(path.with_name(f"{path.stem}.rowhash.npz"))
+
+
+def _hash_file(path: str) -> str:
+    """计算文件内容的校验值"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_signature(file_path: str) -> Dict:
+    """源文件的标识：绝对路径、大小、修改时间（纳秒）和内容校验值"""
+    stat = os.stat(file_path)
+    return {
+        'path': str(Path(file_path).resolve()),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'hash': _hash_file(file_path),
+    }
+
+
+def _write_json(path: str, data: Dict):
+    """先写临时文件再替换，中途出错不会留下不完整的JSON"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def _restore_column(series: pd.Series, sample: pd.Series) -> pd.Series:
+    """
+    把按文本读回的一列还原为新数据中该列（sample）的类型
+    
+    逐个值转换：无法按该类型解析的文本保持原样，因此不会丢失信息；
+    新数据为文本的列保持文本，有前导零的编号等不会变成数字；新数据为混合了数字的object列时能解析为数字的值还原为数字
+    """
+    dtype = sample.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    if dtype == object and pd.api.types.infer_dtype(sample, skipna=True) not in ('string', 'empty'):
+        dtype = np.dtype(np.float64)
+    if pd.api.types.is_bool_dtype(dtype):
+        parsed = series.map({'True': True, 'False': False})
+    elif pd.api.types.is_numeric_dtype(dtype):
+        parsed = pd.to_numeric(series, errors='coerce')
+    elif pd.api.types.is_datetime64_any_dtype(dtype):
+        parsed = pd.to_datetime(series, errors='coerce', format='ISO8601')
+    else:
+        return series
+    unparsed = (parsed.isna() & series.notna()).to_numpy()
+    if not unparsed.any():
+        return parsed
+    values = parsed.to_numpy(dtype=object, copy=True)
+    values[unparsed] = series.to_numpy(dtype=object)[unparsed]
+    return pd.Series(values, index=series.index, dtype=object)
+
+
+def _restore_types(chunk: pd.DataFrame, sample: pd.DataFrame) -> pd.DataFrame:
+    """CSV按文本读回的数据块按新数据（sample）各列的类型（按位置对应）还原，行哈希与追加时的数据块一致"""
+    columns = {
+        idx: (_restore_column(chunk.iloc[:, idx], sample.iloc[:, idx])
+              if idx < sample.shape[1] else chunk.iloc[:, idx])
+        for idx in range(chunk.shape[1])
+    }
+    result = pd.DataFrame(columns, index=chunk.index)
+    result.columns = chunk.columns
+    return result
+
+
+class OutputAppender:
+    """
+    追加合并
+    
+    用法：pending_files 找出还没有包含在结果中的源文件，读取后交给 append 追加。
+    - 输出文件不存在（或没有列）时按普通合并写出，并创建来源清单
+    - 已有结果的表头必须与目标表头包含相同的列，新数据按已有结果的列顺序对齐
+    - 来源清单中路径、大小和修改时间都相同的文件直接跳过；大小或修改时间变化时比较内容校验值，
+      内容相同（包括复制到其他路径的文件）也跳过，内容已修改的文件重新追加（之前追加的行仍保留）
+    - 去重时使用保存的行哈希索引，索引缺失或与结果行数不一致时读回已有结果重建；
+      CSV结果按文本读回后按新数据各列的类型还原（见 _restore_types），与写入前的值得到相同的哈希
+    """
+    
+    def __init__(self, output_path: str, drop_duplicates: bool = False):
+        """
+        Args:
+            output_path: 合并结果路径（CSV、Parquet 或 xlsx）
+            drop_duplicates: 是否去除与已有结果或新数据中重复的行
+        """
+        file_format = output_format(output_path)
+        if file_format not in APPEND_FORMATS:
+            raise ValueError(f"{file_format} 输出不支持追加（支持 {'、'.join(APPEND_FORMATS)}）")
+        self.output_path = output_path
+        self.drop_duplicates = drop_duplicates
+        self.manifest_path = sources_manifest_path(output_path)
+        self.index_path = row_index_path(output_path)
+        self.manifest = self._load_manifest()
+        # pending_files 中计算过的标识，append 时直接使用，避免再次计算校验值
+        self._signatures: Dict[str, Dict] = {}
+    
+    @property
+    def output_exists(self) -> bool:
+        """输出文件是否存在且包含表头"""
+        return os.path.exists(self.output_path) and bool(read_output_header(self.output_path))
+    
+    def _load_manifest(self) -> Dict:
+        """读取来源清单；输出文件不存在时之前的清单已失效，清单缺失时结果的行数重新统计"""
+        empty = {'output': Path(self.output_path).name, 'columns': [], 'rows': 0, 'sources': []}
+        if not os.path.exists(self.output_path):
+            return empty
+        if self.output_exists:
+            empty['rows'] = None  # 只在清单缺失或无法读取时统计
+        if not os.path.exists(self.manifest_path):
+            print(f"警告: 没有找到来源清单 {self.manifest_path}，所有文件都按新文件追加")
+            return self._counted(empty)
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            manifest.setdefault('sources', [])
+            manifest.setdefault('rows', 0)
+            return manifest
+        except (OSError, ValueError) as e:
+            print(f"警告: 读取来源清单失败 {self.manifest_path}: {e}，所有文件都按新文件追加")
+            return self._counted(empty)
+    
+    def _counted(self, manifest: Dict) -> Dict:
+        """没有来源清单的已有结果：读回结果统计行数"""
+        if manifest['rows'] is None:
+            manifest['rows'] = count_output_rows(self.output_path)
+        return manifest
+    
+    @property
+    def sources(self) -> List[Dict]:
+        """已包含在结果中的源文件"""
+        return self.manifest['sources']
+    
+    def pending_files(self, file_paths: List[str]) -> Tuple[List[str], List[str]]:
+        """
+        找出需要追加的源文件
+        
+        Returns:
+            (需要追加的文件, 已包含在结果中而跳过的文件)，都保持输入顺序
+        """
+        by_path = {entry['path']: entry for entry in self.sources}
+        known_hashes = {entry['hash'] for entry in self.sources}
+        pending, skipped = [], []
+        for file_path in file_paths:
+            resolved = str(Path(file_path).resolve())
+            entry = by_path.get(resolved)
+            try:
+                stat = os.stat(file_path)
+                if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+                    skipped.append(file_path)
+                    continue
+                signature = source_signature(file_path)
+            except OSError as e:
+                print(f"警告: 无法读取文件信息 {file_path}: {e}")
+                pending.append(file_path)
+                continue
+            if signature['hash'] in known_hashes:
+                skipped.append(file_path)
+                continue
+            if entry:
+                print(f"文件 {Path(file_path).name} 已修改，将重新追加（之前追加的行仍保留在结果中）")
+            self._signatures[resolved] = signature
+            pending.append(file_path)
+        return pending, skipped
+    
+    def check_headers(self, target_headers: List[str]) -> List[str]:
+        """
+        检查已有结果的表头与目标表头是否一致
+        
+        Returns:
+            追加时使用的列（已有结果的列顺序；输出文件还不存在时为目标表头）
+        
+        Raises:
+            ValueError: 列不一致
+        """
+        if not self.output_exists:
+            return list(target_headers)
+        existing = read_output_header(self.output_path)
+        target = [str(header) for header in target_headers]
+        if set(existing) != set(target) or len(existing) != len(target):
+            missing = [header for header in target if header not in existing]
+            extra = [header for header in existing if header not in target]
+            raise ValueError(
+                "已有结果的表头与目标表头不一致："
+                + (f"结果中缺少 {', '.join(missing)}；" if missing else "")
+                + (f"结果中多出 {', '.join(extra)}" if extra else "")
+            )
+        # 按已有结果的列顺序对齐（目标表头中的非文本列名与结果中的文本列名对应）
+        by_name = {str(header): header for header in target_headers}
+        return [by_name[header] for header in existing]
+    
+    def _load_index(self, sample: pd.DataFrame) -> RowDeduplicator:
+        """
+        加载已有结果的行哈希索引，缺失或过期时读回结果重建
+        
+        Args:
+            sample: 新数据的第一个数据块（列按位置对应结果的列），CSV结果按文本读回后按其各列的类型还原
+        """
+        if not self.output_exists:
+            return RowDeduplicator()
+        if os.path.exists(self.index_path) and self.manifest.get('index_rows') == self.manifest['rows']:
+            try:
+                return RowDeduplicator.load(self.index_path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"警告: 读取重复行索引失败 {self.index_path}: {e}，将重建索引")
+        print("正在根据已有结果重建重复行索引...")
+        deduplicator = RowDeduplicator()
+        rows = 0
+        as_text = output_format(self.output_path) == 'csv'
+        for chunk in iter_output_chunks(self.output_path, as_text=as_text):
+            deduplicator.duplicated(_restore_types(chunk, sample) if as_text else chunk)
+            rows += len(chunk)
+        deduplicator.total_rows = 0
+        deduplicator.duplicate_count = 0
+        self.manifest['rows'] = rows
+        return deduplicator
+    
+    def append(self, files_data: Dict[str, Dict[str, pd.DataFrame]], target_headers: List[str],
+               chunk_size: Optional[int] = None, schema: Optional[Dict] = None,
+               save_options: Optional[Dict] = None) -> Dict:
+        """
+        把新文件的数据追加到结果之后，成功后更新来源清单和重复行索引
+        
+        Args:
+            files_data: 按追加顺序排列的 {file_path: {sheet_name: DataFrame}}
+            target_headers: 目标表头（与已有结果的表头比较，见 check_headers）
+            chunk_size: 每个数据块的最大行数
+            schema: 新数据的统一列类型
+            save_options: 传给 save_result/append_result 的其他参数（如 compression）
+        
+        Returns:
+            统计信息 {'success', 'created', 'files', 'input_rows', 'appended_rows',
+            'duplicate_rows', 'total_rows', 'statistics', 'elapsed_seconds'}
+        """
+        start_time = time.perf_counter()
+        columns = self.check_headers(target_headers)
+        created = not self.output_exists
+        # 去重索引在第一个数据块对齐后加载，重建时需要新数据各列的类型
+        state: Dict = {'deduplicator': None}
+        save_options = save_options or {}
+        statistics: List[Dict] = []
+        file_rows: Dict[str, int] = {}
+        counts = {'input': 0, 'output': 0}
+        
+        def chunks():
+            for file_path, sheets_data in files_data.items():
+                file_rows[file_path] = 0
+                for chunk in iter_merge_chunks({file_path: sheets_data}, columns, statistics, chunk_size, schema):
+                    counts['input'] += len(chunk)
+                    file_rows[file_path] += len(chunk)
+                    if self.drop_duplicates:
+                        if state['deduplicator'] is None:
+                            state['deduplicator'] = self._load_index(chunk)
+                        chunk = state['deduplicator'].drop_duplicates(chunk)
+                    counts['output'] += len(chunk)
+                    yield chunk
+        
+        if created:
+            success = save_result(chunks(), self.output_path, schema=schema, **save_options)
+        else:
+            append_options = {
+                key: save_options[key] for key in ('compression', 'row_group_size') if key in save_options
+            }
+            success = append_result(chunks(), self.output_path, **append_options)
+        deduplicator = state['deduplicator']
+        
+        stats = {
+            'success': success,
+            'created': created,
+            'files': list(files_data),
+            'input_rows': counts['input'],
+            'appended_rows': counts['output'],
+            'duplicate_rows': deduplicator.duplicate_count if deduplicator is not None else 0,
+            'statistics': statistics,
+        }
+        if success:
+            self._record(files_data, file_rows, columns, counts['output'], deduplicator, created)
+        stats['total_rows'] = self.manifest['rows']
+        stats['elapsed_seconds'] = round(time.perf_counter() - start_time, 3)
+        return stats
+    
+    def _record(self, files_data: Dict, file_rows: Dict[str, int], columns: List[str],
+                appended_rows: int, deduplicator: Optional[RowDeduplicator], created: bool):
+        """追加成功后更新来源清单，去重时保存行哈希索引"""
+        if created:
+            self.manifest['sources'] = []
+            self.manifest['rows'] = 0
+            self.manifest.pop('index_rows', None)
+        added_at = datetime.datetime.now().isoformat(timespec='seconds')
+        entries = {entry['path']: entry for entry in self.sources}
+        for file_path in files_data:
+            resolved = str(Path(file_path).resolve())
+            signature = self._signatures.pop(resolved, None) or source_signature(file_path)
+            entries[resolved] = dict(signature, rows=file_rows.get(file_path, 0), added_at=added_at)
+        self.manifest['sources'] = list(entries.values())
+        self.manifest['columns'] = [str(column) for column in columns]
+        self.manifest['rows'] += appended_rows
+        if deduplicator is not None:
+            deduplicator.save(self.index_path)
+            self.manifest['index_rows'] = self.manifest['rows']
+        _write_json(self.manifest_path, self.manifest)
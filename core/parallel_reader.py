@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多进程文件读取模块
+在子进程中解析文件，绕开GIL；结果以列式格式序列化后传回主进程
+"""
+
+import pickle
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from .file_reader import read_file_sheets
+from .parse_cache import ParseCache
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow 为可选依赖
+    pa = None
+
+
+# 读取结果: (file_path, sheets_data, failed)，与 FileReaderWorker.finished 信号一致
+ReadResult = Tuple[str, Dict[str, pd.DataFrame], bool]
+
+# 读取函数: (file_path, columns) -> (sheets_data, failed)
+ReadFunction = Callable[..., Tuple[Dict[str, pd.DataFrame], bool]]
+
+
+def _serialize_frame(df: pd.DataFrame) -> Tuple[str, bytes]:
+    """
+    以列式格式序列化DataFrame
+    
+    优先使用Arrow IPC；没有安装pyarrow或列类型无法转换（如同一列混合数字和文本）时，
+    退回为按列保存numpy数组后pickle，避免逐行的对象开销。
+    分块读取的大CSV（CsvChunkReader）不含数据，直接pickle
+    """
+    if not isinstance(df, pd.DataFrame):
+        return 'object', pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return 'arrow', sink.getvalue().to_pybytes()
+        except (pa.ArrowException, TypeError, ValueError):
+            pass
+    columns = {
+        'names': list(df.columns),
+        'arrays': [df.iloc[:, i].to_numpy() for i in range(df.shape[1])],
+        'dtypes': [df.dtypes.iloc[i] for i in range(df.shape[1])],
+    }
+    return 'columns', pickle.dumps(columns, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _deserialize_frame(kind: str, payload: bytes) -> pd.DataFrame:
+    """反序列化 _serialize_frame 的结果"""
+    if kind == 'arrow':
+        with pa.ipc.open_stream(payload) as reader:
+            return reader.read_all().to_pandas()
+    if kind == 'object':
+        return pickle.loads(payload)
+    columns = pickle.loads(payload)
+    data = {
+        idx: pd.Series(array, dtype=dtype, copy=False)
+        for idx, (array, dtype) in enumerate(zip(columns['arrays'], columns['dtypes']))
+    }
+    df = pd.DataFrame(data)
+    df.columns = columns['names']
+    return df
+
+
+def _read_in_subprocess(file_path: str, columns: Optional[List] = None,
+                        csv_chunk_rows: Optional[int] = None) -> List[Tuple[str, str, bytes]]:
+    """
+    子进程入口：读取文件并序列化所有sheet（只读取 columns 中的列，为 None 时读取所有列）
+    
+    Returns:
+        [(sheet_name, 序列化格式, 数据), ...]，读取失败时为空列表
+    """
+    sheets_data = read_file_sheets(file_path, columns=columns, csv_chunk_rows=csv_chunk_rows)
+    return [
+        (sheet_name, *_serialize_frame(df))
+        for sheet_name, df in sheets_data.items()
+    ]
+
+
+class ProcessFileReader:
+    """
+    多进程文件读取器
+    
+    使用 spawn 方式创建进程池（避免在有Qt线程的进程中fork）。
+    进程池无法创建或中途崩溃时，自动退回到在当前线程中读取
+    """
+    
+    def __init__(self, max_workers: Optional[int] = None, csv_chunk_rows: Optional[int] = None):
+        """
+        Args:
+            max_workers: 进程池大小，默认为CPU核心数
+            csv_chunk_rows: 指定时CSV文件按此行数分块惰性读取（见 read_file_sheets）
+        """
+        self.max_workers = max_workers
+        self.csv_chunk_rows = csv_chunk_rows
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._disabled = False
+        self._lock = threading.Lock()
+    
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        """延迟创建进程池，创建失败时禁用多进程"""
+        with self._lock:
+            if self._executor is None and not self._disabled:
+                try:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+                except (OSError, ValueError, NotImplementedError) as e:
+                    print(f"警告: 无法创建进程池，改用线程读取: {e}")
+                    self._disabled = True
+            return self._executor
+    
+    def _disable(self, reason: Exception):
+        """进程池损坏后禁用多进程，之后的读取都在线程中进行"""
+        with self._lock:
+            if not self._disabled:
+                print(f"警告: 进程池不可用，改用线程读取: {reason}")
+                self._disabled = True
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = None
+    
+    def read(self, file_path: str,
+             columns: Optional[List] = None) -> Tuple[Dict[str, pd.DataFrame], bool]:
+        """
+        读取文件（阻塞直到完成）
+        
+        Args:
+            file_path: 文件路径
+            columns: 列投影，只读取这些列，为 None 时读取所有列
+        
+        Returns:
+            (sheets_data, failed)，失败时 sheets_data 为空字典
+        """
+        executor = self._get_executor()
+        if executor is None:
+            return self._read_in_thread(file_path, columns, self.csv_chunk_rows)
+        
+        try:
+            serialized = executor.submit(_read_in_subprocess, file_path, columns, self.csv_chunk_rows).result()
+        except BrokenProcessPool as e:
+            self._disable(e)
+            return self._read_in_thread(file_path, columns, self.csv_chunk_rows)
+        except Exception as e:
+            print(f"错误: 子进程读取文件 {file_path} 时出错: {e}")
+            return {}, True
+        
+        sheets_data = {
+            sheet_name: _deserialize_frame(kind, payload)
+            for sheet_name, kind, payload in serialized
+        }
+        return sheets_data, not sheets_data
+    
+    @staticmethod
+    def _read_in_thread(file_path: str, columns: Optional[List] = None,
+                        csv_chunk_rows: Optional[int] = None) -> Tuple[Dict[str, pd.DataFrame], bool]:
+        """在当前线程中读取文件"""
+        try:
+            sheets_data = read_file_sheets(file_path, columns=columns, csv_chunk_rows=csv_chunk_rows)
+        except Exception as e:
+            print(f"错误: 读取文件 {file_path} 时出错: {e}")
+            return {}, True
+        return sheets_data, not sheets_data
+    
+    def shutdown(self, cancel_pending: bool = True):
+        """
+        关闭进程池
+        
+        Args:
+            cancel_pending: 是否取消尚未开始的读取；为False时已提交的文件会继续读完
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=cancel_pending)
+                self._executor = None
+
+
+def make_file_reader(max_workers: Optional[int] = None,
+                     backend: str = 'process',
+                     parse_cache: Optional[ParseCache] = None,
+                     csv_chunk_rows: Optional[int] = None) -> Tuple[ReadFunction, Optional[ProcessFileReader]]:
+    """
+    创建读取函数（可在多个线程中同时调用）
+    
+    Args:
+        max_workers: 进程池大小，默认为CPU核心数
+        backend: 'process' 使用多进程解析，'thread' 在调用线程中解析
+        parse_cache: 解析缓存，为 None 时不使用缓存
+        csv_chunk_rows: 指定时CSV文件按此行数分块惰性读取（见 read_file_sheets）
+    
+    Returns:
+        (read, reader)
+        read(file_path, columns=None) -> (sheets_data, failed)
+        reader: 多进程读取器，用完后需要调用 shutdown；backend 为 'thread' 时为 None
+    """
+    if backend == 'process':
+        reader = ProcessFileReader(max_workers, csv_chunk_rows)
+        read = reader.read
+    else:
+        reader = None
+        
+        def read(file_path: str, columns: Optional[List] = None) -> Tuple[Dict[str, pd.DataFrame], bool]:
+            return ProcessFileReader._read_in_thread(file_path, columns, csv_chunk_rows)
+    
+    if parse_cache is not None:
+        parse = read
+        
+        def read(file_path: str, columns: Optional[List] = None) -> Tuple[Dict[str, pd.DataFrame], bool]:
+            # 优先从缓存加载，解析成功的结果写入缓存
+            sheets_data = parse_cache.get(file_path, columns)
+            if sheets_data:
+                return sheets_data, False
+            sheets_data, failed = parse(file_path, columns)
+            if not failed:
+                parse_cache.put(file_path, sheets_data, columns)
+            return sheets_data, failed
+    
+    return read, reader
+
+
+def read_files_parallel(file_paths: Iterable[str],
+                        max_workers: Optional[int] = None,
+                        backend: str = 'process',
+                        parse_cache: Optional[ParseCache] = None,
+                        columns: Optional[List] = None,
+                        csv_chunk_rows: Optional[int] = None) -> Iterator[ReadResult]:
+    """
+    并行读取多个文件，按完成顺序返回结果
+    
+    Args:
+        file_paths: 文件路径列表
+        max_workers: 并发数，默认为CPU核心数
+        backend: 'process' 使用多进程解析，'thread' 使用线程
+        parse_cache: 解析缓存，为 None 时不使用缓存
+        columns: 列投影，只读取这些列，为 None 时读取所有列
+        csv_chunk_rows: 指定时CSV文件按此行数分块惰性读取（见 read_file_sheets）
+    
+    Yields:
+        (file_path, sheets_data, failed)
+    """
+    file_paths = list(file_paths)
+    read, reader = make_file_reader(max_workers, backend, parse_cache, csv_chunk_rows)
+    
+    # 用线程等待各个子进程的结果，保证按完成顺序返回
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(read, path, columns): path for path in file_paths}
+            for future in as_completed(futures):
+                sheets_data, failed = future.result()
+                yield futures[future], sheets_data, failed
+    finally:
+        if reader is not None:
+            reader.shutdown()
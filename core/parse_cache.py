@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+解析结果磁盘缓存
+把解析后的sheet以Arrow/Feather列式格式保存在本地缓存目录，未修改的文件可直接从缓存加载
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import pickle
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from .constants import PARSE_CACHE_MAX_BYTES
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:  # pyarrow 为可选依赖，没有时缓存不可用
+    pa = None
+    feather = None
+
+
+# 内容指纹采样的字节数（文件头和文件尾各一段）
+FINGERPRINT_SAMPLE_SIZE = 64 * 1024
+
+MANIFEST_NAME = "manifest.json"
+
+
+def get_default_cache_dir() -> Path:
+    """获取默认缓存目录（Windows 为 %LOCALAPPDATA%，其他系统为 ~/.cache）"""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or Path.home() / "AppData" / "Local"
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or Path.home() / ".cache"
+    return Path(base) / "merge_excels" / "parse_cache"
+
+
+def _hash_file(path: Path) -> str:
+    """计算文件内容的校验值"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _content_fingerprint(path: Path, size: int) -> str:
+    """采样文件头尾计算内容指纹，用于发现修改时间未变但内容已变的情况"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_SAMPLE_SIZE))
+        if size > FINGERPRINT_SAMPLE_SIZE:
+            f.seek(max(FINGERPRINT_SAMPLE_SIZE, size - FINGERPRINT_SAMPLE_SIZE))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    解析结果磁盘缓存
+    
+    每个源文件对应缓存目录下的一个子目录，键由绝对路径、文件大小、修改时间和内容指纹生成，
+    只读取部分列（列投影）的结果另外按投影的列保存。
+    子目录中每个sheet保存为一个Feather文件，manifest.json 记录sheet列表和各文件的校验值，
+    加载时校验不通过的条目会被删除。缓存总大小超过上限时按最近使用时间淘汰
+    """
+    
+    def __init__(self, cache_dir: Optional[str] = None,
+                 max_bytes: int = PARSE_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir) if cache_dir else get_default_cache_dir()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+    
+    @property
+    def available(self) -> bool:
+        """是否可用（需要安装pyarrow）"""
+        return feather is not None
+    
+    def _entry_key(self, file_path: Path, columns: Optional[List] = None) -> str:
+        """根据 (绝对路径, 大小, 修改时间, 内容指纹[, 投影的列]) 生成缓存键"""
+        stat = file_path.stat()
+        fingerprint = _content_fingerprint(file_path, stat.st_size)
+        raw = f"{file_path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}|{fingerprint}"
+        if columns is not None:
+            raw += "|" + json.dumps(sorted(str(c) for c in columns), ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    def get(self, file_path: str,
+            columns: Optional[List] = None) -> Optional[Dict[str, pd.DataFrame]]:
+        """
+        从缓存加载文件的解析结果
+        
+        Args:
+            file_path: 源文件路径
+            columns: 读取时使用的列投影，为 None 表示读取了所有列
+        
+        Returns:
+            字典 {sheet_name: DataFrame}，未命中或校验失败时返回 None
+        """
+        if not self.available:
+            return None
+        entry_dir = None
+        try:
+            entry_dir = self.cache_dir / self._entry_key(Path(file_path), columns)
+            manifest_path = entry_dir / MANIFEST_NAME
+            if not manifest_path.exists():
+                return None
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            
+            sheets_data = {}
+            for sheet in manifest['sheets']:
+                data_path = entry_dir / sheet['file']
+                if _hash_file(data_path) != sheet['checksum']:
+                    raise ValueError(f"校验失败: {data_path.name}")
+                if sheet['format'] == 'feather':
+                    df = feather.read_feather(data_path)
+                    df.columns = sheet['columns']
+                    sheets_data[sheet['name']] = df
+                else:
+                    with open(data_path, 'rb') as f:
+                        sheets_data[sheet['name']] = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"警告: 读取解析缓存失败 {file_path}: {e}")
+            if entry_dir is not None:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+        
+        # 更新最近使用时间，用于LRU淘汰；条目可能刚被其他进程或线程淘汰，此时按未命中处理
+        try:
+            os.utime(manifest_path)
+        except OSError:
+            return None
+        return sheets_data
+    
+    def put(self, file_path: str, sheets_data: Dict[str, pd.DataFrame],
+            columns: Optional[List] = None):
+        """
+        保存文件的解析结果到缓存
+        
+        Args:
+            file_path: 源文件路径
+            sheets_data: 字典 {sheet_name: DataFrame}
+            columns: 读取时使用的列投影，为 None 表示读取了所有列
+        """
+        if not self.available or not sheets_data:
+            return
+        if not all(isinstance(df, pd.DataFrame) for df in sheets_data.values()):
+            return  # 分块读取的大CSV不缓存（本身就是从源文件逐块读取）
+        tmp_dir = None
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            entry_dir = self.cache_dir / self._entry_key(Path(file_path), columns)
+            # 先写入临时目录再重命名，避免留下写了一半的条目
+            tmp_dir = Path(tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-"))
+            sheets = []
+            for idx, (sheet_name, df) in enumerate(sheets_data.items()):
+                data_path = tmp_dir / f"{idx}.feather"
+                try:
+                    # Feather要求列名为字符串，列名原样记录在manifest中
+                    feather.write_feather(
+                        df.set_axis([str(c) for c in df.columns], axis=1), data_path
+                    )
+                    data_format = 'feather'
+                except (pa.ArrowException, TypeError, ValueError):
+                    # 混合类型的列无法转换为Arrow，退回pickle
+                    data_path = tmp_dir / f"{idx}.pkl"
+                    with open(data_path, 'wb') as f:
+                        pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    data_format = 'pickle'
+                sheets.append({
+                    'name': sheet_name,
+                    'file': data_path.name,
+                    'format': data_format,
+                    'columns': list(df.columns) if data_format == 'feather' else None,
+                    'checksum': _hash_file(data_path),
+                })
+            with open(tmp_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'source': str(Path(file_path).resolve()),
+                    'created': time.time(),
+                    'sheets': sheets,
+                }, f, ensure_ascii=False, default=str)
+            
+            with self._lock:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                os.replace(tmp_dir, entry_dir)
+            self.evict()
+        except Exception as e:
+            print(f"警告: 写入解析缓存失败 {file_path}: {e}")
+            if tmp_dir is not None:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+    
+    def read(self, file_path: str,
+             reader: Callable[[str], Dict[str, pd.DataFrame]]) -> Dict[str, pd.DataFrame]:
+        """
+        优先从缓存加载，未命中时调用 reader 解析并写入缓存
+        
+        Args:
+            file_path: 源文件路径
+            reader: 解析函数，如 read_file_sheets
+        
+        Returns:
+            字典 {sheet_name: DataFrame}
+        """
+        sheets_data = self.get(file_path)
+        if sheets_data is not None:
+            print(f"从解析缓存加载: {file_path}")
+            return sheets_data
+        sheets_data = reader(file_path)
+        self.put(file_path, sheets_data)
+        return sheets_data
+    
+    def size_bytes(self) -> int:
+        """缓存目录的总大小"""
+        if not self.cache_dir.exists():
+            return 0
+        return sum(f.stat().st_size for f in self.cache_dir.rglob('*') if f.is_file())
+    
+    def evict(self):
+        """缓存总大小超过上限时，按最近使用时间从旧到新删除条目"""
+        with self._lock:
+            if not self.cache_dir.exists():
+                return
+            entries = []
+            total = 0
+            for entry_dir in self.cache_dir.iterdir():
+                if entry_dir.name.startswith(".tmp-"):
+                    continue  # 正在写入的条目
+                manifest_path = entry_dir / MANIFEST_NAME
+                if not manifest_path.exists():
+                    continue
+                size = sum(f.stat().st_size for f in entry_dir.iterdir())
+                entries.append((manifest_path.stat().st_mtime, size, entry_dir))
+                total += size
+            entries.sort()
+            for _, size, entry_dir in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+    
+    def clear(self):
+        """清空缓存目录"""
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+流水线合并模块
+读取、对齐和写入同时进行：读取线程池按输入顺序解析文件，对齐线程把结果按目标表头切成数据块放入有界队列，
+写入阶段从队列中取出数据块写入输出文件。队列满时对齐和读取都会暂停（背压），内存占用有上限
+"""
+
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from .constants import MERGE_CHUNK_ROWS, PIPELINE_QUEUE_CHUNKS
+from .data_merger import MergeCancelled, iter_merge_chunks, save_result
+from .deduplicator import RowDeduplicator
+from .parallel_reader import make_file_reader
+from .parse_cache import ParseCache
+
+
+class PipelineCancelled(MergeCancelled):
+    """流水线合并被取消"""
+
+
+# 队列中的结束标记
+_END = object()
+
+
+class _Failure:
+    """对齐阶段出错时放入队列，写入阶段取出后重新抛出"""
+    
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class MergePipeline:
+    """
+    流水线合并
+    
+    - 读取: max_workers 个线程（多进程后端时由线程等待子进程）按输入顺序解析文件，
+      同时在读取中或已读完等待对齐的文件不超过 2 * max_workers 个
+    - 对齐: 一个线程按输入顺序对齐每个文件的数据（可选去重），放入最多 queue_size 个数据块的队列
+    - 写入: 调用 run 的线程从队列中取出数据块，交给 save_result 逐块写入
+    
+    各阶段的忙碌时间和等待时间记录在 stats 中，利用率最高的阶段就是瓶颈
+    """
+    
+    def __init__(self, file_paths: List[str], target_headers: List[str], output_path: str,
+                 chunk_size: Optional[int] = MERGE_CHUNK_ROWS,
+                 drop_duplicates: bool = False,
+                 max_workers: int = 4,
+                 backend: str = 'thread',
+                 parse_cache: Optional[ParseCache] = None,
+                 csv_chunk_rows: Optional[int] = None,
+                 queue_size: int = PIPELINE_QUEUE_CHUNKS,
+                 schema: Optional[Dict] = None,
+                 save_options: Optional[Dict] = None,
+                 progress: Optional[Callable[[int, int], None]] = None):
+        """
+        Args:
+            file_paths: 按合并顺序排列的文件路径
+            target_headers: 目标表头列表（同时作为读取时的列投影）
+            output_path: 保存路径，格式由扩展名决定
+            chunk_size: 每个数据块的最大行数
+            drop_duplicates: 是否去除完全重复的行
+            max_workers: 并行读取的文件数
+            backend: 'process' 使用多进程解析，'thread' 使用线程
+            parse_cache: 解析缓存，为 None 时不使用缓存
+            csv_chunk_rows: 指定时CSV文件按此行数分块惰性读取（见 read_file_sheets）
+            queue_size: 对齐和写入之间的队列最多容纳的数据块数
+            schema: 统一的列类型（流水线中无法事先读取所有文件，通常为 None）
+            save_options: 传给 save_result 的其他参数（如 compression、shard_mode）
+            progress: 每写入一个数据块后调用 progress(已对齐行数, 已写入行数)
+        """
+        self.file_paths = list(file_paths)
+        self.target_headers = list(target_headers)
+        self.output_path = output_path
+        self.chunk_size = chunk_size
+        self.max_workers = max(1, max_workers)
+        self.backend = backend
+        self.parse_cache = parse_cache
+        self.csv_chunk_rows = csv_chunk_rows
+        self.queue_size = max(1, queue_size)
+        self.schema = schema
+        self.save_options = save_options or {}
+        self.progress = progress
+        self.deduplicator = RowDeduplicator() if drop_duplicates else None
+        
+        self.statistics: List[Dict] = []
+        self.failed_files: List[str] = []
+        self.input_rows = 0
+        self.output_rows = 0
+        
+        self._queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        self._cancelled = threading.Event()
+        self._writer_done = threading.Event()
+        self._lock = threading.Lock()
+        self._read_busy = 0.0
+        self._align_busy = 0.0
+        self._align_wait = 0.0  # 对齐线程等待读取结果的时间
+        self._align_blocked = 0.0  # 对齐线程因队列已满等待的时间（背压）
+        self._write_busy = 0.0
+        self._write_wait = 0.0  # 写入阶段等待数据块的时间
+        self._max_queue = 0
+        self._elapsed = 0.0
+    
+    def cancel(self):
+        """请求取消，各阶段在处理下一个数据块前停止"""
+        self._cancelled.set()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+    
+    def _read(self, read, file_path: str):
+        """读取线程：解析一个文件并记录耗时"""
+        if self._cancelled.is_set():
+            return {}, True
+        start = time.perf_counter()
+        try:
+            return read(file_path, self.target_headers)
+        finally:
+            with self._lock:
+                self._read_busy += time.perf_counter() - start
+    
+    def _put(self, item) -> bool:
+        """放入队列，队列满时等待；已取消或写入阶段已结束时返回False"""
+        start = time.perf_counter()
+        try:
+            while not self._cancelled.is_set() and not self._writer_done.is_set():
+                try:
+                    self._queue.put(item, timeout=0.1)
+                    self._max_queue = max(self._max_queue, self._queue.qsize())
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            self._align_blocked += time.perf_counter() - start
+    
+    def _produce(self):
+        """对齐线程：按输入顺序取读取结果，对齐后放入队列"""
+        read, reader = make_file_reader(self.max_workers, self.backend, self.parse_cache, self.csv_chunk_rows)
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            paths = iter(self.file_paths)
+            window: deque = deque()
+            
+            def fill():
+                # 限制已提交但还没有对齐的文件数，避免读取远远领先于写入
+                while len(window) < 2 * self.max_workers:
+                    file_path = next(paths, None)
+                    if file_path is None:
+                        return
+                    window.append((file_path, executor.submit(self._read, read, file_path)))
+            
+            fill()
+            while window:
+                if self._cancelled.is_set() or self._writer_done.is_set():
+                    return
+                file_path, future = window.popleft()
+                start = time.perf_counter()
+                sheets_data, failed = future.result()
+                self._align_wait += time.perf_counter() - start
+                fill()
+                if failed:
+                    print(f"错误: 读取文件 {file_path} 失败，跳过")
+                    self.failed_files.append(file_path)
+                    continue
+                
+                busy_start = time.perf_counter()
+                blocked_before = self._align_blocked
+                for chunk in iter_merge_chunks({file_path: sheets_data}, self.target_headers,
+                                               self.statistics, self.chunk_size, self.schema):
+                    self.input_rows += len(chunk)
+                    if self.deduplicator is not None:
+                        chunk = self.deduplicator.drop_duplicates(chunk)
+                    if not self._put(chunk):
+                        return
+                del sheets_data
+                self._align_busy += time.perf_counter() - busy_start - (self._align_blocked - blocked_before)
+            self._put(_END)
+        except BaseException as e:
+            self._put(_Failure(e))
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            if reader is not None:
+                reader.shutdown()
+    
+    def _consume(self) -> Iterator[pd.DataFrame]:
+        """写入阶段：从队列中取出数据块，直到结束标记"""
+        while True:
+            start = time.perf_counter()
+            while True:
+                if self._cancelled.is_set():
+                    raise PipelineCancelled()
+                try:
+                    item = self._queue.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    continue
+            self._write_wait += time.perf_counter() - start
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            self.output_rows += len(item)
+            yield item
+            if self.progress is not None:
+                self.progress(self.input_rows, self.output_rows)
+    
+    def run(self) -> bool:
+        """
+        执行流水线合并（阻塞直到写入结束）
+        
+        Returns:
+            是否保存成功
+        
+        Raises:
+            PipelineCancelled: 已取消
+        """
+        start = time.perf_counter()
+        producer = threading.Thread(target=self._produce, name="merge-pipeline-align", daemon=True)
+        producer.start()
+        try:
+            success = save_result(self._consume(), self.output_path, schema=self.schema, **self.save_options)
+        finally:
+            self._writer_done.set()
+            producer.join()
+            self._elapsed = time.perf_counter() - start
+            self._write_busy = max(self._elapsed - self._write_wait, 0.0)
+        if self._cancelled.is_set():
+            raise PipelineCancelled()
+        return success
+    
+    @property
+    def duplicate_count(self) -> int:
+        return self.deduplicator.duplicate_count if self.deduplicator is not None else 0
+    
+    @property
+    def stats(self) -> Dict:
+        """
+        各阶段的忙碌时间和利用率
+        
+        读取的利用率按 max_workers 个并发计算；对齐线程等待读取多说明读取是瓶颈，
+        因队列已满而阻塞多说明写入是瓶颈
+        """
+        elapsed = self._elapsed or 1e-9
+        stages = {
+            'read': {
+                'busy_seconds': round(self._read_busy, 3),
+                'utilization': round(self._read_busy / (elapsed * self.max_workers), 3),
+                'workers': self.max_workers,
+            },
+            'align': {
+                'busy_seconds': round(self._align_busy, 3),
+                'utilization': round(self._align_busy / elapsed, 3),
+                'wait_read_seconds': round(self._align_wait, 3),
+                'blocked_seconds': round(self._align_blocked, 3),
+            },
+            'write': {
+                'busy_seconds': round(self._write_busy, 3),
+                'utilization': round(self._write_busy / elapsed, 3),
+                'wait_seconds': round(self._write_wait, 3),
+            },
+        }
+        return {
+            'elapsed_seconds': round(self._elapsed, 3),
+            'stages': stages,
+            'bottleneck': max(stages, key=lambda name: stages[name]['utilization']),
+            'max_queue_chunks': self._max_queue,
+            'queue_size': self.queue_size,
+        }
+
+
+def format_pipeline_stats(stats: Dict) -> List[str]:
+    """把流水线各阶段的利用率整理成便于阅读的文本，每个阶段一行"""
+    names = {'read': "读取", 'align': "对齐", 'write': "写入"}
+    lines = [
+        f"{names[name]}: 利用率 {stage['utilization']:.0%}，忙碌 {stage['busy_seconds']:.1f} 秒"
+        for name, stage in stats['stages'].items()
+    ]
+    lines.append(f"瓶颈: {names[stats['bottleneck']]}（队列峰值 {stats['max_queue_chunks']}/{stats['queue_size']} 块）")
+    return lines
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+列类型统一模块
+合并前检查每个目标列在所有sheet中的类型，确定统一的目标类型，避免合并时整列退化为object
+"""
+
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+# 列的值类别
+KIND_INT = 'int'
+KIND_FLOAT = 'float'
+KIND_BOOL = 'bool'
+KIND_DATETIME = 'datetime'
+KIND_TEXT = 'text'
+KIND_MIXED = 'mixed'
+KIND_EMPTY = 'empty'
+
+# infer_dtype 的结果与值类别的对应关系（object列）
+_INFERRED_KINDS = {
+    'integer': KIND_INT,
+    'floating': KIND_FLOAT,
+    'mixed-integer-float': KIND_FLOAT,
+    'decimal': KIND_FLOAT,
+    'boolean': KIND_BOOL,
+    'datetime': KIND_DATETIME,
+    'datetime64': KIND_DATETIME,
+    'string': KIND_TEXT,
+    'empty': KIND_EMPTY,
+}
+
+
+def _blank_mask(series: pd.Series) -> pd.Series:
+    """object列中只有空白字符的单元格"""
+    return series.map(lambda value: isinstance(value, str) and not value.strip()).astype(bool)
+
+
+def column_kind(series: pd.Series) -> str:
+    """
+    判断列的值类别
+    
+    object列按实际的值判断（忽略空值和空白文本），例如只有整数和空单元格的object列视为整数列；
+    所有值都是整数的浮点列（通常是有空单元格的整数列）视为整数列
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return column_kind(pd.Series(dtype.categories)) if len(dtype.categories) else KIND_EMPTY
+    if isinstance(dtype, pd.StringDtype):
+        return KIND_TEXT
+    if pd.api.types.is_bool_dtype(dtype):
+        return KIND_BOOL
+    if pd.api.types.is_integer_dtype(dtype):
+        return KIND_INT
+    if pd.api.types.is_float_dtype(dtype):
+        values = series.dropna().to_numpy()
+        if len(values) == 0:
+            return KIND_EMPTY
+        return KIND_INT if np.all(np.mod(values, 1) == 0) else KIND_FLOAT
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return KIND_DATETIME
+    if dtype == object:
+        inferred = pd.api.types.infer_dtype(series[~_blank_mask(series)], skipna=True)
+        return _INFERRED_KINDS.get(inferred, KIND_MIXED)
+    return KIND_MIXED
+
+
+def _target_dtype(kinds: set, has_missing: bool) -> Optional[str]:
+    """根据各sheet的值类别确定目标类型，无法统一时返回 None"""
+    kinds = kinds - {KIND_EMPTY}
+    if not kinds:
+        return None
+    if kinds == {KIND_INT}:
+        return 'Int64' if has_missing else 'int64'
+    if kinds <= {KIND_INT, KIND_FLOAT}:
+        return 'float64'
+    if kinds == {KIND_BOOL}:
+        return 'boolean' if has_missing else 'bool'
+    if kinds == {KIND_DATETIME}:
+        return 'datetime64[ns]'
+    if kinds == {KIND_TEXT}:
+        return 'string'
+    return None
+
+
+def _union_categories(dtypes: List[pd.CategoricalDtype]) -> Optional[pd.CategoricalDtype]:
+    """各sheet分类类型的类别按出现顺序合并为一个分类类型，类别的类型不同（如数字和文本）时返回 None"""
+    try:
+        union = union_categoricals(
+            [pd.Categorical([], dtype=dtype) for dtype in dtypes], ignore_order=True
+        )
+    except TypeError:
+        return None
+    return pd.CategoricalDtype(union.categories)
+
+
+def resolve_schema(files_data: Mapping[str, Mapping[str, pd.DataFrame]],
+                   target_headers: List) -> Tuple[Dict, List[Dict]]:
+    """
+    确定每个目标列的统一类型
+    
+    只为各sheet类型不一致、或有sheet缺少的列给出目标类型（整数列有空值时为可空的 Int64）；
+    各sheet都是分类的列统一为类别的并集（CategoricalDtype），流式合并的各数据块类别相同；
+    值类别无法统一的列（如一个文件是数字、另一个文件是文本）保持原样并记录下来
+    
+    Args:
+        files_data: 文件数据字典，格式为 {file_path: {sheet_name: DataFrame}}
+        target_headers: 目标表头列表
+    
+    Returns:
+        (schema, conflicts)
+        schema: {列名: 目标类型（类型名或 CategoricalDtype）}，可传给 apply_schema / iter_merge_chunks / merge_data
+        conflicts: [{'column', 'kinds': {值类别: [(文件, sheet), ...]}}, ...]
+    """
+    dtypes: Dict = {header: set() for header in target_headers}
+    kinds: Dict = {header: {} for header in target_headers}
+    has_missing: Dict = {header: False for header in target_headers}  # 有空值或有sheet缺少该列
+    absent: Dict = {header: False for header in target_headers}  # 有sheet缺少该列
+    categoricals: Dict = {header: [] for header in target_headers}  # 按出现顺序的分类类型
+    for file_path, sheets_data in files_data.items():
+        for sheet_name, df in sheets_data.items():
+            if not isinstance(df, pd.DataFrame):
+                df = df.head()  # 分块读取的大CSV只根据开头的数据判断类型
+            present = set(df.columns)
+            for header in target_headers:
+                if header not in present:
+                    has_missing[header] = True
+                    absent[header] = True
+                    continue
+                series = df[header]
+                if isinstance(series, pd.DataFrame):
+                    series = series.iloc[:, 0]  # 重复列名只看第一列
+                kind = column_kind(series)
+                dtypes[header].add(series.dtype)
+                if isinstance(series.dtype, pd.CategoricalDtype):
+                    categoricals[header].append(series.dtype)
+                kinds[header].setdefault(kind, []).append((file_path, sheet_name))
+                if series.isna().any() or (series.dtype == object and _blank_mask(series).any()):
+                    has_missing[header] = True
+    
+    schema = {}
+    conflicts = []
+    for header in target_headers:
+        column_kinds = set(kinds[header])
+        if len(dtypes[header]) <= 1 and not absent[header]:
+            continue  # 各sheet类型一致，合并时不会改变类型
+        if dtypes[header] and all(isinstance(d, pd.CategoricalDtype) for d in dtypes[header]):
+            union = _union_categories(categoricals[header])
+            if union is not None:
+                schema[header] = union
+            continue  # 类别的类型不同时在组装数据块时处理（见 _assemble_columns）
+        target = _target_dtype(column_kinds, has_missing[header])
+        if target is None:
+            if len(column_kinds - {KIND_EMPTY}) > 1 or KIND_MIXED in column_kinds:
+                conflicts.append({'column': header, 'kinds': kinds[header]})
+            continue
+        if target == 'string' and dtypes[header] == {np.dtype(object)}:
+            continue  # 全部是object文本列，合并结果本来就是object
+        schema[header] = target
+    return schema, conflicts
+
+
+def _cast(series: pd.Series, target: str) -> pd.Series:
+    """
+    把一列转换为目标类型
+    
+    只做不丢失信息的转换：目标类型是整数而列中有小数时抛出 ValueError，不会舍入或截断。
+    分块读取的大CSV只根据开头的数据确定类型，后面的数据块可能出现这种情况
+    """
+    if series.dtype == target:
+        return series
+    if isinstance(target, pd.CategoricalDtype):
+        # 先检查再转换：不在类别中的值会变成空值（新版pandas中直接报错）
+        if (series.notna() & ~series.isin(target.categories)).any():
+            raise ValueError("列中有不在统一类别中的值")
+        return series.astype(target)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(series.dtype.categories.dtype)
+    if target in ('Int64', 'int64', 'float64') and (
+            series.dtype == object or isinstance(series.dtype, pd.StringDtype)):
+        series = pd.to_numeric(series.mask(_blank_mask(series)))
+    if target in ('Int64', 'int64') and pd.api.types.is_float_dtype(series.dtype):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        values = values[~np.isnan(values)]
+        if not np.all(np.mod(values, 1) == 0):
+            raise ValueError("列中有非整数的值")
+    elif target == 'datetime64[ns]' and not pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return pd.to_datetime(series)
+    return series.astype(target)
+
+
+def apply_schema(df: pd.DataFrame, schema: Dict) -> pd.DataFrame:
+    """
+    按统一的类型转换DataFrame中的列，转换失败的列保持原样
+    
+    Args:
+        df: 数据（通常是已按目标表头对齐的数据块）
+        schema: resolve_schema 的结果 {列名: 目标类型}
+    
+    Returns:
+        转换后的DataFrame
+    """
+    if not schema:
+        return df
+    columns = {}
+    changed = False
+    for idx, header in enumerate(df.columns):
+        series = df.iloc[:, idx]
+        target = schema.get(header)
+        if target is not None:
+            try:
+                cast = _cast(series, target)
+            except (TypeError, ValueError) as e:
+                print(f"警告: 列 {header} 无法转换为 {target}，保持原类型: {e}")
+                cast = series
+            changed = changed or cast is not series
+            series = cast
+        columns[idx] = series
+    if not changed:
+        return df
+    result = pd.DataFrame(columns, index=df.index)
+    result.columns = df.columns
+    return result
+
+
+def format_conflicts(conflicts: List[Dict]) -> List[str]:
+    """把无法统一类型的列整理成便于阅读的文本，每列一行"""
+    lines = []
+    for conflict in conflicts:
+        details = ", ".join(
+            f"{kind}({len(locations)} 个sheet)" for kind, locations in conflict['kinds'].items()
+        )
+        lines.append(f"{conflict['column']}: {details}")
+    return lines
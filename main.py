@@ -7,6 +7,7 @@ Excel/CSV文件合并工具 - PySide6版本
 
 import sys
 import traceback
+import multiprocessing
 from pathlib import Path
 from PySide6.QtWidgets import QApplication, QMessageBox
 from PySide6.QtGui import QIcon
@@ -51,5 +52,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包后的程序使用多进程解析时需要
+    multiprocessing.freeze_support()
     main()
 
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+数据合并测试：预分配组装和流式合并的结果与逐个 reindex 后 concat 一致
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.data_merger import iter_merge_chunks, merge_data
+from core.file_reader import CsvChunkReader
+from core.schema import resolve_schema, apply_schema
+
+
+HEADERS = ['编号', '金额', '名称', '日期', '不存在']
+
+
+def _files_data():
+    """多个小sheet（列顺序不同、缺少某列、类型不同）加一个超过数据块大小的sheet"""
+    rng = np.random.default_rng(0)
+    files_data = {}
+    for idx in range(24):
+        rows = int(rng.integers(0, 12))
+        data = {
+            '编号': rng.integers(0, 9, rows),
+            '金额': rng.random(rows),
+            '名称': [f"s{k}" for k in range(rows)],
+            '日期': pd.date_range('2024-01-01', periods=rows),
+        }
+        if idx % 3 == 0:
+            del data['金额']
+        if idx % 5 == 0:
+            data['编号'] = data['编号'].astype(float)
+        if idx % 7 == 0:
+            data['名称'] = pd.Categorical(data['名称'])
+        df = pd.DataFrame(data)
+        if idx % 2:
+            df = df[df.columns[::-1]]
+        files_data.setdefault(f"文件{idx // 4}.xlsx", {})[f"Sheet{idx}"] = df
+    files_data['大文件.xlsx'] = {'Sheet1': pd.DataFrame({'编号': range(70), '名称': ['x'] * 70})}
+    return files_data
+
+
+def _expected(files_data, schema):
+    frames = [apply_schema(df.reindex(columns=HEADERS), schema)
+              for sheets_data in files_data.values() for df in sheets_data.values()]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _assert_same_values(result, expected):
+    assert list(result.columns) == HEADERS
+    for header in HEADERS:
+        pd.testing.assert_series_equal(result[header].astype(object), expected[header].astype(object),
+                                       check_dtype=False)
+
+
+def test_merge_data_matches_concat():
+    """预分配组装的结果与逐个 reindex 后 concat 的值相同，统计每个sheet的行数"""
+    files_data = _files_data()
+    schema, _ = resolve_schema(files_data, HEADERS)
+    merged, statistics = merge_data(files_data, HEADERS, schema)
+    _assert_same_values(merged, _expected(files_data, schema))
+    assert len(statistics) == sum(len(sheets) for sheets in files_data.values())
+
+
+@pytest.mark.parametrize('chunk_size', [None, 25, 1000])
+def test_iter_merge_chunks_matches_concat(chunk_size):
+    """流式合并的数据块拼接后与整体合并相同，每块不超过 chunk_size 行"""
+    files_data = _files_data()
+    schema, _ = resolve_schema(files_data, HEADERS)
+    statistics = []
+    chunks = list(iter_merge_chunks(files_data, HEADERS, statistics, chunk_size, schema))
+    _assert_same_values(pd.concat(chunks, ignore_index=True), _expected(files_data, schema))
+    assert len(statistics) == sum(len(sheets) for sheets in files_data.values())
+    if chunk_size is not None:
+        assert all(len(chunk) <= chunk_size for chunk in chunks)
+
+
+def test_small_sheets_are_batched():
+    """连续的小sheet攒成一个数据块，不会为每个sheet产出一个很小的数据块"""
+    files_data = {f"{idx}.csv": {'Sheet1': pd.DataFrame({'a': [idx, idx]})} for idx in range(10)}
+    chunks = list(iter_merge_chunks(files_data, ['a'], chunk_size=8))
+    assert [len(chunk) for chunk in chunks] == [8, 8, 4]
+    assert pd.concat(chunks)['a'].tolist() == [idx for idx in range(10) for _ in range(2)]
+
+
+def test_csv_chunk_reader_is_streamed(tmp_path):
+    """分块读取的大CSV逐块对齐，行数计入统计"""
+    path = tmp_path / "大.csv"
+    pd.DataFrame({'名称': [f"n{idx}" for idx in range(25)], '编号': range(25)}).to_csv(path, index=False)
+    files_data = {str(path): {'Sheet1': CsvChunkReader(str(path), 10)}}
+    statistics = []
+    chunks = list(iter_merge_chunks(files_data, ['编号', '名称'], statistics, chunk_size=10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert pd.concat(chunks)['编号'].tolist() == list(range(25))
+    assert statistics[0]['rows'] == 25
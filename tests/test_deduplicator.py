@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+重复行检测测试：逐块检测的结果与合并后整体调用 duplicated() 一致
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.deduplicator import RowDeduplicator, count_duplicates
+
+
+def _chunks():
+    """同一列在不同数据块中类型不同（整数、浮点、object数字、文本、分类），有的数据块缺少某列"""
+    columns = ['编号', '金额', '名称']
+    return [
+        pd.DataFrame({'编号': [1, 2, 3], '金额': [1.5, 2.0, np.nan], '名称': ['a', 'b', None]}),
+        pd.DataFrame({'编号': [1.0, 2.0, 4.0], '金额': [1.5, 2, None], '名称': ['a', 'b', 'c']}),
+        pd.DataFrame({'编号': pd.Series([3, 5], dtype=object), '金额': [np.nan, 1],
+                      '名称': pd.Categorical([None, 'x'])}),
+        pd.DataFrame({'编号': [3, 5], '名称': [None, 'x']}).reindex(columns=columns),
+        pd.DataFrame({'编号': pd.array([1, None], dtype='Int64'), '金额': [1.5, None],
+                      '名称': pd.Series(['a', None], dtype='string')}),
+    ]
+
+
+def test_chunked_matches_duplicated():
+    """数据块之间的重复行（类型不同但值相同）与整体 duplicated() 的结果一致"""
+    chunks = _chunks()
+    deduplicator = RowDeduplicator()
+    masks = [deduplicator.duplicated(chunk) for chunk in chunks]
+    merged = pd.concat([chunk.astype(object) for chunk in chunks], ignore_index=True)
+    expected = merged.map(lambda value: None if pd.isna(value) else float(value)
+                          if isinstance(value, (int, float)) else value).duplicated().to_numpy()
+    np.testing.assert_array_equal(np.concatenate(masks), expected)
+    assert deduplicator.duplicate_count == int(expected.sum())
+    assert deduplicator.total_rows == len(merged)
+
+
+def test_drop_duplicates_within_chunk():
+    """块内重复的行按值确认后去掉，保留第一次出现的行"""
+    chunk = pd.DataFrame({'a': [1, 1, 2, 1], 'b': ['x', 'x', 'y', 'z']})
+    result = RowDeduplicator().drop_duplicates(chunk)
+    assert result.index.tolist() == [0, 2, 3]
+
+
+def test_datetime_columns_with_missing_values():
+    """日期列（含缺失值）可以去重，缺失值之间视为相同"""
+    chunk = pd.DataFrame({'t': pd.to_datetime(['2024-01-01', None, None, '2024-01-01'])})
+    count, mask = count_duplicates(chunk)
+    assert count == 2
+    assert mask.tolist() == [False, False, True, True]
+
+
+def test_save_and_load_keep_seen_rows(tmp_path):
+    """保存后加载的索引仍能识别之前出现过的行"""
+    deduplicator = RowDeduplicator()
+    deduplicator.duplicated(pd.DataFrame({'a': [1, 2, 3]}))
+    path = str(tmp_path / "index.npz")
+    deduplicator.save(path)
+    loaded = RowDeduplicator.load(path)
+    assert loaded.unique_count == 3
+    assert loaded.duplicated(pd.DataFrame({'a': [3, 4]})).tolist() == [True, False]
+
+
+def test_load_rejects_other_hash_version(tmp_path):
+    """行哈希计算方式不同的旧索引不能加载"""
+    path = tmp_path / "old.npz"
+    with open(path, 'wb') as f:
+        np.savez(f, primary=np.zeros(1, dtype=np.uint64), secondary=np.zeros(1, dtype=np.uint64))
+    with pytest.raises(ValueError):
+        RowDeduplicator.load(str(path))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+xlsx写入测试：超过行数上限时拆分为多个文件或sheet，以及逐块读回
+"""
+
+import json
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from core.excel_writer import write_excel_sharded, iter_excel_chunks, manifest_path
+
+
+def _chunks(rows: int, chunk_rows: int = 3):
+    for start in range(0, rows, chunk_rows):
+        stop = min(rows, start + chunk_rows)
+        yield pd.DataFrame({'编号': range(start, stop), '名称': ['x'] * (stop - start)})
+
+
+def _read_values(paths):
+    """按顺序读出所有文件、所有sheet的数据行（检查每个部分都有表头）"""
+    values = []
+    for path in paths:
+        workbook = load_workbook(path, read_only=True)
+        try:
+            for worksheet in workbook.worksheets:
+                rows = list(worksheet.values)
+                assert rows[0] == ('编号', '名称')
+                values.extend(row[0] for row in rows[1:])
+        finally:
+            workbook.close()
+    return values
+
+
+@pytest.mark.parametrize('shard_mode', ['files', 'sheets'])
+@pytest.mark.parametrize('rows', [4, 5])
+def test_no_shard_below_limit(tmp_path, shard_mode, rows):
+    """不超过上限时写入一个文件，不生成清单"""
+    output_path = str(tmp_path / "结果.xlsx")
+    written = write_excel_sharded(_chunks(rows), output_path, shard_rows=5, shard_mode=shard_mode)
+    assert written == [output_path]
+    assert _read_values(written) == list(range(rows))
+    assert not (tmp_path / "结果.manifest.json").exists()
+
+
+def test_shard_files_roll_over(tmp_path):
+    """超过上限时拆分为编号的文件，清单记录每个部分的行范围"""
+    output_path = str(tmp_path / "结果.xlsx")
+    written = write_excel_sharded(_chunks(12), output_path, shard_rows=5, shard_mode='files', max_workers=2)
+    assert [path.rsplit('_', 1)[-1] for path in written] == ['001.xlsx', '002.xlsx', '003.xlsx']
+    assert _read_values(written) == list(range(12))
+    with open(manifest_path(output_path), encoding='utf-8') as f:
+        shards = json.load(f)['shards']
+    assert [(shard['first_row'], shard['rows']) for shard in shards] == [(1, 5), (6, 5), (11, 2)]
+
+
+def test_shard_sheets_roll_over(tmp_path):
+    """sheets 方式在同一个工作簿中依次写满各sheet"""
+    output_path = str(tmp_path / "结果.xlsx")
+    written = write_excel_sharded(_chunks(12), output_path, shard_rows=5, shard_mode='sheets')
+    assert written == [output_path]
+    workbook = load_workbook(output_path, read_only=True)
+    assert workbook.sheetnames == ['Sheet1', 'Sheet2', 'Sheet3']
+    workbook.close()
+    assert _read_values(written) == list(range(12))
+
+
+def test_iter_excel_chunks_skips_empty_header_cells(tmp_path):
+    """表头中间有空单元格时按位置取列，后面的列不会错位"""
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.append(['a', None, 'b'])
+    worksheet.append([1, 'ignored', 3])
+    worksheet.append([4, None])
+    path = str(tmp_path / "结果.xlsx")
+    workbook.save(path)
+    chunks = list(iter_excel_chunks(path, 1))
+    assert [len(chunk) for chunk in chunks] == [1, 1]
+    result = pd.concat(chunks, ignore_index=True)
+    assert list(result.columns) == ['a', 'b']
+    assert result['b'].tolist()[0] == 3
+    assert pd.isna(result['b'].tolist()[1])
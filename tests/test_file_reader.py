@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文件读取测试：xlsx 流式读取与常规读取得到相同的数据
+"""
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from core.file_reader import read_file_sheets, _make_column_names
+
+
+@pytest.fixture
+def workbook_path(tmp_path):
+    """表头中间和末尾有空列、数据行比表头宽、中间和末尾有空白行的工作簿"""
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = "数据"
+    worksheet.append(['编号', None, '名称'])
+    worksheet.append([1, 2, 'a', None, 5])
+    worksheet.append([None] * 6)
+    worksheet.append([None, None, None, 7])
+    worksheet.append([4, 5, 'b'])
+    worksheet.append([None, None, None])
+    second = workbook.create_sheet("第二页")
+    second.append(['编号', '名称'])
+    second.append([9, 'z'])
+    path = tmp_path / "sample.xlsx"
+    workbook.save(path)
+    return str(path)
+
+
+def test_make_column_names_matches_pandas():
+    """空列名为 Unnamed: i，重复列名追加序号，数字表头还原为整数"""
+    assert _make_column_names(('a', None, 'a', 2.0, '')) == ['a', 'Unnamed: 1', 'a.1', 2, 'Unnamed: 4']
+
+
+def test_streaming_matches_regular_read(workbook_path):
+    """多出表头的单元格保留为 Unnamed 列，中间的空白行保留、末尾的空白行去掉"""
+    regular = read_file_sheets(workbook_path)
+    streaming = read_file_sheets(workbook_path, streaming=True)
+    assert list(streaming) == list(regular) == ['数据', '第二页']
+    for sheet_name, df in regular.items():
+        pd.testing.assert_frame_equal(streaming[sheet_name], df, check_dtype=False)
+    assert list(streaming['数据'].columns) == ['编号', 'Unnamed: 1', '名称', 'Unnamed: 3', 'Unnamed: 4']
+    assert len(streaming['数据']) == 4
+
+
+@pytest.mark.parametrize('columns', [['名称'], ['编号', 'Unnamed: 4'], ['不存在']])
+def test_streaming_projection_matches_regular_read(workbook_path, columns):
+    """列投影在两种模式下选出相同的列，不包含投影列的sheet都被跳过"""
+    regular = read_file_sheets(workbook_path, columns=columns)
+    streaming = read_file_sheets(workbook_path, streaming=True, columns=columns)
+    assert list(streaming) == list(regular)
+    for sheet_name, df in regular.items():
+        pd.testing.assert_frame_equal(streaming[sheet_name], df, check_dtype=False)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+追加合并测试：来源清单跳过已追加的文件，重复行索引缺失时从已有结果重建
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from core.output_appender import OutputAppender
+
+
+HEADERS = ['编号', '数量', '日期', '备注']
+
+
+def _frame():
+    """有前导零的编号（文本）、整数、日期和混合了数字与文本的列"""
+    return pd.DataFrame({
+        '编号': pd.Series(['001', '002'], dtype=object),
+        '数量': [1, 2],
+        '日期': pd.to_datetime(['2024-01-01', '2024-01-02 10:00'], format='ISO8601'),
+        '备注': pd.Series([1, 'a'], dtype=object),
+    })
+
+
+@pytest.fixture
+def source_files(tmp_path):
+    """源文件只用于来源清单的标识（大小、修改时间、校验值），内容各不相同"""
+    paths = []
+    for idx in range(3):
+        path = tmp_path / f"源{idx}.csv"
+        path.write_text(str(idx), encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+def test_append_skips_known_files(tmp_path, source_files):
+    """已包含在结果中的文件再次追加时跳过"""
+    output_path = str(tmp_path / "结果.csv")
+    appender = OutputAppender(output_path)
+    assert appender.append({source_files[0]: {'Sheet1': _frame()}}, HEADERS)['success']
+    pending, skipped = OutputAppender(output_path).pending_files(source_files[:2])
+    assert pending == [source_files[1]]
+    assert skipped == [source_files[0]]
+
+
+def test_rebuilt_csv_index_matches_new_rows(tmp_path, source_files):
+    """索引和来源清单都丢失时从CSV结果重建，文本编号和日期仍能识别为重复行"""
+    output_path = str(tmp_path / "结果.csv")
+    appender = OutputAppender(output_path, drop_duplicates=True)
+    assert appender.append({source_files[0]: {'Sheet1': _frame()}}, HEADERS)['success']
+    os.remove(appender.index_path)
+    os.remove(appender.manifest_path)
+    
+    appender = OutputAppender(output_path, drop_duplicates=True)
+    assert appender.manifest['rows'] == 2
+    result = appender.append({source_files[1]: {'Sheet1': _frame()}}, HEADERS)
+    assert result['appended_rows'] == 0
+    assert result['duplicate_rows'] == 2
+    assert result['total_rows'] == 2
+    assert len(pd.read_csv(output_path, encoding='utf-8-sig')) == 2
+
+
+def test_row_count_without_manifest(tmp_path, source_files):
+    """来源清单丢失且不去重时，结果的总行数从已有结果统计"""
+    output_path = str(tmp_path / "结果.csv")
+    appender = OutputAppender(output_path)
+    assert appender.append({source_files[0]: {'Sheet1': _frame()}}, HEADERS)['success']
+    os.remove(appender.manifest_path)
+    result = OutputAppender(output_path).append({source_files[1]: {'Sheet1': _frame()}}, HEADERS)
+    assert result['total_rows'] == 4
+
+
+def test_header_mismatch_is_rejected(tmp_path, source_files):
+    """已有结果的表头与目标表头不一致时拒绝追加"""
+    output_path = str(tmp_path / "结果.csv")
+    assert OutputAppender(output_path).append({source_files[0]: {'Sheet1': _frame()}}, HEADERS)['success']
+    with pytest.raises(ValueError):
+        OutputAppender(output_path).check_headers(['编号', '数量'])
+
+
+def test_parquet_index_rebuild(tmp_path, source_files):
+    """Parquet结果保留列类型，索引缺失时读回重建"""
+    pytest.importorskip('pyarrow')
+    output_path = str(tmp_path / "结果.parquet")
+    frame = _frame().astype({'备注': str})
+    appender = OutputAppender(output_path, drop_duplicates=True)
+    assert appender.append({source_files[0]: {'Sheet1': frame}}, HEADERS)['success']
+    os.remove(appender.index_path)
+    result = OutputAppender(output_path, drop_duplicates=True).append(
+        {source_files[1]: {'Sheet1': frame.copy()}}, HEADERS
+    )
+    assert result['duplicate_rows'] == 2
+    assert result['total_rows'] == 2
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+结果保存测试：各输出格式逐块写入，列类型变化时 Parquet/Feather 放宽列类型而不是失败
+"""
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.data_merger import MergeCancelled, save_result, append_result, output_format
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+feather = pytest.importorskip('pyarrow.feather')
+
+
+def _chunks():
+    """后面的数据块中整数列出现小数、数字列出现文本、空列出现数字"""
+    yield pd.DataFrame({'a': [1, 2], 'b': ['x', 'y'], 'c': [None, None], 'e': [1, 2]})
+    yield pd.DataFrame({'a': [2.5, np.nan], 'b': ['z', None], 'c': [3, 4], 'e': ['t', None]})
+
+
+def _read(path):
+    return pq.read_table(path) if output_format(path) == 'parquet' else feather.read_table(path)
+
+
+@pytest.mark.parametrize('extension', ['parquet', 'feather'])
+def test_columns_widen_instead_of_failing(tmp_path, extension):
+    """整数列出现小数时放宽为浮点、出现文本时放宽为文本，已写入的数据按新类型重写；第一块全为空的列按文本写入"""
+    path = str(tmp_path / f"结果.{extension}")
+    assert save_result(_chunks(), path, row_group_size=2)
+    table = _read(path)
+    assert pa.types.is_floating(table.schema.field('a').type)
+    assert pa.types.is_string(table.schema.field('e').type) or pa.types.is_large_string(table.schema.field('e').type)
+    result = table.to_pandas()
+    assert result['a'].tolist()[:3] == [1.0, 2.0, 2.5]
+    assert result['e'].tolist()[:3] == ['1', '2', 't']
+    assert result['c'].tolist()[2:] == ['3', '4']
+    assert not list(tmp_path.glob('*.widening.*'))
+
+
+def test_schema_fixes_types_up_front(tmp_path):
+    """按统一的列类型确定文件结构，无法统一类型的列写成文本"""
+    path = str(tmp_path / "结果.parquet")
+    assert save_result(_chunks(), path, schema={'a': 'float64'}, conflicts=[{'column': 'b'}])
+    fields = pq.read_schema(path)
+    assert pa.types.is_floating(fields.field('a').type)
+    assert pa.types.is_string(fields.field('b').type)
+
+
+def test_parquet_append_keeps_rows(tmp_path):
+    """追加到已有的Parquet文件，原有行组保留，新数据的类型放宽时同样处理"""
+    path = str(tmp_path / "结果.parquet")
+    assert save_result(pd.DataFrame({'a': [1, 2], 'b': ['x', 'y']}), path)
+    assert append_result([pd.DataFrame({'a': [3.5], 'b': ['z']})], path)
+    result = pq.read_table(path).to_pandas()
+    assert result['a'].tolist() == [1.0, 2.0, 3.5]
+    assert result['b'].tolist() == ['x', 'y', 'z']
+
+
+def test_csv_round_trip(tmp_path):
+    """CSV逐块写入，只写一次表头"""
+    path = str(tmp_path / "结果.csv")
+    assert save_result(_chunks(), path)
+    result = pd.read_csv(path, encoding='utf-8-sig')
+    assert list(result.columns) == ['a', 'b', 'c', 'e']
+    assert len(result) == 4
+
+
+def test_sqlite_rolls_back_on_cancel(tmp_path):
+    """SQLite写入在一个事务中，取消时回滚，已有的表保持原样，取消继续抛出"""
+    path = str(tmp_path / "结果.sqlite")
+    assert save_result(pd.DataFrame({'a': [1, 2]}), path)
+    
+    def cancelled():
+        yield pd.DataFrame({'a': [3]})
+        raise MergeCancelled()
+    
+    with pytest.raises(MergeCancelled):
+        save_result(cancelled(), path)
+    with sqlite3.connect(path) as connection:
+        assert connection.execute('SELECT a FROM merged').fetchall() == [(1,), (2,)]
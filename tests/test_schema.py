@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+列类型统一测试：目标类型的确定和无损转换
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.schema import resolve_schema, apply_schema, _cast
+
+
+def test_int_and_float_unify_to_float():
+    """一个文件是整数、另一个是小数的列统一为 float64"""
+    files_data = {
+        'a.xlsx': {'Sheet1': pd.DataFrame({'金额': [1, 2]})},
+        'b.xlsx': {'Sheet1': pd.DataFrame({'金额': [1.5, 2.5]})},
+    }
+    schema, conflicts = resolve_schema(files_data, ['金额'])
+    assert schema == {'金额': 'float64'}
+    assert conflicts == []
+
+
+def test_missing_column_makes_integers_nullable():
+    """有sheet缺少的整数列统一为可空的 Int64，缺失的行为空值而不是变成浮点"""
+    files_data = {
+        'a.xlsx': {'Sheet1': pd.DataFrame({'编号': [1, 2], '名称': ['x', 'y']})},
+        'b.xlsx': {'Sheet1': pd.DataFrame({'名称': ['z']})},
+    }
+    schema, _ = resolve_schema(files_data, ['编号', '名称'])
+    assert schema['编号'] == 'Int64'
+    aligned = apply_schema(files_data['b.xlsx']['Sheet1'].reindex(columns=['编号', '名称']), schema)
+    assert str(aligned['编号'].dtype) == 'Int64'
+    assert aligned['编号'].isna().all()
+
+
+def test_number_and_text_is_a_conflict():
+    """一个文件是数字、另一个是文本的列无法统一，记录为冲突"""
+    files_data = {
+        'a.xlsx': {'Sheet1': pd.DataFrame({'编号': [1, 2]})},
+        'b.xlsx': {'Sheet1': pd.DataFrame({'编号': pd.Series(['A1', 'B2'], dtype=object)})},
+    }
+    schema, conflicts = resolve_schema(files_data, ['编号'])
+    assert '编号' not in schema
+    assert [conflict['column'] for conflict in conflicts] == ['编号']
+
+
+def test_categories_are_unified():
+    """各sheet都是分类的列统一为类别的并集"""
+    files_data = {
+        'a.xlsx': {'Sheet1': pd.DataFrame({'地区': pd.Categorical(['北', '南'])})},
+        'b.xlsx': {'Sheet1': pd.DataFrame({'地区': pd.Categorical(['东', '北'])})},
+    }
+    schema, _ = resolve_schema(files_data, ['地区'])
+    assert set(schema['地区'].categories) == {'北', '南', '东'}
+    cast = apply_schema(files_data['b.xlsx']['Sheet1'], schema)
+    assert cast['地区'].dtype == schema['地区']
+    assert cast['地区'].tolist() == ['东', '北']
+
+
+def test_cast_to_int_refuses_fractions():
+    """目标为整数而列中有小数时抛出异常，不会舍入"""
+    with pytest.raises(ValueError):
+        _cast(pd.Series([1.0, 2.5]), 'Int64')
+    assert _cast(pd.Series([1.0, np.nan]), 'Int64').tolist() == [1, pd.NA]
+
+
+def test_cast_text_numbers():
+    """object/文本列中的数字转换为数值，只有空白的单元格视为空值"""
+    result = _cast(pd.Series(['1', ' ', None], dtype=object), 'Int64')
+    assert str(result.dtype) == 'Int64'
+    assert result.isna().tolist() == [False, True, True]
+    assert _cast(pd.Series(['1.5', '2'], dtype='string'), 'float64').tolist() == [1.5, 2.0]
+
+
+def test_cast_to_category_refuses_unknown_values():
+    """转换为分类时有不在类别中的值会抛出异常，不会变成空值"""
+    with pytest.raises(ValueError):
+        _cast(pd.Series(['北', '西']), pd.CategoricalDtype(['北', '南']))
+
+
+def test_apply_schema_keeps_column_when_cast_fails():
+    """无法无损转换的列保持原样"""
+    df = pd.DataFrame({'编号': [1.5, 2.0]})
+    result = apply_schema(df, {'编号': 'int64'})
+    assert result['编号'].tolist() == [1.5, 2.0]
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文件列表模型
+为文件表格提供数据的 QAbstractTableModel：按路径 O(1) 定位行，增量维护总行数，
+行数更新先记录下来，由定时器合并成一次刷新，大量文件同时读取完成时界面也不会卡顿
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt, QTimer, Signal
+
+# 合并刷新的间隔（毫秒）
+FILE_LIST_REFRESH_MS = 100
+
+# 行数的特殊值
+ROWS_UNKNOWN = 0
+ROWS_FAILED = -1
+
+
+class FileListModel(QAbstractTableModel):
+    """
+    文件列表模型（两列：文件名、行数）
+    
+    路径到行号的映射和总行数都在修改时同步维护，查询是 O(1) 的；
+    set_rows 只记录变化的行，定时器到期后对变化范围发送一次 dataChanged，
+    并通过 totals_changed 通知界面更新文件数和总行数
+    """
+    totals_changed = Signal(int, int)  # 文件数, 总行数
+    
+    HEADERS = ["文件名", "行数"]
+    
+    def __init__(self, parent=None, refresh_interval: int = FILE_LIST_REFRESH_MS):
+        super().__init__(parent)
+        self._paths: List[str] = []
+        self._index: Dict[str, int] = {}  # file_path -> 行号
+        self._rows: List[int] = []
+        self._estimated: List[bool] = []
+        self._total_rows = 0  # 所有成功读取的文件的行数之和
+        self._dirty_first: Optional[int] = None
+        self._dirty_last: Optional[int] = None
+        self._totals_dirty = False
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(refresh_interval)
+        self._refresh_timer.timeout.connect(self.flush)
+    
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._paths)
+    
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+    
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return self._paths[row]
+            return self.format_rows(self._rows[row], self._estimated[row])
+        if role == Qt.ItemDataRole.TextAlignmentRole and column == 1:
+            return int(Qt.AlignmentFlag.AlignCenter)
+        if role == Qt.ItemDataRole.ToolTipRole:
+            if column == 0:
+                return self._paths[row]
+            if self._estimated[row] and self._rows[row] > 0:
+                return "估计行数（未完整读取文件），开始处理后显示实际行数"
+        return None
+    
+    @staticmethod
+    def format_rows(rows: int, estimated: bool = False) -> str:
+        """格式化行数显示（探测得到的估计行数前加"≈"）"""
+        if rows == ROWS_FAILED:
+            return "失败"
+        elif rows == ROWS_UNKNOWN:
+            return "-"
+        elif estimated:
+            return f"≈{rows}"
+        else:
+            return str(rows)
+    
+    def __contains__(self, file_path: str) -> bool:
+        return file_path in self._index
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._paths))
+    
+    def __len__(self) -> int:
+        return len(self._paths)
+    
+    @property
+    def total_rows(self) -> int:
+        """所有成功读取的文件的行数之和"""
+        return self._total_rows
+    
+    def paths(self) -> List[str]:
+        """按显示顺序返回所有文件路径"""
+        return list(self._paths)
+    
+    def path_at(self, row: int) -> str:
+        """返回指定行的文件路径"""
+        return self._paths[row]
+    
+    def add_files(self, file_paths: Iterable[str]) -> List[str]:
+        """
+        批量添加文件（已在列表中的文件跳过），一次性插入所有行
+        
+        Returns:
+            实际添加的文件路径列表
+        """
+        new_paths = []
+        seen = set()
+        for file_path in file_paths:
+            if file_path not in self._index and file_path not in seen:
+                seen.add(file_path)
+                new_paths.append(file_path)
+        if not new_paths:
+            return []
+        
+        first = len(self._paths)
+        self.beginInsertRows(QModelIndex(), first, first + len(new_paths) - 1)
+        for offset, file_path in enumerate(new_paths):
+            self._index[file_path] = first + offset
+        self._paths.extend(new_paths)
+        self._rows.extend([ROWS_UNKNOWN] * len(new_paths))
+        self._estimated.extend([False] * len(new_paths))
+        self.endInsertRows()
+        self._schedule()
+        return new_paths
+    
+    def set_rows(self, file_path: str, rows: int, estimated: bool = False) -> bool:
+        """
+        更新文件行数，界面在下一次合并刷新时更新
+        
+        Args:
+            file_path: 文件路径
+            rows: 行数（0 表示未知，-1 表示读取失败）
+            estimated: 是否为探测得到的估计值
+        
+        Returns:
+            文件是否在列表中
+        """
+        row = self._index.get(file_path)
+        if row is None:
+            return False
+        old_rows = self._rows[row]
+        self._total_rows += max(rows, 0) - max(old_rows, 0)
+        self._rows[row] = rows
+        self._estimated[row] = estimated and rows > 0
+        self._dirty_first = row if self._dirty_first is None else min(self._dirty_first, row)
+        self._dirty_last = row if self._dirty_last is None else max(self._dirty_last, row)
+        self._schedule()
+        return True
+    
+    def remove_files(self, file_paths: Iterable[str]) -> List[str]:
+        """
+        删除文件，相邻的行合并成一次删除
+        
+        Returns:
+            实际删除的文件路径列表
+        """
+        rows = sorted({self._index[path] for path in file_paths if path in self._index})
+        if not rows:
+            return []
+        # 提交还没刷新的更新，删除后行号会改变
+        self.flush()
+        removed = [self._paths[row] for row in rows]
+        
+        # 从后往前按连续区间删除，前面的行号不受影响
+        end = len(rows) - 1
+        while end >= 0:
+            start = end
+            while start > 0 and rows[start - 1] == rows[start] - 1:
+                start -= 1
+            first, last = rows[start], rows[end]
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for row in range(first, last + 1):
+                self._total_rows -= max(self._rows[row], 0)
+                del self._index[self._paths[row]]
+            del self._paths[first:last + 1]
+            del self._rows[first:last + 1]
+            del self._estimated[first:last + 1]
+            self.endRemoveRows()
+            end = start - 1
+        
+        # 只需要重新编号第一个删除位置之后的行
+        for row in range(rows[0], len(self._paths)):
+            self._index[self._paths[row]] = row
+        self._schedule()
+        return removed
+    
+    def _schedule(self):
+        """记录待刷新的内容，定时器未启动时启动（已启动时不重置，保证刷新间隔的上限）"""
+        self._totals_dirty = True
+        if not self._refresh_timer.isActive():
+            self._refresh_timer.start()
+    
+    def flush(self):
+        """立即发送所有待刷新的变化"""
+        self._refresh_timer.stop()
+        if self._dirty_first is not None:
+            first, last = self._dirty_first, self._dirty_last
+            self._dirty_first = self._dirty_last = None
+            self.dataChanged.emit(
+                self.index(first, 1), self.index(last, 1),
+                [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole]
+            )
+        if self._totals_dirty:
+            self._totals_dirty = False
+            self.totals_changed.emit(len(self._paths), self._total_rows)
@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文件读取调度器
+使用固定大小的线程池探测/读取文件，待处理文件按文件大小排队（小文件优先）
+"""
+
+import os
+import time
+import heapq
+import itertools
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from PySide6.QtCore import Qt, QThread, QTimer, Signal, QObject
+
+from core.file_reader import read_file_sheets, probe_file
+from core.compaction import compact_sheets
+from core.parallel_reader import ProcessFileReader
+from core.parse_cache import ParseCache
+from core.frame_cache import FrameCache
+
+
+# 吞吐量统计的时间窗口（秒）
+THROUGHPUT_WINDOW = 5.0
+
+
+def default_worker_count() -> int:
+    """默认并发数：CPU核心数"""
+    return os.cpu_count() or 4
+
+
+class FileReaderWorker(QObject):
+    """文件读取工作线程"""
+    finished = Signal(str, object, bool)  # file_path, sheets_data, failed
+    probed = Signal(str, object, bool)  # file_path, probe_info, failed
+    
+    def __init__(self, file_path: str, process_reader: Optional[ProcessFileReader] = None,
+                 probe_only: bool = False, parse_cache: Optional[ParseCache] = None,
+                 columns: Optional[List] = None, compact: bool = False,
+                 frame_cache: Optional[FrameCache] = None):
+        super().__init__()
+        self.file_path = file_path
+        self.process_reader = process_reader
+        self.probe_only = probe_only
+        self.parse_cache = parse_cache
+        self.columns = columns  # 列投影，为 None 时读取所有列
+        self.compact = compact  # 读取后压缩列类型
+        self.frame_cache = frame_cache  # 读取完成后放入的内存缓存
+    
+    def read(self):
+        """读取文件"""
+        if self.probe_only:
+            self._probe()
+            return
+        print(f"[Worker] 开始读取文件: {self.file_path}")
+        try:
+            # 未修改的文件直接从解析缓存加载
+            if self.parse_cache is not None:
+                sheets_data = self.parse_cache.get(self.file_path, self.columns)
+                if sheets_data:
+                    print(f"[Worker] 从解析缓存加载: {self.file_path}")
+                    self.finished.emit(self.file_path, self._store(self._compact(sheets_data)), False)
+                    return
+            
+            if self.process_reader is not None:
+                # 在子进程中解析，本线程只等待结果
+                sheets_data, _ = self.process_reader.read(self.file_path, self.columns)
+            else:
+                sheets_data = read_file_sheets(self.file_path, columns=self.columns)
+            if sheets_data and self.parse_cache is not None:
+                self.parse_cache.put(self.file_path, sheets_data, self.columns)
+            print(f"[Worker] 文件读取完成: {self.file_path}, sheets数量: {len(sheets_data)}")
+            if sheets_data:
+                sheets_data = self._store(self._compact(sheets_data))
+                print(f"[Worker] 发送成功信号: {self.file_path}")
+                self.finished.emit(self.file_path, sheets_data, False)
+            else:
+                print(f"[Worker] 发送失败信号（无数据）: {self.file_path}")
+                self.finished.emit(self.file_path, {}, True)
+        except Exception as e:
+            print(f"[Worker] 读取文件 {self.file_path} 时出错: {e}")
+            import traceback
+            traceback.print_exc()
+            print(f"[Worker] 发送失败信号（异常）: {self.file_path}")
+            self.finished.emit(self.file_path, {}, True)
+    
+    def _compact(self, sheets_data: Dict) -> Dict:
+        """按需压缩列类型（解析缓存中保存的是压缩前的数据）"""
+        if not self.compact:
+            return sheets_data
+        sheets_data, before, after = compact_sheets(sheets_data)
+        print(f"[Worker] 压缩数据类型: {self.file_path}, "
+              f"{before / (1024 * 1024):.1f} MB -> {after / (1024 * 1024):.1f} MB")
+        return sheets_data
+    
+    def _store(self, sheets_data: Dict) -> Dict:
+        """
+        放入内存缓存
+        
+        统计内存占用（memory_usage(deep=True)）和超出上限时的溢出写入都在读取线程中完成，不阻塞界面
+        """
+        if self.frame_cache is not None:
+            self.frame_cache.put(self.file_path, sheets_data)
+        return sheets_data
+    
+    def _probe(self):
+        """只探测sheet名称、表头和行数"""
+        try:
+            probe = probe_file(self.file_path)
+        except Exception as e:
+            print(f"[Worker] 探测文件 {self.file_path} 时出错: {e}")
+            probe = {}
+        self.probed.emit(self.file_path, probe, not probe)
+
+
+class FrameCacheWorker(QObject):
+    """在后台线程中调整内存缓存的上限（减小上限时需要把数据溢出到磁盘）"""
+    changed = Signal()  # 内存和磁盘占用已变化
+    
+    def __init__(self, frame_cache: FrameCache):
+        super().__init__()
+        self.frame_cache = frame_cache
+    
+    def set_max_bytes(self, max_bytes: int):
+        self.frame_cache.set_max_bytes(max_bytes)
+        self.changed.emit()
+
+
+class FileReadScheduler(QObject):
+    """
+    文件读取调度器
+    
+    同时运行的读取线程数不超过 max_workers，其余文件进入优先队列等待，
+    文件越小越先读取（大小相同时按提交顺序），这样行数能尽快显示出来。
+    添加文件时只做探测（probe_only），完整读取推迟到合并时
+    """
+    finished = Signal(str, object, bool)  # file_path, sheets_data, failed
+    probed = Signal(str, object, bool)  # file_path, probe_info, failed
+    stats_changed = Signal(int, int, float)  # 等待数, 读取中数, 吞吐量(文件/秒)
+    cache_changed = Signal()  # 调整内存上限后内存缓存的占用已变化
+    memory_limit_requested = Signal(int)  # 发送给后台的 FrameCacheWorker
+    
+    def __init__(self, max_workers: Optional[int] = None, parent=None):
+        super().__init__(parent)
+        self.max_workers = max(1, max_workers or default_worker_count())
+        self._pending: List[Tuple[int, int, str, bool]] = []  # (文件大小, 提交序号, 文件路径, 是否只探测)
+        self._pending_columns: Dict[str, Optional[List]] = {}  # 文件路径 -> 列投影
+        self._pending_seq: Dict[str, int] = {}  # 文件路径 -> 有效的提交序号
+        self._counter = itertools.count()
+        self._threads: Dict[str, QThread] = {}
+        self._workers: Dict[str, FileReaderWorker] = {}  # 保存worker对象，避免被垃圾回收
+        self._completed_times: deque = deque()
+        self._process_reader: Optional[ProcessFileReader] = None
+        self.parse_cache: Optional[ParseCache] = None  # 为 None 时不使用解析缓存
+        self.compact_dtypes = False  # 完整读取后是否压缩列类型
+        self.frame_cache: Optional[FrameCache] = None  # 完整读取的数据在读取线程中放入此缓存
+        self._cache_thread: Optional[QThread] = None
+        self._cache_worker: Optional[FrameCacheWorker] = None
+        # 读取期间定时刷新统计信息（吞吐量会随时间窗口变化）
+        self._stats_timer = QTimer(self)
+        self._stats_timer.setInterval(1000)
+        self._stats_timer.timeout.connect(self._emit_stats)
+    
+    @property
+    def pending_count(self) -> int:
+        """等待读取的文件数"""
+        return len(self._pending_seq)
+    
+    @property
+    def running_count(self) -> int:
+        """正在读取的文件数"""
+        return len(self._threads)
+    
+    def throughput(self) -> float:
+        """最近 THROUGHPUT_WINDOW 秒内的读取速度（文件/秒）"""
+        now = time.monotonic()
+        while self._completed_times and now - self._completed_times[0] > THROUGHPUT_WINDOW:
+            self._completed_times.popleft()
+        return len(self._completed_times) / THROUGHPUT_WINDOW
+    
+    def set_max_workers(self, max_workers: int):
+        """调整并发数，增大时立即启动更多等待中的文件"""
+        self.max_workers = max(1, max_workers)
+        self._dispatch()
+    
+    @property
+    def use_processes(self) -> bool:
+        """是否使用多进程解析"""
+        return self._process_reader is not None
+    
+    def set_use_processes(self, enabled: bool):
+        """
+        切换解析后端：多进程（绕开GIL）或线程
+        
+        已在读取中的文件不受影响，新启动的读取使用新的后端
+        """
+        if enabled and self._process_reader is None:
+            self._process_reader = ProcessFileReader()
+        elif not enabled and self._process_reader is not None:
+            self._process_reader.shutdown(cancel_pending=False)
+            self._process_reader = None
+    
+    def set_memory_limit(self, max_bytes: int):
+        """调整内存缓存的上限，超出的数据在后台线程中溢出到磁盘，完成后发送 cache_changed"""
+        if self.frame_cache is None:
+            return
+        if self._cache_thread is None:
+            self._cache_thread = QThread()
+            self._cache_worker = FrameCacheWorker(self.frame_cache)
+            self._cache_worker.moveToThread(self._cache_thread)
+            self.memory_limit_requested.connect(
+                self._cache_worker.set_max_bytes, type=Qt.ConnectionType.QueuedConnection
+            )
+            self._cache_worker.changed.connect(
+                self.cache_changed, type=Qt.ConnectionType.QueuedConnection
+            )
+            self._cache_thread.start()
+        self.memory_limit_requested.emit(max_bytes)
+    
+    def submit(self, file_path: str, probe_only: bool = False, columns: Optional[List] = None):
+        """
+        提交文件到读取队列
+        
+        Args:
+            file_path: 文件路径
+            probe_only: 只探测表头和行数（完成后发送 probed 信号），否则完整读取（发送 finished 信号）
+            columns: 完整读取时的列投影，只读取这些列，为 None 时读取所有列
+        """
+        if file_path in self._pending_seq or file_path in self._threads:
+            return
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            size = 0
+        seq = next(self._counter)
+        heapq.heappush(self._pending, (size, seq, file_path, probe_only))
+        self._pending_seq[file_path] = seq
+        self._pending_columns[file_path] = columns
+        self._dispatch()
+    
+    def cancel(self, file_path: str):
+        """取消文件读取：从队列中移除，或停止正在读取的线程"""
+        # 队列中的条目延迟删除，出队时跳过
+        self._pending_seq.pop(file_path, None)
+        self._pending_columns.pop(file_path, None)
+        
+        thread = self._threads.pop(file_path, None)
+        self._workers.pop(file_path, None)
+        if thread is not None:
+            thread.quit()  # 请求线程退出
+            thread.wait(3000)  # 等待最多3秒，确保线程完全退出
+            # 如果线程还在运行，强制终止（不推荐，但作为最后手段）
+            if thread.isRunning():
+                print(f"警告: 线程仍在运行，强制终止: {file_path}")
+                thread.terminate()
+                thread.wait(1000)
+        self._dispatch()
+    
+    def shutdown(self):
+        """清空队列并停止所有读取线程"""
+        self._stats_timer.stop()
+        self._pending.clear()
+        self._pending_seq.clear()
+        self._pending_columns.clear()
+        for file_path, thread in list(self._threads.items()):
+            thread.quit()  # 请求线程退出
+            thread.wait(3000)  # 等待最多3秒
+            # 如果线程还在运行，强制终止
+            if thread.isRunning():
+                print(f"警告: 关闭窗口时线程仍在运行，强制终止: {file_path}")
+                thread.terminate()
+                thread.wait(1000)
+        # 清理所有引用
+        self._threads.clear()
+        self._workers.clear()
+        if self._process_reader is not None:
+            self._process_reader.shutdown()
+            self._process_reader = None
+        if self._cache_thread is not None:
+            self._cache_thread.quit()
+            self._cache_thread.wait()
+            self._cache_thread = None
+            self._cache_worker = None
+    
+    def _dispatch(self):
+        """在并发数允许的范围内启动等待中的文件"""
+        while self._pending and len(self._threads) < self.max_workers:
+            _, seq, file_path, probe_only = heapq.heappop(self._pending)
+            if self._pending_seq.get(file_path) != seq:
+                continue  # 已取消
+            del self._pending_seq[file_path]
+            self._start_thread(file_path, probe_only, self._pending_columns.pop(file_path, None))
+        self._emit_stats()
+    
+    def _start_thread(self, file_path: str, probe_only: bool, columns: Optional[List] = None):
+        """创建线程读取单个文件"""
+        thread = QThread()
+        worker = FileReaderWorker(file_path, self._process_reader, probe_only, self.parse_cache,
+                                  columns, self.compact_dtypes, self.frame_cache)
+        worker.moveToThread(thread)
+        
+        # 连接信号 - 确保使用队列连接（跨线程通信）
+        thread.started.connect(worker.read)
+        worker.finished.connect(
+            self._on_worker_finished,
+            type=Qt.ConnectionType.QueuedConnection
+        )
+        worker.probed.connect(
+            self._on_worker_probed,
+            type=Qt.ConnectionType.QueuedConnection
+        )
+        worker.finished.connect(thread.quit, type=Qt.ConnectionType.QueuedConnection)
+        worker.probed.connect(thread.quit, type=Qt.ConnectionType.QueuedConnection)
+        # 线程完全退出后再清理引用和删除线程对象
+        # 连接到本对象的方法（而不是 partial），保证回调在主线程中执行
+        thread.finished.connect(self._on_thread_finished)
+        thread.finished.connect(thread.deleteLater)
+        
+        # 保存引用，避免被垃圾回收
+        self._threads[file_path] = thread
+        self._workers[file_path] = worker
+        
+        thread.start()
+        print(f"启动线程读取文件: {file_path}")
+    
+    def _on_worker_finished(self, file_path: str, sheets_data: object, failed: bool):
+        """worker读取完成，转发结果"""
+        self._completed_times.append(time.monotonic())
+        self.finished.emit(file_path, sheets_data, failed)
+    
+    def _on_worker_probed(self, file_path: str, probe: object, failed: bool):
+        """worker探测完成，转发结果"""
+        self._completed_times.append(time.monotonic())
+        self.probed.emit(file_path, probe, failed)
+    
+    def _on_thread_finished(self):
+        """线程完全退出后清理引用并启动下一个文件"""
+        thread = self.sender()
+        # 已取消的文件不在字典中；文件可能已被取消后重新提交，只清理属于本线程的引用
+        for file_path, running_thread in list(self._threads.items()):
+            if running_thread is thread:
+                del self._threads[file_path]
+                self._workers.pop(file_path, None)
+                print(f"已清理线程引用: {file_path}")
+                break
+        self._dispatch()
+    
+    def _emit_stats(self):
+        """发送队列统计信息，空闲且吞吐量归零后停止定时刷新"""
+        throughput = self.throughput()
+        busy = self.pending_count > 0 or self.running_count > 0
+        if busy and not self._stats_timer.isActive():
+            self._stats_timer.start()
+        elif not busy and throughput == 0:
+            self._stats_timer.stop()
+        self.stats_changed.emit(self.pending_count, self.running_count, throughput)
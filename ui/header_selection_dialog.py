@@ -5,27 +5,40 @@
 """
 
 from PySide6.QtWidgets import (
-    QDialog, QVBoxLayout, QLabel, QPushButton, QScrollArea, QWidget,
-    QFrame, QMessageBox
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTreeWidget,
+    QTreeWidgetItem, QHeaderView
 )
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QFont
 from typing import Optional, List, Dict
 
+from core.file_reader import group_headers
+
+
+# 分组条目中保存分组序号的数据角色
+GROUP_ROLE = Qt.ItemDataRole.UserRole
+
 
 class HeaderSelectionDialog(QDialog):
-    """表头选择对话框"""
+    """
+    表头选择对话框
+    
+    列名及顺序相同的表合并为一个分组，每个分组一行，显示表数、文件数和总行数；
+    分组下的各个表在展开时才创建，表很多时也能很快打开
+    """
     
-    def __init__(self, headers_info: List[Dict], parent=None):
+    def __init__(self, header_groups: List[Dict], parent=None):
         """
         初始化对话框
         
         Args:
-            headers_info: 表头信息列表
+            header_groups: group_headers 的分组列表（也可以传入 get_all_headers 的表头信息列表）
             parent: 父窗口
         """
         super().__init__(parent)
-        self.headers_info = headers_info
+        if header_groups and 'sheets' not in header_groups[0]:
+            header_groups = group_headers(header_groups)
+        self.header_groups = header_groups
         self.selected_headers: Optional[List[str]] = None
         
         self.setWindowTitle("选择表头")
@@ -45,55 +58,84 @@ class HeaderSelectionDialog(QDialog):
         title_label.setFont(title_font)
         layout.addWidget(title_label)
         
-        # 滚动区域
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
-        scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        sheet_count = sum(group['sheet_count'] for group in self.header_groups)
+        summary_label = QLabel(
+            f"共 {sheet_count} 个表/Sheet，{len(self.header_groups)} 种不同的表头（展开分组可查看包含的表）"
+        )
+        summary_label.setStyleSheet("color: gray;")
+        layout.addWidget(summary_label)
         
-        scroll_widget = QWidget()
-        scroll_layout = QVBoxLayout(scroll_widget)
-        scroll_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
+        # 分组列表：只绘制可见的行，子条目在展开时创建
+        self.group_tree = QTreeWidget()
+        self.group_tree.setColumnCount(4)
+        self.group_tree.setHeaderLabels(["列名 / 文件 - Sheet", "表数", "文件数", "行数"])
+        self.group_tree.setUniformRowHeights(True)
+        self.group_tree.setWordWrap(False)
+        self.group_tree.header().setStretchLastSection(False)
+        self.group_tree.header().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        # 按内容调整列宽需要测量所有条目，数字列使用固定宽度
+        for column, width in ((1, 60), (2, 60), (3, 100)):
+            self.group_tree.header().setSectionResizeMode(column, QHeaderView.ResizeMode.Interactive)
+            self.group_tree.setColumnWidth(column, width)
         
-        # 为每个文件创建选择按钮
-        for idx, info in enumerate(self.headers_info):
-            frame = QFrame()
-            frame.setFrameStyle(QFrame.Shape.Box | QFrame.Shadow.Raised)
-            frame.setLineWidth(2)
-            
-            frame_layout = QVBoxLayout(frame)
-            
-            # 文件信息
-            file_label = QLabel(f"文件: {info['file']}")
-            file_font = QFont()
-            file_font.setBold(True)
-            file_font.setPointSize(10)
-            file_label.setFont(file_font)
-            frame_layout.addWidget(file_label)
-            
-            sheet_label = QLabel(f"Sheet: {info['sheet']}")
-            sheet_label.setFont(QFont("Arial", 9))
-            frame_layout.addWidget(sheet_label)
-            
-            headers_text = ", ".join(info['headers'])
-            headers_label = QLabel(f"列名: {headers_text}")
-            headers_label.setFont(QFont("Arial", 9))
-            headers_label.setWordWrap(True)
-            frame_layout.addWidget(headers_label)
-            
-            # 选择按钮
-            btn = QPushButton("选择此表头")
-            btn.clicked.connect(lambda checked, i=idx: self._on_select(i))
-            frame_layout.addWidget(btn)
-            
-            scroll_layout.addWidget(frame)
+        for idx, group in enumerate(self.header_groups):
+            headers_text = ", ".join(map(str, group['headers']))
+            item = QTreeWidgetItem([
+                f"[{len(group['headers'])} 列] {headers_text}",
+                str(group['sheet_count']),
+                str(group['file_count']),
+                str(group['rows']),
+            ])
+            item.setData(0, GROUP_ROLE, idx)
+            item.setToolTip(0, f"列名: {headers_text}")
+            for column in (1, 2, 3):
+                item.setTextAlignment(column, Qt.AlignmentFlag.AlignCenter)
+            item.setChildIndicatorPolicy(QTreeWidgetItem.ChildIndicatorPolicy.ShowIndicator)
+            self.group_tree.addTopLevelItem(item)
         
-        scroll_area.setWidget(scroll_widget)
-        layout.addWidget(scroll_area)
+        self.group_tree.itemExpanded.connect(self._populate_group)
+        self.group_tree.itemDoubleClicked.connect(lambda item, column: self._on_select())
+        self.group_tree.currentItemChanged.connect(
+            lambda current, previous: self.btn_select.setEnabled(current is not None)
+        )
+        layout.addWidget(self.group_tree)
+        
+        # 选择按钮
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        self.btn_select = QPushButton("选择此表头")
+        self.btn_select.setEnabled(False)
+        self.btn_select.clicked.connect(self._on_select)
+        button_layout.addWidget(self.btn_select)
+        layout.addLayout(button_layout)
+        
+        # 默认选中包含表最多的分组
+        if self.header_groups:
+            largest = max(range(len(self.header_groups)),
+                          key=lambda i: self.header_groups[i]['sheet_count'])
+            self.group_tree.setCurrentItem(self.group_tree.topLevelItem(largest))
     
-    def _on_select(self, index: int):
-        """选择表头"""
-        self.selected_headers = self.headers_info[index]['headers']
+    def _populate_group(self, item: QTreeWidgetItem):
+        """第一次展开分组时创建其中各个表的条目"""
+        if item.parent() is not None or item.childCount() > 0:
+            return
+        group = self.header_groups[item.data(0, GROUP_ROLE)]
+        children = []
+        for info in group['sheets']:
+            child = QTreeWidgetItem([f"{info['file']} - {info['sheet']}", "", "", str(info['rows'])])
+            child.setToolTip(0, info.get('file_path', info['file']))
+            child.setTextAlignment(3, Qt.AlignmentFlag.AlignCenter)
+            children.append(child)
+        item.addChildren(children)
+    
+    def _on_select(self):
+        """选择当前条目所在分组的表头"""
+        item = self.group_tree.currentItem()
+        if item is None:
+            return
+        if item.parent() is not None:
+            item = item.parent()
+        self.selected_headers = self.header_groups[item.data(0, GROUP_ROLE)]['headers']
         self.accept()
     
     def get_selected_headers(self) -> Optional[List[str]]:
@@ -105,4 +147,3 @@ class HeaderSelectionDialog(QDialog):
         if self.selected_headers is None:
             self.reject()
         event.accept()
-
@@ -6,50 +6,45 @@
 
 from PySide6.QtWidgets import (
     QDialog, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
-    QTableWidget, QTableWidgetItem, QFileDialog, QMessageBox, QHeaderView,
-    QAbstractItemView
+    QTableView, QFileDialog, QMessageBox, QHeaderView,
+    QAbstractItemView, QSpinBox, QCheckBox, QProgressDialog
 )
-from PySide6.QtCore import Qt, QThread, Signal, QObject
+from PySide6.QtCore import Qt, QThread
 from PySide6.QtGui import QFont, QIcon
 from pathlib import Path
 from typing import Dict, List, Optional
-from functools import partial
+import numpy as np
 import pandas as pd
 
-from core.constants import SUPPORTED_EXTENSIONS, DEFAULT_OUTPUT_FILENAME
-from core.file_reader import read_file_sheets, get_all_headers, check_headers_consistency
-from core.data_merger import merge_data, save_result
+from core.constants import (
+    SUPPORTED_EXTENSIONS, DEFAULT_OUTPUT_FILENAME, FRAME_CACHE_MAX_BYTES, EXCEL_MAX_DATA_ROWS,
+    APPEND_FORMATS
+)
+from core.file_reader import get_all_headers, check_headers_consistency, group_headers, get_file_metadata
 from core.resource_utils import get_resource_path
+from core.parse_cache import ParseCache
+from core.frame_cache import FrameCache, FrameCacheView
+from core.data_merger import available_output_formats, output_format
+from core.excel_writer import manifest_path
+from core.schema import format_conflicts
+from core.pipeline import format_pipeline_stats
 from ui.header_selection_dialog import HeaderSelectionDialog
+from ui.file_read_scheduler import FileReadScheduler, default_worker_count
+from ui.merge_worker import MergeWorker
+from ui.watch_worker import WatchWorker
+from ui.file_list_model import FileListModel, ROWS_FAILED
 import os
+import json
 
 
-class FileReaderWorker(QObject):
-    """文件读取工作线程"""
-    finished = Signal(str, object, bool)  # file_path, sheets_data, failed
-    
-    def __init__(self, file_path: str):
-        super().__init__()
-        self.file_path = file_path
-    
-    def read(self):
-        """读取文件"""
-        print(f"[Worker] 开始读取文件: {self.file_path}")
-        try:
-            sheets_data = read_file_sheets(self.file_path)
-            print(f"[Worker] 文件读取完成: {self.file_path}, sheets数量: {len(sheets_data)}")
-            if sheets_data:
-                print(f"[Worker] 发送成功信号: {self.file_path}")
-                self.finished.emit(self.file_path, sheets_data, False)
-            else:
-                print(f"[Worker] 发送失败信号（无数据）: {self.file_path}")
-                self.finished.emit(self.file_path, {}, True)
-        except Exception as e:
-            print(f"[Worker] 读取文件 {self.file_path} 时出错: {e}")
-            import traceback
-            traceback.print_exc()
-            print(f"[Worker] 发送失败信号（异常）: {self.file_path}")
-            self.finished.emit(self.file_path, {}, True)
+# 保存对话框的文件类型: (格式, 说明, 扩展名列表)，第一个扩展名用于补全没有扩展名的文件名
+SAVE_FILE_TYPES = [
+    ('xlsx', "Excel文件", ['.xlsx']),
+    ('csv', "CSV文件", ['.csv']),
+    ('parquet', "Parquet文件", ['.parquet']),
+    ('feather', "Feather/Arrow文件", ['.feather', '.arrow']),
+    ('sqlite', "SQLite数据库", ['.sqlite', '.db']),
+]
 
 
 class MainWindow(QDialog):
@@ -57,11 +52,40 @@ class MainWindow(QDialog):
     
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.all_files: List[str] = []
+        # 文件列表：路径到行号的映射和总行数由模型维护，行数更新合并后定时刷新
+        self.file_model = FileListModel(self)
+        self.file_model.totals_changed.connect(self._update_totals)
         self.files_data_cache: Dict[str, Dict] = {}
-        self.reading_files: set = set()
-        self.reader_threads: Dict[str, QThread] = {}
-        self.reader_workers: Dict[str, FileReaderWorker] = {}  # 保存worker对象，避免被垃圾回收
+        # 完整读取的数据有内存上限，超出后最久未使用的文件溢出到磁盘，合并时再加载
+        self.frame_cache = FrameCache(FRAME_CACHE_MAX_BYTES)
+        self.reading_files: set = set()  # 正在探测表头和行数的文件
+        self.loading_files: set = set()  # 合并前正在完整读取的文件
+        self.pending_target_headers: Optional[List[str]] = None  # 等待完整读取结束后使用的目标表头
+        self.xlsx_shard_mode = 'files'  # xlsx结果超过行数上限时的拆分方式
+        
+        # 后台合并：工作线程、进度对话框，以及两个阶段之间保留的状态（目标表头、是否去重、保存路径）
+        self.merge_thread: Optional[QThread] = None
+        self.merge_worker: Optional[MergeWorker] = None
+        self.progress_dialog: Optional[QProgressDialog] = None
+        self.merge_state: Optional[Dict] = None
+        
+        # 监视文件夹：新文件写完后在后台增量追加到合并结果
+        self.watch_thread: Optional[QThread] = None
+        self.watch_worker: Optional[WatchWorker] = None
+        
+        # 文件读取调度器：固定大小的线程池，小文件优先
+        self.read_scheduler = FileReadScheduler(default_worker_count(), self)
+        self.read_scheduler.probed.connect(self._on_file_probed)
+        self.read_scheduler.finished.connect(self._on_file_read_finished)
+        self.read_scheduler.stats_changed.connect(self._update_queue_label)
+        # 读取完成的数据在读取线程中放入内存缓存（统计占用和溢出不阻塞界面）
+        self.read_scheduler.frame_cache = self.frame_cache
+        self.read_scheduler.cache_changed.connect(self._update_memory_label)
+        
+        # 解析结果磁盘缓存（需要pyarrow），未修改的文件直接从缓存加载
+        self.parse_cache = ParseCache()
+        if self.parse_cache.available:
+            self.read_scheduler.parse_cache = self.parse_cache
         
         self.setWindowTitle("Excel/CSV文件合并工具")
         self.setGeometry(100, 100, 700, 500)
@@ -96,15 +120,20 @@ class MainWindow(QDialog):
         info_label.setFont(QFont("Arial", 8))
         layout.addWidget(info_label)
         
-        # 文件列表表格
-        self.file_table = QTableWidget()
-        self.file_table.setColumnCount(2)
-        self.file_table.setHorizontalHeaderLabels(["文件名", "行数"])
+        # 文件列表表格（只绘制可见的行）
+        self.file_table = QTableView()
+        self.file_table.setModel(self.file_model)
+        self.file_table.verticalHeader().setDefaultSectionSize(
+            self.file_table.fontMetrics().height() + 6
+        )
+        self.file_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
         self.file_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.file_table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
         self.file_table.horizontalHeader().setStretchLastSection(False)
         self.file_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
-        self.file_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
+        # 按内容调整列宽需要遍历所有行，行数列改为交互式的固定宽度
+        self.file_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Interactive)
+        self.file_table.setColumnWidth(1, 100)
         self.file_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         layout.addWidget(self.file_table)
         
@@ -121,8 +150,64 @@ class MainWindow(QDialog):
         self.total_rows_label.setStyleSheet("color: blue;")
         info_button_layout.addWidget(self.total_rows_label)
         
+        self.queue_label = QLabel()
+        self.queue_label.setStyleSheet("color: gray;")
+        info_button_layout.addWidget(self.queue_label)
+        self._update_queue_label(0, 0, 0.0)
+        
+        self.memory_label = QLabel()
+        self.memory_label.setStyleSheet("color: gray;")
+        info_button_layout.addWidget(self.memory_label)
+        self._update_memory_label()
+        
         info_button_layout.addStretch()
         
+        info_button_layout.addWidget(QLabel("并发数:"))
+        self.worker_count_spin = QSpinBox()
+        self.worker_count_spin.setRange(1, max(64, default_worker_count()))
+        self.worker_count_spin.setValue(self.read_scheduler.max_workers)
+        self.worker_count_spin.setToolTip("同时读取的文件数")
+        self.worker_count_spin.valueChanged.connect(self.read_scheduler.set_max_workers)
+        info_button_layout.addWidget(self.worker_count_spin)
+        
+        info_button_layout.addWidget(QLabel("内存上限(MB):"))
+        self.memory_limit_spin = QSpinBox()
+        self.memory_limit_spin.setRange(64, 1024 * 1024)
+        self.memory_limit_spin.setSingleStep(256)
+        self.memory_limit_spin.setValue(FRAME_CACHE_MAX_BYTES // (1024 * 1024))
+        self.memory_limit_spin.setToolTip("已读取数据的内存上限，超出后最久未使用的文件暂存到磁盘")
+        self.memory_limit_spin.valueChanged.connect(self._set_memory_limit)
+        info_button_layout.addWidget(self.memory_limit_spin)
+        
+        self.process_checkbox = QCheckBox("多进程解析")
+        self.process_checkbox.setToolTip("在子进程中解析文件，多核CPU上读取大量xlsx更快")
+        self.process_checkbox.toggled.connect(self.read_scheduler.set_use_processes)
+        info_button_layout.addWidget(self.process_checkbox)
+        
+        self.cache_checkbox = QCheckBox("解析缓存")
+        self.cache_checkbox.setToolTip("把解析结果保存在本地缓存目录，未修改的文件直接从缓存加载")
+        self.cache_checkbox.setChecked(self.parse_cache.available)
+        self.cache_checkbox.setEnabled(self.parse_cache.available)
+        self.cache_checkbox.toggled.connect(self._toggle_parse_cache)
+        info_button_layout.addWidget(self.cache_checkbox)
+        
+        self.btn_clear_cache = QPushButton("清除缓存")
+        self.btn_clear_cache.setEnabled(self.parse_cache.available)
+        self.btn_clear_cache.clicked.connect(self._clear_parse_cache)
+        info_button_layout.addWidget(self.btn_clear_cache)
+        
+        self.compact_checkbox = QCheckBox("压缩类型")
+        self.compact_checkbox.setToolTip("读取后把重复文本转为分类、缩小数值类型，减少内存占用（对之后读取的文件生效）")
+        self.compact_checkbox.toggled.connect(self._toggle_compact_dtypes)
+        info_button_layout.addWidget(self.compact_checkbox)
+        
+        self.pipeline_checkbox = QCheckBox("流水线模式")
+        self.pipeline_checkbox.setToolTip(
+            "读取、对齐和写入同时进行，不需要先完整读取所有文件，内存占用与文件总大小无关；\n"
+            "是否去重需要在开始前选择，各文件的列类型不做统一"
+        )
+        info_button_layout.addWidget(self.pipeline_checkbox)
+        
         self.btn_delete = QPushButton("删除选中")
         self.btn_delete.setStyleSheet("background-color: #ff9800; color: white;")
         self.btn_delete.clicked.connect(self._delete_selected)
@@ -144,6 +229,15 @@ class MainWindow(QDialog):
         self.btn_select_folder.clicked.connect(self._select_folder)
         button_layout.addWidget(self.btn_select_folder)
         
+        self.btn_watch = QPushButton("监视文件夹")
+        self.btn_watch.setMinimumHeight(40)
+        self.btn_watch.setToolTip(
+            "持续监视一个文件夹，新文件写完后自动追加到合并结果（CSV、Parquet 或 xlsx），已合并的文件不会重复追加；\n"
+            "结果还不存在时以第一批文件的第一个表头为准"
+        )
+        self.btn_watch.clicked.connect(self._toggle_watch)
+        button_layout.addWidget(self.btn_watch)
+        
         self.btn_start = QPushButton("开始处理")
         self.btn_start.setMinimumHeight(40)
         self.btn_start.setStyleSheet("background-color: #4CAF50; color: white; font-weight: bold;")
@@ -157,70 +251,88 @@ class MainWindow(QDialog):
         button_layout.addWidget(self.btn_cancel)
         
         layout.addLayout(button_layout)
+        
+        # 监视状态（开始监视后显示）
+        self.watch_label = QLabel()
+        self.watch_label.setStyleSheet("color: #1976D2;")
+        self.watch_label.setWordWrap(True)
+        self.watch_label.hide()
+        layout.addWidget(self.watch_label)
     
-    def _format_rows_display(self, rows: int) -> str:
-        """格式化行数显示"""
-        if rows == -1:
-            return "失败"
-        elif rows == 0:
-            return "-"
-        else:
-            return str(rows)
+    @property
+    def all_files(self) -> List[str]:
+        """按列表顺序的所有文件路径"""
+        return self.file_model.paths()
     
-    def _add_file_to_list(self, file_path: str, rows: int = 0, failed: bool = False):
-        """添加文件到列表"""
-        if failed:
-            rows = -1
-        
-        row = self.file_table.rowCount()
-        self.file_table.insertRow(row)
-        
-        file_item = QTableWidgetItem(file_path)
-        self.file_table.setItem(row, 0, file_item)
-        
-        rows_item = QTableWidgetItem(self._format_rows_display(rows))
-        rows_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.file_table.setItem(row, 1, rows_item)
+    def _add_files_to_list(self, file_paths: List[str]) -> List[str]:
+        """批量添加文件到列表，返回实际添加的文件（已在列表中的跳过）"""
+        new_files = self.file_model.add_files(file_paths)
+        for file_path in new_files:
+            self.files_data_cache.setdefault(file_path, {'rows': 0})
+        return new_files
+    
+    def _update_file_rows(self, file_path: str, rows: int, failed: bool = False,
+                          estimated: bool = False):
+        """
+        更新文件行数（O(1)，表格和总行数在下一次合并刷新时更新）
         
-        # 存储文件信息
-        if file_path not in self.files_data_cache:
-            self.files_data_cache[file_path] = {'rows': rows}
+        estimated 为True表示行数来自探测（xlsx的dimension、CSV的换行符计数），
+        可能包含末尾的空行，完整读取后用实际行数替换
+        """
+        if failed:
+            rows = ROWS_FAILED
+            estimated = False
         
-        self._update_count_label()
-        self._update_total_rows()
+        if self.file_model.set_rows(file_path, rows, estimated) and file_path in self.files_data_cache:
+            self.files_data_cache[file_path]['rows'] = rows
+            self.files_data_cache[file_path]['rows_estimated'] = estimated
     
-    def _update_file_rows(self, file_path: str, rows: int, failed: bool = False):
-        """更新文件行数"""
-        if failed:
-            rows = -1
-        
-        # 查找对应的行
-        for row in range(self.file_table.rowCount()):
-            item = self.file_table.item(row, 0)
-            if item and item.text() == file_path:
-                rows_item = QTableWidgetItem(self._format_rows_display(rows))
-                rows_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                self.file_table.setItem(row, 1, rows_item)
-                
-                if file_path in self.files_data_cache:
-                    self.files_data_cache[file_path]['rows'] = rows
-                break
-        
-        self._update_total_rows()
-    
-    def _update_count_label(self):
-        """更新文件计数标签"""
-        count = len(self.all_files)
-        self.count_label.setText(f"已选择 {count} 个文件")
-    
-    def _update_total_rows(self):
-        """更新总行数显示"""
-        total_rows = sum(
-            info.get('rows', 0) 
-            for info in self.files_data_cache.values() 
-            if info.get('rows', 0) > 0
-        )
+    def _update_totals(self, file_count: int, total_rows: int):
+        """更新文件数、总行数和内存占用显示（由文件列表模型合并刷新时调用）"""
+        self.count_label.setText(f"已选择 {file_count} 个文件")
         self.total_rows_label.setText(f"总行数: {total_rows}")
+        self._update_memory_label()
+    
+    def _update_queue_label(self, pending: int, running: int, throughput: float):
+        """更新读取队列状态显示"""
+        self.queue_label.setText(
+            f"队列: {pending} 等待 / {running} 读取中 | {throughput:.1f} 文件/秒"
+        )
+    
+    def _update_memory_label(self):
+        """更新已读取数据的内存和磁盘占用显示"""
+        memory_mb = self.frame_cache.memory_bytes / (1024 * 1024)
+        text = f"内存: {memory_mb:.1f} MB"
+        if self.frame_cache.spilled_count:
+            spilled_mb = self.frame_cache.spilled_bytes / (1024 * 1024)
+            text += f" | 磁盘: {spilled_mb:.1f} MB ({self.frame_cache.spilled_count} 个文件)"
+        self.memory_label.setText(text)
+    
+    def _set_memory_limit(self, limit_mb: int):
+        """调整已读取数据的内存上限（溢出在后台线程中进行，完成后刷新占用显示）"""
+        self.read_scheduler.set_memory_limit(limit_mb * 1024 * 1024)
+    
+    def _toggle_parse_cache(self, enabled: bool):
+        """启用或绕过解析缓存"""
+        self.read_scheduler.parse_cache = self.parse_cache if enabled else None
+    
+    def _toggle_compact_dtypes(self, enabled: bool):
+        """启用或关闭读取后的列类型压缩"""
+        self.read_scheduler.compact_dtypes = enabled
+    
+    def _clear_parse_cache(self):
+        """清空解析缓存目录"""
+        size_mb = self.parse_cache.size_bytes() / (1024 * 1024)
+        reply = QMessageBox.question(
+            self,
+            "清除缓存",
+            f"解析缓存目录:\n{self.parse_cache.cache_dir}\n\n当前占用 {size_mb:.1f} MB，是否清除？",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            self.parse_cache.clear()
+            print(f"已清除解析缓存: {self.parse_cache.cache_dir}")
     
     def _delete_selected(self):
         """删除选中的文件"""
@@ -229,122 +341,93 @@ class MainWindow(QDialog):
             QMessageBox.information(self, "提示", "请先选择一个或多个文件")
             return
         
-        # 收集要删除的文件路径（从后往前删除，避免索引变化）
-        rows_to_delete = sorted([row.row() for row in selected_rows], reverse=True)
-        files_to_delete = []
-        
-        for row in rows_to_delete:
-            item = self.file_table.item(row, 0)
-            if item:
-                file_path = item.text()
-                if file_path in self.all_files:
-                    files_to_delete.append(file_path)
+        # 收集要删除的文件路径，从模型中一次性删除（相邻的行合并删除）
+        files_to_delete = self.file_model.remove_files(
+            [self.file_model.path_at(index.row()) for index in selected_rows]
+        )
         
         if files_to_delete:
-            # 从列表中删除
             for file_path in files_to_delete:
-                self.all_files.remove(file_path)
                 if file_path in self.files_data_cache:
                     del self.files_data_cache[file_path]
-                if file_path in self.reading_files:
+                self.frame_cache.remove(file_path)
+                if file_path in self.reading_files or file_path in self.loading_files:
                     self.reading_files.discard(file_path)
-                # 停止正在读取的线程
-                if file_path in self.reader_threads:
-                    thread = self.reader_threads[file_path]
-                    thread.quit()  # 请求线程退出
-                    thread.wait(3000)  # 等待最多3秒，确保线程完全退出
-                    # 如果线程还在运行，强制终止（不推荐，但作为最后手段）
-                    if thread.isRunning():
-                        print(f"警告: 线程仍在运行，强制终止: {file_path}")
-                        thread.terminate()
-                        thread.wait(1000)
-                    # 清理引用（线程已完全退出）
-                    if file_path in self.reader_threads:
-                        del self.reader_threads[file_path]
-                if file_path in self.reader_workers:
-                    del self.reader_workers[file_path]
-            
-            # 从表格中删除
-            for row in rows_to_delete:
-                self.file_table.removeRow(row)
+                    self.loading_files.discard(file_path)
+                    # 从读取队列中移除，或停止正在读取的线程
+                    self.read_scheduler.cancel(file_path)
             
-            self._update_count_label()
-            self._update_total_rows()
+            self._update_memory_label()
             print(f"已删除 {len(files_to_delete)} 个文件")
+            
+            # 如果正在等待完整读取，删除的文件可能是最后一个未完成的
+            self._check_merge_ready()
     
     def _read_file_async(self, file_path: str):
-        """异步读取文件"""
+        """异步探测文件的表头和行数（完整读取推迟到开始处理时）"""
         if file_path in self.reading_files:
             return
         
         self.reading_files.add(file_path)
+        self.read_scheduler.submit(file_path, probe_only=True)
+    
+    def _on_file_probed(self, file_path: str, probe: Dict[str, Dict], failed: bool):
+        """文件探测完成回调"""
+        self.reading_files.discard(file_path)
         
-        # 创建工作线程
-        thread = QThread()
-        worker = FileReaderWorker(file_path)
-        worker.moveToThread(thread)
-        
-        # 连接信号 - 确保使用队列连接（跨线程通信）
-        thread.started.connect(worker.read)
-        # 显式指定连接类型为队列连接，确保跨线程信号能正确传递
-        worker.finished.connect(
-            self._on_file_read_finished,
-            type=Qt.ConnectionType.QueuedConnection
-        )
-        worker.finished.connect(thread.quit, type=Qt.ConnectionType.QueuedConnection)
-        # 线程完全退出后再删除线程对象和清理引用
-        thread.finished.connect(thread.deleteLater)
-        thread.finished.connect(partial(self._cleanup_thread, file_path))
+        # 检查文件是否还在列表中
+        if file_path not in self.file_model:
+            print(f"文件 {file_path} 已从列表中移除，跳过处理")
+            return
         
-        # 保存引用，避免被垃圾回收
-        self.reader_threads[file_path] = thread
-        self.reader_workers[file_path] = worker
+        print(f"文件探测结束: {file_path}, 失败: {failed}")
         
-        thread.start()
-        print(f"启动线程读取文件: {file_path}")
-    
-    def _cleanup_thread(self, file_path: str):
-        """清理线程和worker引用（在线程完全退出后调用）"""
-        if file_path in self.reader_threads:
-            del self.reader_threads[file_path]
-            print(f"已清理线程引用: {file_path}")
-        if file_path in self.reader_workers:
-            del self.reader_workers[file_path]
-            print(f"已清理worker引用: {file_path}")
+        if failed or not probe:
+            self._update_file_rows(file_path, 0, failed=True)
+            self.files_data_cache[file_path] = {}
+        else:
+            # 只保存表头和行数，数据在开始处理时再读取
+            self.files_data_cache[file_path] = {'probe': probe}
+            # 记录文件元数据（CSV文件包含检测到的编码，已缓存，不会重复检测）
+            try:
+                self.files_data_cache[file_path]['metadata'] = get_file_metadata(file_path)
+            except OSError as e:
+                print(f"警告: 获取文件元数据失败 {file_path}: {e}")
+            # 计算总行数（探测得到的是估计值，完整读取后更新）
+            total_rows = sum(info['rows'] for info in probe.values())
+            self._update_file_rows(file_path, total_rows, failed=False, estimated=True)
     
     def _on_file_read_finished(self, file_path: str, sheets_data: Dict[str, pd.DataFrame], failed: bool):
-        """文件读取完成回调"""
+        """文件完整读取完成回调"""
         print(f"回调函数被触发: {file_path}, 失败: {failed}, 数据: {bool(sheets_data)}")
-        self.reading_files.discard(file_path)
-        
-        # 注意：不要在这里删除线程引用，让线程自己通过 finished 信号来清理
-        # 这样可以确保线程完全退出后再清理，避免 "Destroyed while thread is still running" 错误
+        self.loading_files.discard(file_path)
         
-        # 检查文件是否还在列表中
-        if file_path not in self.all_files:
+        # 检查文件是否还在列表中（读取线程已把数据放入缓存，需要删除）
+        if file_path not in self.file_model:
             print(f"文件 {file_path} 已从列表中移除，跳过处理")
+            self.frame_cache.remove(file_path)
             return
         
         print(f"文件读取结束: {file_path}, 失败: {failed}")
         
+        cache = self.files_data_cache.setdefault(file_path, {})
         if failed or not sheets_data:
             self._update_file_rows(file_path, 0, failed=True)
-            self.files_data_cache[file_path] = {}
+            self.frame_cache.remove(file_path)
         else:
-            # 保存数据到缓存
-            self.files_data_cache[file_path] = {'data': sheets_data}
-            # 计算总行数
+            # 数据已在读取线程中放入缓存（超出内存上限时溢出到磁盘），用实际行数更新探测结果
             total_rows = sum(len(df) for df in sheets_data.values())
             self._update_file_rows(file_path, total_rows, failed=False)
-            # 更新缓存
-            self.files_data_cache[file_path]['rows'] = total_rows
-    
-    def _add_file_with_async_read(self, file_path: str):
-        """添加文件到列表并启动异步读取"""
-        if file_path not in self.all_files:
-            self.all_files.append(file_path)
-            self._add_file_to_list(file_path, 0)  # 初始显示"-"
+        # 内存占用显示随表格一起合并刷新（_update_totals）
+        
+        self._check_merge_ready()
+    
+    def _add_files_with_async_read(self, file_paths: List[str]) -> int:
+        """批量添加文件到列表并启动异步读取，返回实际添加的文件数"""
+        new_files = self._add_files_to_list(file_paths)  # 初始显示"-"
+        for file_path in new_files:
             self._read_file_async(file_path)
+        return len(new_files)
     
     def _select_files(self):
         """选择文件"""
@@ -356,9 +439,8 @@ class MainWindow(QDialog):
         )
         
         if files:
-            for file_path in files:
-                self._add_file_with_async_read(file_path)
-            print(f"添加了 {len(files)} 个文件")
+            added = self._add_files_with_async_read(files)
+            print(f"添加了 {added} 个文件")
     
     def _select_folder(self):
         """选择文件夹"""
@@ -376,21 +458,20 @@ class MainWindow(QDialog):
             
             new_files = [str(f) for f in new_files]
             if new_files:
-                for file_path in new_files:
-                    self._add_file_with_async_read(file_path)
-                print(f"从文件夹添加了 {len(new_files)} 个文件")
+                added = self._add_files_with_async_read(new_files)
+                print(f"从文件夹添加了 {added} 个文件")
             else:
                 QMessageBox.warning(self, "警告", f"文件夹 {folder} 中没有找到支持格式的文件")
     
     def _start_process(self):
         """开始处理"""
-        if len(self.all_files) == 0:
+        if len(self.file_model) == 0:
             QMessageBox.warning(self, "警告", "请至少选择一个文件或文件夹")
             return
         
         # 检查是否有文件还在读取中
-        if self.reading_files:
-            reading_count = len(self.reading_files)
+        if self.reading_files or self.loading_files:
+            reading_count = len(self.reading_files) + len(self.loading_files)
             QMessageBox.warning(
                 self,
                 "文件读取中",
@@ -398,209 +479,585 @@ class MainWindow(QDialog):
             )
             return
         
-        # 检查是否有有效数据
-        valid_files_data = {}
+        # 检查是否有有效文件（只需要探测结果）
+        valid_files_probe = {}
         for file_path in self.all_files:
-            if file_path in self.files_data_cache:
-                cache = self.files_data_cache[file_path]
-                if 'data' in cache and cache['data']:
-                    valid_files_data[file_path] = cache['data']
+            cache = self.files_data_cache.get(file_path, {})
+            if cache.get('probe'):
+                valid_files_probe[file_path] = cache['probe']
+        
+        if not valid_files_probe:
+            QMessageBox.warning(self, "警告", "没有读取到任何有效数据\n\n请检查文件是否正确，或重新选择文件")
+            return
+        
+        print(f"\n总共选择了 {len(self.all_files)} 个文件")
+        
+        # 根据探测到的表头确定目标表头
+        target_headers = self._select_target_headers(valid_files_probe)
+        if not target_headers:
+            return
+        
+        # 合并前按探测的行数检查Excel的行数上限，而不是等到保存时才失败
+        estimated_rows = sum(
+            max(info['rows'], 0) for probe in valid_files_probe.values() for info in probe.values()
+        )
+        shard_mode = self._ask_shard_mode(estimated_rows)
+        if shard_mode is None:
+            return
+        self.xlsx_shard_mode = shard_mode
+        
+        if self.pipeline_checkbox.isChecked():
+            self._start_pipeline(list(valid_files_probe), target_headers, estimated_rows)
+            return
+        
+        # 完整读取保留下来的文件（只读取目标表头中的列），全部完成后开始合并
+        # 已读取的数据只有包含全部目标列时才能复用
+        self.pending_target_headers = target_headers
+        files_to_load = [
+            file_path for file_path in valid_files_probe
+            if not self._cached_data_covers(file_path, target_headers)
+        ]
+        if files_to_load:
+            print(f"\n正在读取 {len(files_to_load)} 个文件的完整数据...")
+            self.btn_start.setEnabled(False)
+            for file_path in files_to_load:
+                self.loading_files.add(file_path)
+                self.files_data_cache[file_path]['data_columns'] = list(target_headers)
+                self.read_scheduler.submit(file_path, columns=target_headers)
+        self._check_merge_ready()
+    
+    def _start_pipeline(self, file_paths: List[str], target_headers: List[str], estimated_rows: int):
+        """
+        流水线合并：先询问是否去重和保存路径，然后在后台边读取边写入
+        
+        流水线中不会事先得到完整的合并结果，无法先统计重复行，是否去重需要提前选择
+        """
+        reply = QMessageBox.question(
+            self,
+            "流水线模式",
+            "是否去除完全重复的行？\n\n是(Y) - 去除重复行\n否(N) - 保留所有数据",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel,
+            QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Cancel:
+            return
+        print("\n正在以流水线模式合并数据...")
+        self.merge_state = {
+            'pipeline': True,
+            'file_paths': file_paths,
+            'target_headers': target_headers,
+            'save_dir': self._default_save_dir(),
+            'filename': DEFAULT_OUTPUT_FILENAME,
+            'total_rows': estimated_rows,
+            'shard_mode': self.xlsx_shard_mode,
+            'drop_duplicates': reply == QMessageBox.StandardButton.Yes,
+        }
+        self._ask_output_and_write()
+    
+    def _ask_shard_mode(self, estimated_rows: int) -> Optional[str]:
+        """
+        合并结果可能超过Excel行数上限时，询问保存为xlsx时的拆分方式
+        
+        Returns:
+            'files' 或 'sheets'，用户取消时返回 None
+        """
+        if estimated_rows <= EXCEL_MAX_DATA_ROWS:
+            return 'files'
+        box = QMessageBox(self)
+        box.setIcon(QMessageBox.Icon.Warning)
+        box.setWindowTitle("超过Excel行数上限")
+        box.setText(
+            f"合并结果约 {estimated_rows} 行，超过 Excel 单个工作表的上限 {EXCEL_MAX_DATA_ROWS} 行。\n\n"
+            f"保存为 xlsx 时将自动拆分，并生成记录各部分行范围的清单文件；"
+            f"也可以在保存时选择 CSV、Parquet 等没有行数限制的格式。\n\n请选择 xlsx 的拆分方式："
+        )
+        btn_files = box.addButton("拆分为多个文件", QMessageBox.ButtonRole.AcceptRole)
+        btn_sheets = box.addButton("拆分为多个Sheet", QMessageBox.ButtonRole.AcceptRole)
+        box.addButton("取消", QMessageBox.ButtonRole.RejectRole)
+        box.setDefaultButton(btn_files)
+        box.exec()
+        if box.clickedButton() is btn_files:
+            return 'files'
+        if box.clickedButton() is btn_sheets:
+            return 'sheets'
+        return None
+    
+    def _cached_data_covers(self, file_path: str, target_headers: List[str]) -> bool:
+        """已读取的数据是否包含全部目标列（按列投影读取时只保留了当时的目标列）"""
+        if file_path not in self.frame_cache:
+            return False
+        cache = self.files_data_cache.get(file_path, {})
+        data_columns = cache.get('data_columns')
+        return data_columns is None or set(target_headers) <= set(data_columns)
+    
+    def _select_target_headers(self, files_probe: Dict[str, Dict]) -> Optional[List[str]]:
+        """
+        根据探测结果确定目标表头，表头不一致时让用户选择
+        
+        Args:
+            files_probe: 探测结果字典 {file_path: {sheet_name: {'headers', 'rows'}}}
+            
+        Returns:
+            目标表头列表，用户未选择时返回 None
+        """
+        # 获取所有表头
+        headers_info = get_all_headers(files_probe)
+        print(f"\n共找到 {len(headers_info)} 个表/Sheet")
+        
+        # 检查表头一致性
+        is_consistent, result = check_headers_consistency(headers_info)
+        
+        if is_consistent:
+            print("所有表头一致，直接合并")
+            return result
+        
+        header_groups = group_headers(result)
+        print(f"表头不一致（{len(header_groups)} 种不同的表头），需要用户选择")
+        header_dialog = HeaderSelectionDialog(header_groups, self)
+        target_headers = None
+        if header_dialog.exec() == QDialog.DialogCode.Accepted:
+            target_headers = header_dialog.get_selected_headers()
+        if not target_headers:
+            QMessageBox.warning(
+                self,
+                "警告",
+                "未选择表头\n\n请重新点击\"开始处理\"并选择表头"
+            )
+            return None
+        return target_headers
+    
+    def _check_merge_ready(self):
+        """完整读取全部结束后开始合并"""
+        if self.pending_target_headers is None or self.loading_files:
+            return
         
+        target_headers = self.pending_target_headers
+        self.pending_target_headers = None
+        self.btn_start.setEnabled(True)
+        
+        valid_files_data = self.get_files_data()
         if not valid_files_data:
             QMessageBox.warning(self, "警告", "没有读取到任何有效数据\n\n请检查文件是否正确，或重新选择文件")
             return
         
         # 开始处理流程（不关闭窗口）
-        self._process_files(valid_files_data)
+        self._process_files(valid_files_data, target_headers)
     
-    def _process_files(self, files_data: Dict[str, Dict[str, pd.DataFrame]]):
-        """处理文件合并流程"""
-        try:
-            print(f"\n总共选择了 {len(self.all_files)} 个文件")
-            
-            # 确定默认保存路径
-            last_selected_folder = self.get_last_selected_folder()
-            if last_selected_folder:
-                default_save_dir = Path(last_selected_folder)
-            else:
-                default_save_dir = Path(self.all_files[-1]).parent if self.all_files else Path.cwd()
-            
-            # 获取所有表头
-            headers_info = get_all_headers(files_data)
-            print(f"\n共找到 {len(headers_info)} 个表/Sheet")
-            
-            # 检查表头一致性
-            is_consistent, result = check_headers_consistency(headers_info)
-            
-            if is_consistent:
-                target_headers = result
-                print("所有表头一致，直接合并")
-            else:
-                print("表头不一致，需要用户选择")
-                header_dialog = HeaderSelectionDialog(headers_info, self)
-                if header_dialog.exec() != QDialog.DialogCode.Accepted:
-                    QMessageBox.warning(
-                        self,
-                        "警告",
-                        "未选择表头\n\n请重新点击\"开始处理\"并选择表头"
-                    )
-                    return
-                
-                target_headers = header_dialog.get_selected_headers()
-                if not target_headers:
-                    QMessageBox.warning(
-                        self,
-                        "警告",
-                        "未选择表头\n\n请重新点击\"开始处理\"并选择表头"
-                    )
-                    return
-            
-            # 合并数据
-            print("\n正在合并数据...")
-            merged_df, statistics = merge_data(files_data, target_headers)
-            
-            if merged_df.empty:
-                QMessageBox.warning(
-                    self,
-                    "警告",
-                    "合并结果为空\n\n请检查文件数据是否正确"
-                )
-                return
-            
-            # 检查重复行并询问是否去重
-            original_rows = len(merged_df)
-            duplicate_count = merged_df.duplicated().sum()
-            
-            if duplicate_count > 0:
-                print(f"\n检测到 {duplicate_count} 行完全重复的数据")
-                reply = QMessageBox.question(
-                    self,
-                    "发现重复数据",
-                    f"检测到 {duplicate_count} 行完全重复的数据。\n\n是否要去除重复行？\n\n是(Y) - 去除重复行\n否(N) - 保留所有数据",
-                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-                    QMessageBox.StandardButton.Yes
-                )
-                
-                if reply == QMessageBox.StandardButton.Yes:
-                    merged_df = merged_df.drop_duplicates()
-                    deduplicated_rows = len(merged_df)
-                    removed_rows = original_rows - deduplicated_rows
-                    print(f"已去除 {removed_rows} 行重复数据，剩余 {deduplicated_rows} 行")
-                else:
-                    print("保留所有数据（包括重复行）")
-            else:
-                print("\n未发现重复数据")
-            
-            # 显示统计信息
-            total_rows = len(merged_df)
-            print("\n" + "=" * 60)
-            print("合并统计:")
-            print("=" * 60)
-            for stat in statistics:
-                print(f"  {stat['file']} - {stat['sheet']}: {stat['rows']} 行")
-            print(f"\n合并后总计: {original_rows} 行")
-            if duplicate_count > 0:
-                if total_rows < original_rows:
-                    removed_count = original_rows - total_rows
-                    print(f"去重后总计: {total_rows} 行 (已去除 {removed_count} 行重复数据)")
-                else:
-                    print(f"最终总计: {total_rows} 行 (检测到 {duplicate_count} 行重复，但未去重)")
-            else:
-                print(f"最终总计: {total_rows} 行")
-            print("=" * 60)
-            
-            # 保存结果
-            default_filename = DEFAULT_OUTPUT_FILENAME
-            output_path = None
-            
-            while True:
-                output_path, _ = QFileDialog.getSaveFileName(
-                    self,
-                    "保存合并结果 - 请选择格式、路径和文件名",
-                    str(default_save_dir / default_filename),
-                    "Excel文件 (*.xlsx);;CSV文件 (*.csv);;所有文件 (*.*)"
-                )
-                
-                if not output_path:
-                    print("\n未保存文件")
-                    return
-                
-                # 尝试保存文件
-                if save_result(merged_df, output_path):
-                    # 保存成功，验证文件
-                    if os.path.exists(output_path):
-                        file_size = os.path.getsize(output_path)
-                        if file_size > 0:
-                            print(f"\n结果已保存到: {output_path}")
-                            QMessageBox.information(
-                                self,
-                                "完成",
-                                f"合并完成！\n\n共合并 {total_rows} 行数据\n\n结果已保存到:\n{output_path}"
-                            )
-                            break
-                        else:
-                            # 文件大小为0
-                            reply = QMessageBox.question(
-                                self,
-                                "保存失败",
-                                "文件保存后大小为0，可能保存失败。\n\n是否重新选择保存位置？\n\n是(Y) - 重新选择\n否(N) - 取消保存",
-                                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-                                QMessageBox.StandardButton.Yes
-                            )
-                            if reply == QMessageBox.StandardButton.No:
-                                return
-                            # 更新默认路径
-                            default_save_dir = Path(output_path).parent
-                            default_filename = Path(output_path).name
-                            continue
-                    else:
-                        # 文件不存在
-                        reply = QMessageBox.question(
-                            self,
-                            "保存失败",
-                            "文件保存失败，文件不存在。\n\n是否重新选择保存位置？\n\n是(Y) - 重新选择\n否(N) - 取消保存",
-                            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-                            QMessageBox.StandardButton.Yes
-                        )
-                        if reply == QMessageBox.StandardButton.No:
-                            return
-                        default_save_dir = Path(output_path).parent
-                        default_filename = Path(output_path).name
-                        continue
-                else:
-                    # 保存失败（异常已在save_result中处理）
-                    reply = QMessageBox.question(
-                        self,
-                        "保存失败",
-                        "保存文件时出错。\n\n是否重新选择保存位置？\n\n是(Y) - 重新选择\n否(N) - 取消保存",
-                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-                        QMessageBox.StandardButton.Yes
-                    )
-                    if reply == QMessageBox.StandardButton.No:
-                        return
-                    default_save_dir = Path(output_path).parent if output_path else default_save_dir
-                    default_filename = Path(output_path).name if output_path else default_filename
-                    continue
-                    
-        except Exception as e:
-            import traceback
-            error_msg = f"程序执行出错: {e}\n\n{traceback.format_exc()}"
-            print(error_msg)
-            QMessageBox.critical(
+    def _default_save_dir(self) -> Path:
+        """确定默认保存路径"""
+        last_selected_folder = self.get_last_selected_folder()
+        if last_selected_folder:
+            return Path(last_selected_folder)
+        return Path(self.all_files[-1]).parent if self.all_files else Path.cwd()
+    
+    def _process_files(self, files_data: Dict[str, Dict[str, pd.DataFrame]], target_headers: List[str]):
+        """
+        处理文件合并流程
+        
+        合并、重复行检测和保存都在后台线程中执行，界面线程只负责对话框：
+        先分析（对齐并统计重复行），再询问是否去重和保存路径，最后写入
+        """
+        print("\n正在合并数据...")
+        self.merge_state = {
+            'files_data': files_data,
+            'target_headers': target_headers,
+            'save_dir': self._default_save_dir(),
+            'filename': DEFAULT_OUTPUT_FILENAME,
+            # 行数取自读取结果，不需要为计数而加载已溢出到磁盘的文件
+            'total_rows': sum(
+                max(self.files_data_cache.get(file_path, {}).get('rows', 0), 0)
+                for file_path in files_data
+            ),
+            'shard_mode': self.xlsx_shard_mode,
+        }
+        self._start_merge_worker(MergeWorker(
+            files_data, target_headers, mode='analyze', total_rows=self.merge_state['total_rows']
+        ))
+    
+    def _start_merge_worker(self, worker: MergeWorker):
+        """在后台线程中运行合并工作线程，并显示可取消的进度对话框"""
+        self.btn_start.setEnabled(False)
+        self.btn_delete.setEnabled(False)
+        
+        thread = QThread()
+        worker.moveToThread(thread)
+        
+        thread.started.connect(worker.run)
+        worker.progress.connect(self._on_merge_progress, type=Qt.ConnectionType.QueuedConnection)
+        worker.schema_resolved.connect(self._on_schema_resolved, type=Qt.ConnectionType.QueuedConnection)
+        worker.analyzed.connect(self._on_merge_analyzed, type=Qt.ConnectionType.QueuedConnection)
+        worker.pipeline_stats.connect(self._on_pipeline_stats, type=Qt.ConnectionType.QueuedConnection)
+        worker.written.connect(self._on_merge_written, type=Qt.ConnectionType.QueuedConnection)
+        worker.failed.connect(self._on_merge_failed, type=Qt.ConnectionType.QueuedConnection)
+        worker.cancelled.connect(self._on_merge_cancelled, type=Qt.ConnectionType.QueuedConnection)
+        for signal in (worker.analyzed, worker.written, worker.failed, worker.cancelled):
+            signal.connect(thread.quit, type=Qt.ConnectionType.QueuedConnection)
+        thread.finished.connect(thread.deleteLater)
+        
+        progress_dialog = QProgressDialog("正在准备...", "取消", 0, max(worker.total_rows, 1), self)
+        progress_dialog.setWindowTitle("正在处理")
+        progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        progress_dialog.setAutoClose(False)
+        progress_dialog.setAutoReset(False)
+        progress_dialog.setMinimumDuration(0)
+        progress_dialog.canceled.connect(self._cancel_merge)
+        
+        # 保存引用，避免被垃圾回收
+        self.merge_thread = thread
+        self.merge_worker = worker
+        self.progress_dialog = progress_dialog
+        
+        progress_dialog.show()
+        thread.start()
+    
+    def _finish_merge_worker(self):
+        """关闭进度对话框，释放对合并工作线程的引用"""
+        if self.progress_dialog is not None:
+            self.progress_dialog.canceled.disconnect(self._cancel_merge)
+            self.progress_dialog.close()
+            self.progress_dialog.deleteLater()
+            self.progress_dialog = None
+        if self.merge_thread is not None:
+            # 本回调先于排队的 quit 执行，这里直接请求退出再等待
+            self.merge_thread.quit()
+            self.merge_thread.wait(3000)
+        self.merge_thread = None
+        self.merge_worker = None
+        self.btn_start.setEnabled(True)
+        self.btn_delete.setEnabled(True)
+    
+    def _cancel_merge(self):
+        """请求取消后台合并"""
+        if self.merge_worker is not None:
+            print("正在取消合并...")
+            self.merge_worker.cancel()
+            if self.progress_dialog is not None:
+                self.progress_dialog.setLabelText("正在取消...")
+    
+    def _on_merge_progress(self, stage: str, current: int, total: int):
+        """更新合并进度"""
+        if self.progress_dialog is None or self.progress_dialog.wasCanceled():
+            return
+        self.progress_dialog.setMaximum(max(total, 1))
+        self.progress_dialog.setValue(min(current, max(total, 1)))
+        self.progress_dialog.setLabelText(f"{stage}: {current} / {total} 行")
+    
+    def _on_schema_resolved(self, schema: Dict, conflicts: List[Dict]):
+        """记录统一的列类型（写入阶段使用），输出无法统一类型的列"""
+        if self.merge_state is not None:
+            self.merge_state['schema'] = schema
+            self.merge_state['schema_conflicts'] = conflicts
+        if schema:
+            print("\n统一列类型: " + ", ".join(f"{header} -> {dtype}" for header, dtype in schema.items()))
+        if conflicts:
+            print("\n以下列在不同文件中的类型无法统一，将保持原类型合并:")
+            for line in format_conflicts(conflicts):
+                print(f"  {line}")
+    
+    def _on_pipeline_stats(self, stats: Dict):
+        """记录流水线各阶段的利用率和合并统计（在完成提示中显示）"""
+        if self.merge_state is not None:
+            self.merge_state['pipeline_stats'] = stats
+        for stat in stats.get('statistics', []):
+            print(f"  {stat['file']} - {stat['sheet']}: {stat['rows']} 行")
+        if stats.get('duplicate_count'):
+            print(f"已去除 {stats['duplicate_count']} 行重复数据")
+    
+    def _on_merge_analyzed(self, merged_rows: int, duplicate_count: int, statistics: List[Dict],
+                           duplicate_rows: np.ndarray):
+        """分析完成：询问是否去重和保存路径，然后开始写入"""
+        self._finish_merge_worker()
+        state = self.merge_state
+        
+        if merged_rows == 0:
+            QMessageBox.warning(
                 self,
-                "错误",
-                f"程序执行出错: {e}\n\n请检查文件并重试"
+                "警告",
+                "合并结果为空\n\n请检查文件数据是否正确"
             )
+            self.merge_state = None
+            return
+        
+        # 检查重复行并询问是否去重
+        drop_duplicates = False
+        if duplicate_count > 0:
+            print(f"\n检测到 {duplicate_count} 行完全重复的数据")
+            reply = QMessageBox.question(
+                self,
+                "发现重复数据",
+                f"检测到 {duplicate_count} 行完全重复的数据。\n\n是否要去除重复行？\n\n是(Y) - 去除重复行\n否(N) - 保留所有数据",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.Yes
+            )
+            drop_duplicates = reply == QMessageBox.StandardButton.Yes
+            if not drop_duplicates:
+                print("保留所有数据（包括重复行）")
+        else:
+            print("\n未发现重复数据")
+        
+        # 显示统计信息
+        total_rows = merged_rows - duplicate_count if drop_duplicates else merged_rows
+        print("\n" + "=" * 60)
+        print("合并统计:")
+        print("=" * 60)
+        for stat in statistics:
+            print(f"  {stat['file']} - {stat['sheet']}: {stat['rows']} 行")
+        print(f"\n合并后总计: {merged_rows} 行")
+        if duplicate_count > 0:
+            if drop_duplicates:
+                print(f"去重后总计: {total_rows} 行 (已去除 {duplicate_count} 行重复数据)")
+            else:
+                print(f"最终总计: {total_rows} 行 (检测到 {duplicate_count} 行重复，但未去重)")
+        else:
+            print(f"最终总计: {total_rows} 行")
+        print("=" * 60)
+        
+        state['drop_duplicates'] = drop_duplicates
+        state['duplicate_rows'] = duplicate_rows  # 写入时按位置去重，不再计算行哈希
+        self._ask_output_and_write()
     
-    def get_files_data(self) -> Dict[str, Dict[str, pd.DataFrame]]:
-        """获取所有文件的数据"""
-        files_data = {}
-        for file_path in self.all_files:
-            if file_path in self.files_data_cache:
-                cache = self.files_data_cache[file_path]
-                if 'data' in cache and cache['data']:
-                    files_data[file_path] = cache['data']
-        return files_data
+    def _ask_output_and_write(self):
+        """询问保存路径并在后台写入结果"""
+        state = self.merge_state
+        available = set(available_output_formats())
+        file_types = {
+            f"{label} ({' '.join('*' + ext for ext in extensions)})": extensions
+            for file_format, label, extensions in SAVE_FILE_TYPES if file_format in available
+        }
+        output_path, selected_filter = QFileDialog.getSaveFileName(
+            self,
+            "保存合并结果 - 请选择格式、路径和文件名",
+            str(state['save_dir'] / state['filename']),
+            ";;".join(list(file_types) + ["所有文件 (*.*)"])
+        )
+        
+        if not output_path:
+            print("\n未保存文件")
+            self.merge_state = None
+            return
+        
+        # 文件名没有已知的扩展名时按选择的文件类型补全
+        extensions = file_types.get(selected_filter)
+        known_extensions = {ext for exts in file_types.values() for ext in exts}
+        if extensions and Path(output_path).suffix.lower() not in known_extensions:
+            output_path += extensions[0]
+        
+        # 重新选择时以本次路径为默认值
+        state['save_dir'] = Path(output_path).parent
+        state['filename'] = Path(output_path).name
+        if state.get('pipeline'):
+            self._start_merge_worker(MergeWorker(
+                state['file_paths'], state['target_headers'], mode='pipeline',
+                drop_duplicates=state['drop_duplicates'], output_path=output_path,
+                total_rows=state['total_rows'], shard_mode=state.get('shard_mode', 'files'),
+                pipeline_options={
+                    'max_workers': self.worker_count_spin.value(),
+                    'backend': 'process' if self.process_checkbox.isChecked() else 'thread',
+                    'parse_cache': self.parse_cache if self.cache_checkbox.isChecked() else None,
+                }
+            ))
+            return
+        self._start_merge_worker(MergeWorker(
+            state['files_data'], state['target_headers'], mode='write',
+            drop_duplicates=state['drop_duplicates'], output_path=output_path,
+            total_rows=state['total_rows'], schema=state.get('schema'),
+            shard_mode=state.get('shard_mode', 'files'), duplicate_rows=state.get('duplicate_rows')
+        ))
+    
+    def _on_merge_written(self, success: bool, output_path: str, written_rows: int):
+        """写入完成：验证输出文件，失败时询问是否重新选择保存位置"""
+        self._finish_merge_worker()
+        
+        if success:
+            print(f"\n结果已保存到: {output_path}")
+            message = f"合并完成！\n\n共合并 {written_rows} 行数据\n\n结果已保存到:\n{output_path}"
+            manifest = manifest_path(output_path)
+            if output_format(output_path) == 'xlsx' and os.path.exists(manifest):
+                message += self._describe_shards(manifest)
+            conflicts = self.merge_state.get('schema_conflicts') if self.merge_state else None
+            if conflicts:
+                message += "\n\n以下列的类型在不同文件中无法统一，已按原类型合并:\n"
+                message += "\n".join(format_conflicts(conflicts))
+            pipeline_stats = self.merge_state.get('pipeline_stats') if self.merge_state else None
+            if pipeline_stats:
+                if pipeline_stats['failed_files']:
+                    message += f"\n\n以下 {len(pipeline_stats['failed_files'])} 个文件读取失败，已跳过:\n"
+                    message += "\n".join(Path(path).name for path in pipeline_stats['failed_files'][:10])
+                message += f"\n\n流水线耗时 {pipeline_stats['elapsed_seconds']:.1f} 秒:\n"
+                message += "\n".join(format_pipeline_stats(pipeline_stats))
+            QMessageBox.information(self, "完成", message)
+            self.merge_state = None
+            return
+        
+        if not os.path.exists(output_path):
+            message = "文件保存失败，文件不存在。"
+        elif os.path.getsize(output_path) == 0:
+            message = "文件保存后大小为0，可能保存失败。"
+        else:
+            # 异常已在save_result中处理
+            message = "保存文件时出错。"
+        reply = QMessageBox.question(
+            self,
+            "保存失败",
+            f"{message}\n\n是否重新选择保存位置？\n\n是(Y) - 重新选择\n否(N) - 取消保存",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.Yes
+        )
+        if reply == QMessageBox.StandardButton.No:
+            self.merge_state = None
+            return
+        self._ask_output_and_write()
+    
+    def _describe_shards(self, manifest: str) -> str:
+        """读取拆分清单，生成完成提示中的拆分说明"""
+        try:
+            with open(manifest, 'r', encoding='utf-8') as f:
+                shards = json.load(f)['shards']
+        except (OSError, ValueError, KeyError) as e:
+            print(f"警告: 读取拆分清单失败 {manifest}: {e}")
+            return ""
+        lines = [
+            f"{shard['file']} [{shard['sheet']}]: 第 {shard['first_row']}-{shard['last_row']} 行"
+            for shard in shards
+        ]
+        if len(lines) > 10:
+            lines = lines[:10] + [f"...（共 {len(shards)} 部分）"]
+        return (
+            f"\n\n结果超过 Excel 行数上限，已拆分为 {len(shards)} 部分:\n" + "\n".join(lines)
+            + f"\n\n拆分清单:\n{manifest}"
+        )
+    
+    def _on_merge_failed(self, error: str):
+        """后台合并出错"""
+        self._finish_merge_worker()
+        self.merge_state = None
+        QMessageBox.critical(
+            self,
+            "错误",
+            f"程序执行出错: {error}\n\n请检查文件并重试"
+        )
+    
+    def _on_merge_cancelled(self):
+        """后台合并已取消"""
+        self._finish_merge_worker()
+        self.merge_state = None
+        print("\n已取消处理")
+    
+    def _toggle_watch(self):
+        """开始或停止监视文件夹"""
+        if self.watch_worker is not None:
+            print("正在停止监视...")
+            self.watch_worker.stop()
+            self.btn_watch.setEnabled(False)
+            self.btn_watch.setText("正在停止...")
+            return
+        
+        folder = QFileDialog.getExistingDirectory(
+            self, "选择要监视的文件夹", self.get_last_selected_folder() or str(Path.cwd())
+        )
+        if not folder:
+            return
+        
+        available = set(available_output_formats())
+        file_types = {
+            f"{label} ({' '.join('*' + ext for ext in extensions)})": extensions
+            for file_format, label, extensions in SAVE_FILE_TYPES
+            if file_format in available and file_format in APPEND_FORMATS
+        }
+        output_path, selected_filter = QFileDialog.getSaveFileName(
+            self,
+            "选择合并结果 - 新文件将追加到此文件（不存在时创建）",
+            str(Path(folder) / (Path(DEFAULT_OUTPUT_FILENAME).stem + ".csv")),
+            ";;".join(file_types),
+            options=QFileDialog.Option.DontConfirmOverwrite
+        )
+        if not output_path:
+            return
+        # 文件名不是可追加的格式时按选择的文件类型补全扩展名
+        extensions = file_types.get(selected_filter) or ['.csv']
+        known_extensions = {ext for exts in file_types.values() for ext in exts}
+        if Path(output_path).suffix.lower() not in known_extensions:
+            output_path += extensions[0]
+        
+        reply = QMessageBox.question(
+            self,
+            "监视文件夹",
+            "是否去除与已有结果重复的行？\n\n是(Y) - 去除重复行\n否(N) - 保留所有数据",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel,
+            QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Cancel:
+            return
+        
+        worker = WatchWorker(folder, output_path, {
+            'drop_duplicates': reply == QMessageBox.StandardButton.Yes,
+            'max_workers': self.worker_count_spin.value(),
+            'backend': 'process' if self.process_checkbox.isChecked() else 'thread',
+            'parse_cache': self.parse_cache if self.cache_checkbox.isChecked() else None,
+        })
+        thread = QThread()
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.log.connect(self._on_watch_log, type=Qt.ConnectionType.QueuedConnection)
+        worker.batch_merged.connect(self._on_watch_batch, type=Qt.ConnectionType.QueuedConnection)
+        worker.stopped.connect(self._on_watch_stopped, type=Qt.ConnectionType.QueuedConnection)
+        worker.failed.connect(self._on_watch_failed, type=Qt.ConnectionType.QueuedConnection)
+        for signal in (worker.stopped, worker.failed):
+            signal.connect(thread.quit, type=Qt.ConnectionType.QueuedConnection)
+        thread.finished.connect(thread.deleteLater)
+        
+        self.watch_thread = thread
+        self.watch_worker = worker
+        self.btn_watch.setText("停止监视")
+        self.watch_label.setText(f"正在监视 {folder}，新文件将追加到 {Path(output_path).name}")
+        self.watch_label.show()
+        thread.start()
+    
+    def _on_watch_log(self, message: str):
+        """显示最新一条监视日志"""
+        if self.watch_worker is not None:
+            self.watch_label.setText(message)
+    
+    def _on_watch_batch(self, batch: Dict):
+        """一批文件追加完成，显示累计结果"""
+        if self.watch_worker is None or self.watch_worker.merger is None or not batch['files']:
+            return
+        merger = self.watch_worker.merger
+        latencies = [info['latency_seconds'] for info in batch['files']]
+        self.watch_label.setText(
+            f"正在监视 {merger.watcher.folder}：已追加 {merger.total_files} 个文件、{merger.total_rows} 行"
+            f"（结果共 {batch.get('total_rows', 0)} 行，最近一批延迟 {max(latencies):.1f} 秒）"
+        )
+    
+    def _finish_watch_worker(self):
+        """等待监视线程退出，恢复按钮"""
+        if self.watch_thread is not None:
+            self.watch_thread.quit()
+            self.watch_thread.wait(3000)
+        self.watch_thread = None
+        self.watch_worker = None
+        self.btn_watch.setEnabled(True)
+        self.btn_watch.setText("监视文件夹")
+    
+    def _on_watch_stopped(self, total_files: int, total_rows: int):
+        """监视已停止"""
+        self._finish_watch_worker()
+        self.watch_label.setText(f"已停止监视，共追加 {total_files} 个文件、{total_rows} 行")
+    
+    def _on_watch_failed(self, error: str):
+        """监视出错"""
+        self._finish_watch_worker()
+        self.watch_label.hide()
+        QMessageBox.critical(self, "错误", f"监视文件夹时出错: {error}")
+    
+    def get_files_data(self) -> FrameCacheView:
+        """
+        获取所有文件的数据
+        
+        返回按文件列表顺序的只读映射 {file_path: {sheet_name: DataFrame}}，
+        已溢出到磁盘的文件在访问时才加载
+        """
+        return self.frame_cache.view(self.all_files)
     
     def get_last_selected_folder(self) -> Optional[str]:
         """获取最后选择的文件夹（简化实现，返回最后一个文件的文件夹）"""
@@ -610,17 +1067,20 @@ class MainWindow(QDialog):
     
     def closeEvent(self, event):
         """窗口关闭事件"""
-        # 停止所有读取线程
-        for file_path, thread in list(self.reader_threads.items()):
-            thread.quit()  # 请求线程退出
-            thread.wait(3000)  # 等待最多3秒
-            # 如果线程还在运行，强制终止
-            if thread.isRunning():
-                print(f"警告: 关闭窗口时线程仍在运行，强制终止: {file_path}")
-                thread.terminate()
-                thread.wait(1000)
-        # 清理所有引用
-        self.reader_threads.clear()
-        self.reader_workers.clear()
+        # 取消后台合并并等待线程退出
+        if self.merge_worker is not None:
+            self.merge_worker.cancel()
+        if self.merge_thread is not None:
+            self.merge_thread.quit()
+            self.merge_thread.wait(3000)
+        # 停止监视（当前批次写完后退出）
+        if self.watch_worker is not None:
+            self.watch_worker.stop()
+        if self.watch_thread is not None:
+            self.watch_thread.quit()
+            self.watch_thread.wait(10000)
+        # 清空读取队列并停止所有读取线程
+        self.read_scheduler.shutdown()
+        # 删除溢出到磁盘的临时数据
+        self.frame_cache.clear()
         event.accept()
-
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+合并工作线程
+在后台线程中执行合并、重复行检测和保存，报告各阶段进度并支持取消
+"""
+
+import os
+import traceback
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from PySide6.QtCore import QObject, Signal
+
+from core.constants import MERGE_CHUNK_ROWS
+from core.data_merger import MergeCancelled, iter_merge_chunks, save_result, output_format
+from core.deduplicator import RowDeduplicator
+from core.schema import resolve_schema
+from core.pipeline import MergePipeline, format_pipeline_stats
+
+
+def _drop_rows(chunk: pd.DataFrame, positions: np.ndarray, start: int) -> pd.DataFrame:
+    """去掉数据块中位于 positions（合并结果中的行位置，升序）的行，start 为数据块第一行的位置"""
+    lo, hi = np.searchsorted(positions, [start, start + len(chunk)])
+    if lo == hi:
+        return chunk
+    keep = np.ones(len(chunk), dtype=bool)
+    keep[positions[lo:hi] - start] = False
+    return chunk[keep]
+
+
+class MergeWorker(QObject):
+    """
+    合并工作线程
+
+    分两个阶段运行，阶段之间回到界面线程询问用户（是否去重、保存路径）：
+    - analyze: 统一各sheet的列类型，流式对齐所有sheet并统计重复行，不生成完整的合并结果，
+      只记录重复行的位置
+    - write: 再次流式对齐，按 analyze 阶段记录的位置去重（不再计算行哈希）并逐块写入输出文件
+    两个阶段都只在内存中保留一个数据块
+
+    流水线模式（pipeline）不需要事先完整读取文件：读取、对齐和写入同时进行（见 MergePipeline），
+    是否去重和保存路径在开始前确定
+    """
+    progress = Signal(str, int, int)  # 阶段描述, 当前进度, 总量
+    schema_resolved = Signal(object, object)  # 统一的列类型, 无法统一的列
+    analyzed = Signal(int, int, object, object)  # 合并后行数, 重复行数, 统计信息列表, 重复行的位置
+    pipeline_stats = Signal(object)  # 流水线各阶段的利用率（写入完成前发送）
+    written = Signal(bool, str, int)  # 是否成功, 输出路径, 写入行数
+    failed = Signal(str)  # 错误信息
+    cancelled = Signal()
+
+    def __init__(self, files_data: Dict[str, Dict[str, pd.DataFrame]], target_headers: List[str],
+                 mode: str = 'analyze', drop_duplicates: bool = False,
+                 output_path: Optional[str] = None, total_rows: Optional[int] = None,
+                 schema: Optional[Dict] = None, shard_mode: str = 'files',
+                 pipeline_options: Optional[Dict] = None,
+                 duplicate_rows: Optional[np.ndarray] = None):
+        super().__init__()
+        self.files_data = files_data
+        self.target_headers = target_headers
+        self.mode = mode
+        self.drop_duplicates = drop_duplicates
+        self.output_path = output_path
+        self.schema = schema  # write 阶段使用 analyze 阶段得到的统一列类型
+        self.shard_mode = shard_mode  # xlsx结果超过行数上限时的拆分方式
+        # analyze 阶段得到的重复行在合并结果中的位置（升序），write 阶段据此去重；为 None 时重新计算行哈希
+        self.duplicate_rows = duplicate_rows
+        # 流水线模式的读取参数（max_workers、backend、parse_cache），files_data 为文件路径列表
+        self.pipeline_options = pipeline_options or {}
+        self._pipeline: Optional[MergePipeline] = None
+        self._cancelled = False
+        # 数据可能已溢出到磁盘，调用方知道总行数时直接传入，避免为计数而加载所有文件
+        if total_rows is None and mode == 'pipeline':
+            total_rows = 0
+        elif total_rows is None:
+            total_rows = sum(
+                len(df) for sheets_data in files_data.values() for df in sheets_data.values()
+            )
+        self.total_rows = total_rows
+
+    def cancel(self):
+        """请求取消，在处理下一个数据块前生效"""
+        self._cancelled = True
+        if self._pipeline is not None:
+            self._pipeline.cancel()
+
+    def _check_cancelled(self):
+        if self._cancelled:
+            raise MergeCancelled()
+
+    def run(self):
+        """执行当前阶段"""
+        try:
+            if self.mode == 'analyze':
+                self._analyze()
+            elif self.mode == 'pipeline':
+                self._run_pipeline()
+            else:
+                self._write()
+        except MergeCancelled:  # 包括流水线的 PipelineCancelled
+            print("合并已取消")
+            self.cancelled.emit()
+        except Exception as e:
+            error_msg = f"{e}\n\n{traceback.format_exc()}"
+            print(f"合并时出错: {error_msg}")
+            self.failed.emit(str(e))
+
+    def _analyze(self):
+        """对齐所有数据块并统计重复行"""
+        statistics: List[Dict] = []
+        deduplicator = RowDeduplicator()
+        duplicate_rows: List[np.ndarray] = []
+        processed_rows = 0
+        self.progress.emit("统一列类型", 0, self.total_rows)
+        self.schema, conflicts = resolve_schema(self.files_data, self.target_headers)
+        self._check_cancelled()
+        self.schema_resolved.emit(self.schema, conflicts)
+        self.progress.emit("对齐并检测重复", 0, self.total_rows)
+        for chunk in iter_merge_chunks(self.files_data, self.target_headers,
+                                       statistics, MERGE_CHUNK_ROWS, self.schema):
+            self._check_cancelled()
+            mask = deduplicator.duplicated(chunk)
+            if mask.any():
+                duplicate_rows.append(np.flatnonzero(mask) + processed_rows)
+            processed_rows += len(chunk)
+            self.progress.emit("对齐并检测重复", processed_rows, self.total_rows)
+        self._check_cancelled()
+        positions = np.concatenate(duplicate_rows) if duplicate_rows else np.zeros(0, dtype=np.int64)
+        self.analyzed.emit(processed_rows, deduplicator.duplicate_count, statistics, positions)
+
+    def _write(self):
+        """对齐、按需去重并写入输出文件"""
+        written_rows = [0]
+        duplicate_rows = self.duplicate_rows if self.drop_duplicates else None
+        deduplicator = RowDeduplicator() if self.drop_duplicates and duplicate_rows is None else None
+
+        def chunks() -> Iterator[pd.DataFrame]:
+            processed_rows = 0
+            for chunk in iter_merge_chunks(self.files_data, self.target_headers,
+                                           chunk_size=MERGE_CHUNK_ROWS, schema=self.schema):
+                self._check_cancelled()
+                start = processed_rows
+                processed_rows += len(chunk)
+                if duplicate_rows is not None:
+                    chunk = _drop_rows(chunk, duplicate_rows, start)
+                elif deduplicator is not None:
+                    chunk = deduplicator.drop_duplicates(chunk)
+                written_rows[0] += len(chunk)
+                self.progress.emit("写入", processed_rows, self.total_rows)
+                yield chunk
+
+        # SQLite写入在事务中进行，取消时已回滚；已有的数据库文件不能删除
+        keep_existing = output_format(self.output_path) == 'sqlite' and os.path.exists(self.output_path)
+        self.progress.emit("写入", 0, self.total_rows)
+        try:
+            success = save_result(chunks(), self.output_path, shard_mode=self.shard_mode, schema=self.schema)
+        except MergeCancelled:
+            self._remove_partial_output(keep_existing)
+            raise
+        self.written.emit(success, self.output_path, written_rows[0])
+
+    def _run_pipeline(self):
+        """流水线合并：边读取边对齐边写入"""
+        keep_existing = output_format(self.output_path) == 'sqlite' and os.path.exists(self.output_path)
+
+        def progress(aligned_rows: int, written_rows: int):
+            self.progress.emit("流水线合并（读取/对齐/写入）", aligned_rows, max(self.total_rows, aligned_rows))
+
+        self._pipeline = MergePipeline(
+            self.files_data, self.target_headers, self.output_path,
+            chunk_size=MERGE_CHUNK_ROWS, drop_duplicates=self.drop_duplicates,
+            save_options={'shard_mode': self.shard_mode}, progress=progress,
+            **self.pipeline_options
+        )
+        if self._cancelled:
+            raise MergeCancelled()
+        self.progress.emit("流水线合并（读取/对齐/写入）", 0, self.total_rows)
+        try:
+            success = self._pipeline.run()
+        except MergeCancelled:
+            self._remove_partial_output(keep_existing)
+            raise
+        stats = self._pipeline.stats
+        print("流水线各阶段利用率:")
+        for line in format_pipeline_stats(stats):
+            print(f"  {line}")
+        stats['failed_files'] = list(self._pipeline.failed_files)
+        stats['duplicate_count'] = self._pipeline.duplicate_count
+        stats['statistics'] = self._pipeline.statistics
+        self.pipeline_stats.emit(stats)
+        self.written.emit(success, self.output_path, self._pipeline.output_rows)
+
+    def _remove_partial_output(self, keep_existing: bool):
+        """删除写了一半的输出文件（写入前已存在的SQLite数据库除外）"""
+        if os.path.exists(self.output_path) and not keep_existing:
+            try:
+                os.remove(self.output_path)
+            except OSError as e:
+                print(f"警告: 删除未完成的输出文件失败: {e}")
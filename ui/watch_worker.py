@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+监视文件夹工作线程
+在后台线程中运行 WatchMerger，把日志和每批文件的统计信息通过信号发送给界面
+"""
+
+import traceback
+from typing import Dict
+
+from PySide6.QtCore import QObject, Signal
+
+from core.folder_watcher import WatchMerger
+
+
+class WatchWorker(QObject):
+    """
+    监视文件夹并增量合并的工作对象（移动到 QThread 中运行）
+    
+    run 一直阻塞到调用 stop，当前批次写完后结束
+    """
+    log = Signal(str)  # 日志（每个文件的吞吐量和延迟等）
+    batch_merged = Signal(object)  # 每批文件的统计信息
+    stopped = Signal(int, int)  # 共追加的文件数, 行数
+    failed = Signal(str)  # 错误信息
+    
+    def __init__(self, folder: str, output_path: str, options: Dict):
+        """
+        Args:
+            folder: 监视的文件夹
+            output_path: 合并结果路径（CSV、Parquet 或 xlsx）
+            options: 传给 WatchMerger 的其他参数（如 drop_duplicates、max_workers、backend）
+        """
+        super().__init__()
+        self.folder = folder
+        self.output_path = output_path
+        self.options = options
+        self.merger = None
+        self._stop_requested = False
+    
+    def stop(self):
+        """请求停止监视"""
+        self._stop_requested = True
+        if self.merger is not None:
+            self.merger.stop()
+    
+    def _log(self, message: str):
+        print(message)
+        self.log.emit(message)
+    
+    def run(self):
+        """线程入口"""
+        try:
+            self.merger = WatchMerger(
+                self.folder, self.output_path, log=self._log,
+                on_batch=self.batch_merged.emit, **self.options
+            )
+            if self._stop_requested:
+                self.merger.stop()
+            self.merger.run()
+            self.stopped.emit(self.merger.total_files, self.merger.total_rows)
+        except Exception as e:
+            traceback.print_exc()
+            self.failed.emit(str(e))